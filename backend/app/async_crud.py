@@ -0,0 +1,130 @@
+"""
+Variante asíncrona del acceso a datos para las rutas `async def`.
+
+Usa el cliente PostgREST asíncrono sobre un único httpx.AsyncClient con pool
+de conexiones keep-alive, así una consulta en curso no bloquea el event loop
+y varias consultas se pueden esperar a la vez (asyncio.gather). Las
+funciones devuelven lo mismo que sus equivalentes de crud.py.
+
+Con DATA_BACKEND distinto de "rest" las mismas consultas se ejecutan sobre
+repository.db en el threadpool de Starlette.
+"""
+import logging
+import os
+from typing import Optional
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from postgrest import AsyncPostgrestClient
+
+from .crud import _adjust_row_types
+from .database import SUPABASE_KEY, SUPABASE_URL
+from .repository import DATA_BACKEND, db
+from .utils.resilience import upstream
+
+logger = logging.getLogger(__name__)
+
+ASYNC_POOL_MAX_CONNECTIONS = int(os.getenv("ASYNC_POOL_MAX_CONNECTIONS", "20"))
+ASYNC_POOL_MAX_KEEPALIVE = int(os.getenv("ASYNC_POOL_MAX_KEEPALIVE", "10"))
+ASYNC_HTTP_TIMEOUT_SECONDS = float(os.getenv("ASYNC_HTTP_TIMEOUT_SECONDS", "10"))
+
+_client: Optional[AsyncPostgrestClient] = None
+
+def _create_client() -> AsyncPostgrestClient:
+    rest_url = f"{SUPABASE_URL.rstrip('/')}/rest/v1"
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    }
+    http_client = httpx.AsyncClient(
+        base_url=rest_url,
+        headers=headers,
+        timeout=ASYNC_HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=ASYNC_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=ASYNC_POOL_MAX_KEEPALIVE,
+        ),
+        follow_redirects=True,
+    )
+    return AsyncPostgrestClient(rest_url, headers=headers, http_client=http_client)
+
+def get_client() -> AsyncPostgrestClient:
+    """Shared async PostgREST client, created on first use inside the running loop."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+async def aclose() -> None:
+    """Close the connection pool (called from the app lifespan)."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+async def _execute(build, idempotent: bool = True):
+    """
+    Run a query built by `build(client)` on the async client, or on the
+    repository in a worker thread when the backend is not REST.
+
+    The async path goes through the same retry policy and circuit breaker
+    as the repository (utils/resilience.py), waiting with asyncio.sleep.
+    """
+    if DATA_BACKEND == "rest":
+        return await upstream.acall(
+            lambda: build(get_client()).execute(),
+            idempotent=idempotent,
+            label="rest-async",
+        )
+    return await run_in_threadpool(lambda: build(db).execute())
+
+async def get_user_by_username(username: str):
+    response = await _execute(
+        lambda client: client
+            .table("IB_Authentication")
+            .select("*")
+            .eq("user", username)
+    )
+    if not response.data:
+        return None
+    return _adjust_row_types(response.data[0])
+
+async def get_member_by_id(member_id: int):
+    response = await _execute(
+        lambda client: client
+            .table("IB_Members")
+            .select("*")
+            .eq("id", member_id)
+    )
+    if not response.data:
+        return None
+    return _adjust_row_types(response.data[0])
+
+async def update_user_password(username: str, new_password_hash: str):
+    """Update a user's password hash in the database"""
+    try:
+        response = await _execute(
+            lambda client: client
+                .table("IB_Authentication")
+                .update({"password": new_password_hash})
+                .eq("user", username),
+            idempotent=False,
+        )
+        return response.data
+    except Exception as e:
+        logger.error(f"Error updating password for user {username}: {e}", exc_info=True)
+        raise
+
+async def get_activities_exact(project_code: str, phase: str, discipline: str) -> list:
+    """Filas de IB_Activities que coinciden exactamente con proyecto, fase y disciplina."""
+    response = await _execute(
+        lambda client: client
+            .table("IB_Activities")
+            .select("*")
+            .eq("project_code", project_code)
+            .eq("phase", phase)
+            .eq("discipline", discipline)
+    )
+    return response.data or []
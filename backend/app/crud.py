@@ -1,6 +1,16 @@
 # crud.py
-from .database import supabase
+from .repository import bulk_insert, db, transaction
 from . import schemas
+from .utils.catalog import activity_catalog, normalize_name
+from .utils.reference import projects_table, members_table
+from .utils.journal import hours_journal
+from .utils.daily_totals import daily_totals
+from .utils.pagination import fetch_all, iter_rows
+from .utils.rollups import HOURS_ROLLUPS_ENABLED, hours_rollups
+from .utils.burn import compute_burn
+from .utils.columnar import columnar_hours
+from .utils.month_cache import closed_months, month_end, month_key
+from .utils.singleflight import reads
 from .utils.validation import (
     validate_project_code,
     validate_phase_discipline_activity,
@@ -11,48 +21,29 @@ from .utils.validation import (
     sanitize_string
 )
 import uuid
-from datetime import date, datetime
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
 import logging
+import os
 import time
 
 logger = logging.getLogger(__name__)
 
-def _retry_supabase_operation(operation_func, max_retries=3, base_delay=0.5):
-    """
-    Retry a Supabase operation with exponential backoff.
-    Handles connection timeouts and temporary failures.
-    """
-    last_exception = None
-
-    for attempt in range(max_retries):
-        try:
-            return operation_func()
-        except Exception as e:
-            last_exception = e
-            error_msg = str(e).lower()
-
-            # Check if this is a connection-related error that we should retry
-            is_retryable_error = any(keyword in error_msg for keyword in [
-                'timeout', 'connection', 'network', 'server error', '500',
-                'connection pool', 'connection reset', 'broken pipe'
-            ])
-
-            if not is_retryable_error or attempt == max_retries - 1:
-                # Not retryable or last attempt, re-raise
-                raise e
-
-            # Calculate delay with exponential backoff
-            delay = base_delay * (2 ** attempt)
-            logger.warning(f"Supabase operation failed (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {delay}s...")
-            time.sleep(delay)
-
-    # This should never be reached, but just in case
-    raise last_exception
-
+# Funciones de Postgres que agregan horas (backend/sql/); vacío = agregar siempre en Python
+GROUPED_HOURS_RPC = os.getenv("GROUPED_HOURS_RPC", "grouped_hours_by_employee")
+PROJECT_HOURS_RPC = os.getenv("PROJECT_HOURS_RPC", "project_hours_by_activity")
+AGGREGATE_RPC_RETRY_SECONDS = float(os.getenv("AGGREGATE_RPC_RETRY_SECONDS", "300"))
+_rpc_unavailable_until = {}
+# Rango máximo de meses por consulta agrupada
+GROUPED_HOURS_MAX_MONTHS = int(os.getenv("GROUPED_HOURS_MAX_MONTHS", "36"))
+# Rango máximo de días de /daily-activities/range (una vista mensual con margen)
+DAILY_ACTIVITIES_MAX_DAYS = int(os.getenv("DAILY_ACTIVITIES_MAX_DAYS", "62"))
+
+@reads.wrap()
 def get_project_by_code(project_code: str):
     clean_code = project_code.strip()
     response = (
-        supabase
+        db
         .table("IB_Projects")
         .select("*")
         .eq("code", clean_code)
@@ -76,28 +67,23 @@ def get_project_by_code(project_code: str):
 
     return row
 
+@reads.wrap()
 def get_stages_by_project(project_code: str):
     clean_project_code = project_code.strip()
-    response = (
-        supabase
-        .table("IB_Activities")
-        .select("phase")
-        .eq("project_code", clean_project_code)
-        .execute()
-    )
-    return list({item["phase"] for item in response.data})
+    return activity_catalog.get_stages(clean_project_code)
 
+@reads.wrap()
 def get_projects():
-    response = supabase.table("IB_Projects").select("*").execute()
-    return response.data
+    return list(projects_table.rows())
 
+@reads.wrap()
 def get_employees():
-    response = supabase.table("IB_Members").select("*").execute()
-    return response.data
+    return list(members_table.rows())
 
+@reads.wrap()
 def get_member_by_id(member_id: int):
     response = (
-        supabase
+        db
         .table("IB_Members")
         .select("*")
         .eq("id", member_id)
@@ -122,21 +108,12 @@ def get_member_by_id(member_id: int):
     return row
 
 def get_all_activities():
-    response = supabase.table("IB_Activities").select("*").execute()
-    return response.data
+    return fetch_all(lambda: db.table("IB_Activities").select("*"), key="activity_id")
 
 def get_disciplines_by_stage(project_code: str, stage: str):
     clean_project_code = project_code.strip()
     clean_stage = stage.strip()
-    response = (
-        supabase
-        .table("IB_Activities")
-        .select("discipline")
-        .eq("project_code", clean_project_code)
-        .eq("phase", clean_stage)
-        .execute()
-    )
-    return list({item["discipline"] for item in response.data})
+    return activity_catalog.get_disciplines(clean_project_code, clean_stage)
 
 def get_activities_by_discipline(project_code: str, stage: str, discipline: str):
     try:
@@ -144,26 +121,7 @@ def get_activities_by_discipline(project_code: str, stage: str, discipline: str)
         clean_stage = " ".join(stage.strip().split())
         clean_discipline = " ".join(discipline.strip().split())
 
-        response = (
-            supabase
-            .table("IB_Activities")
-            .select("activity_id, activity")
-            .eq("project_code", clean_project_code)
-            .eq("phase", clean_stage)
-            .eq("discipline", clean_discipline)
-            .execute()
-        )
-
-        if not response.data:
-            return []
-
-        activities = []
-        for item in response.data:
-            activities.append({
-                "id": item["activity_id"],
-                "name": item["activity"]
-            })
-        return activities
+        return activity_catalog.get_activities(clean_project_code, clean_stage, clean_discipline)
 
     except Exception as e:
         logger.error(f"Error en get_activities_by_discipline: {e}", exc_info=True)
@@ -171,7 +129,7 @@ def get_activities_by_discipline(project_code: str, stage: str, discipline: str)
 
 def get_user_by_username(username: str):
     response = (
-        supabase
+        db
         .table("IB_Authentication")
         .select("*")
         .eq("user", username)
@@ -195,155 +153,57 @@ def get_user_by_username(username: str):
 
     return row
 
+def _escape_like(value: str) -> str:
+    """Texto literal para un patrón like/ilike: escapa la barra invertida, % y _."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 def get_activity_id(project_code: str, phase: str, discipline: str, activity: str) -> int:
     """Obtiene el ID de una actividad específica."""
-    # Manejar el caso especial de N/A - No Aplica
-    if discipline == 'N/A - No Aplica':
-        # Intentar con diferentes variaciones
-        discipline_variations = [
-            'N/A - No Aplica',
-            'N/A-No Aplica',
-            'N/A - No Aplica ',
-            ' N/A - No Aplica',
-            'N/A - No Aplica',
-            'N/A- No Aplica',
-            'N/A -No Aplica'
-        ]
-    else:
-        discipline_variations = [discipline]
-    
     # Limpiar el nombre de la actividad
     clean_activity = activity.strip()
-    
-    # Intentar con cada variación de disciplina
-    response = None
-    for variation in discipline_variations:
-        # 1. Búsqueda exacta primero
-        response = (
-            supabase
-            .table("IB_Activities")
-            .select("activity_id")
-            .eq("project_code", project_code)
-            .eq("phase", phase)
-            .eq("discipline", variation)
-            .eq("activity", clean_activity)
-            .execute()
-        )
-        
-        if response.data:
-            break
-            
-        # 2. Búsqueda insensible a mayúsculas/minúsculas y espacios para la disciplina
-        if not response.data:
-            response = supabase.table("IB_Activities") \
-                .select("activity_id") \
-                .eq("project_code", project_code) \
-                .eq("phase", phase) \
-                .ilike("discipline", f"%{variation.strip()}%") \
-                .eq("activity", clean_activity) \
-                .execute()
-            
-            if response.data:
-                break
-        
-        # 3. Búsqueda insensible a mayúsculas/minúsculas y espacios para la actividad
-        if not response.data:
-            response = supabase.table("IB_Activities") \
-                .select("activity_id") \
-                .eq("project_code", project_code) \
-                .eq("phase", phase) \
-                .eq("discipline", variation) \
-                .ilike("activity", f"%{clean_activity}%") \
-                .execute()
-            
-            if response.data:
-                break
-                
-        # 4. Búsqueda insensible a mayúsculas/minúsculas y espacios para ambos
-        if not response.data:
-            response = supabase.table("IB_Activities") \
-                .select("activity_id") \
-                .eq("project_code", project_code) \
-                .eq("phase", phase) \
-                .ilike("discipline", f"%{variation.strip()}%") \
-                .ilike("activity", f"%{clean_activity}%") \
-                .execute()
-            
-            if response.data:
-                break
-    
-    # Si aún no hay resultados, intentar una búsqueda más amplia
-    if not response or not response.data:
-        # Buscar todas las actividades que coincidan parcialmente
-        response = supabase.table("IB_Activities") \
-            .select("activity_id, activity") \
-            .eq("project_code", project_code) \
-            .eq("phase", phase) \
-            .ilike("discipline", "%N/A%") \
-            .ilike("activity", f"%{clean_activity}%") \
-            .execute()
-        
-        # Si encontramos coincidencias parciales, mostrarlas en el mensaje de error
-        if response.data:
-            activities_found = [item["activity"] for item in response.data]
-            raise ValueError(
-                f"No se encontró la actividad exacta: {activity} en la fase '{phase}' "
-                f"y disciplina '{discipline}' del proyecto '{project_code}'. "
-                f"Actividades similares encontradas: {', '.join(activities_found[:5])}"
-            )
-    
-    if not response or not response.data:
-        raise ValueError(
-            f"No se encontró la actividad: {activity} en la fase '{phase}' "
-            f"y disciplina '{discipline}' del proyecto '{project_code}'."
-        )
-
-    row = response.data[0]
-    return int(row["activity_id"])
 
-def create_reported_hour(hour: schemas.ReportedHourCreate):
-    # 1. Validar y sanitizar los datos de entrada
-    validated_project_code = validate_project_code(hour.project_code)
-    validated_phase = validate_phase_discipline_activity(hour.phase, "Phase")
-    validated_discipline = validate_phase_discipline_activity(hour.discipline, "Discipline")
-    validated_activity = validate_phase_discipline_activity(hour.activity, "Activity")
-    validated_hours = validate_hours(hour.hours)
-    validated_date = validate_date(hour.date.isoformat())
-    validated_employee_id = validate_employee_id(hour.employee_id)
-    validated_note = validate_note(hour.note)
-
-    # 2. Validar que el proyecto existe
-    project = get_project_by_code(validated_project_code)
-    if not project:
-        raise ValueError(f"Proyecto no encontrado: {validated_project_code}")
+    # 1. Una sola búsqueda en el mapa precalculado del catálogo
+    #    (cubre mayúsculas, espacios y variantes de guion como 'N/A-No Aplica')
+    activity_id = activity_catalog.resolve_activity_id(project_code, phase, discipline, clean_activity)
+    if activity_id is not None:
+        return activity_id
 
-    # 3. Obtener el ID de la actividad
-    activity_id = get_activity_id(
-        validated_project_code, validated_phase, validated_discipline, validated_activity
+    # 2. Sin coincidencia en memoria: una única consulta dirigida por si el catálogo está desactualizado.
+    #    El nombre va escapado para que % y _ no actúen como comodines; * lo expande
+    #    PostgREST igualmente, así que además se compara el nombre devuelto
+    response = (
+        db
+        .table("IB_Activities")
+        .select("activity_id, discipline, activity")
+        .eq("project_code", project_code)
+        .eq("phase", phase)
+        .ilike("activity", _escape_like(clean_activity))
+        .execute()
     )
+    wanted_discipline = normalize_name(discipline)
+    wanted_activity = normalize_name(clean_activity)
+    for row in response.data or []:
+        if normalize_name(row.get("activity")) != wanted_activity:
+            continue
+        if wanted_discipline in normalize_name(row.get("discipline")):
+            return int(row["activity_id"])
 
-    # 4. Preparar los datos para la inserción
-    data_to_insert = {
-        "date": validated_date,
-        "employee_id": str(validated_employee_id),
-        "project_code": validated_project_code,
-        "phase": validated_phase,
-        "discipline": validated_discipline,
-        "activity": validated_activity,
-        "hours": str(validated_hours),
-        "note": validated_note,
-        "id": str(uuid.uuid4()),
-    }
+    # Si hay actividades parecidas, mostrarlas ordenadas por similitud en el mensaje de error
+    suggestions = activity_catalog.suggest_activities(project_code, phase, clean_activity)
+    activities_found = list(dict.fromkeys(item["activity"] for item in suggestions))
+    if activities_found:
+        raise ValueError(
+            f"No se encontró la actividad exacta: {activity} en la fase '{phase}' "
+            f"y disciplina '{discipline}' del proyecto '{project_code}'. "
+            f"Actividades similares encontradas: {', '.join(activities_found[:5])}"
+        )
 
-    # 5. Insertar en la base de datos
-    response = supabase.table("IB_Reported_Hours").insert(data_to_insert).execute()
-    error_info = getattr(response, "error", None)
-    if error_info:
-        logger.error(f"Supabase insert error: {error_info}")
-    if not response.data:
-        raise ValueError("Error al insertar el registro de horas en la base de datos.")
+    raise ValueError(
+        f"No se encontró la actividad: {activity} en la fase '{phase}' "
+        f"y disciplina '{discipline}' del proyecto '{project_code}'."
+    )
 
-    row = response.data[0]
+def _adjust_row_types(row: dict) -> dict:
     # Ajustar tipos para el esquema
     if isinstance(row.get("employee_id"), str):
         try:
@@ -355,9 +215,355 @@ def create_reported_hour(hour: schemas.ReportedHourCreate):
             row["hours"] = float(row["hours"])
         except ValueError:
             pass
+    return row
+
+def _validate_new_hour(hour: schemas.ReportedHourCreate) -> dict:
+    """Valida y sanitiza un registro nuevo; devuelve los campos ya limpios."""
+    return {
+        "project_code": validate_project_code(hour.project_code),
+        "phase": validate_phase_discipline_activity(hour.phase, "Phase"),
+        "discipline": validate_phase_discipline_activity(hour.discipline, "Discipline"),
+        "activity": validate_phase_discipline_activity(hour.activity, "Activity"),
+        "hours": validate_hours(hour.hours),
+        "date": validate_date(hour.date.isoformat()),
+        "employee_id": validate_employee_id(hour.employee_id),
+        "note": validate_note(hour.note),
+    }
+
+def _hour_insert_payload(validated: dict) -> dict:
+    return {
+        "date": validated["date"],
+        "employee_id": str(validated["employee_id"]),
+        "project_code": validated["project_code"],
+        "phase": validated["phase"],
+        "discipline": validated["discipline"],
+        "activity": validated["activity"],
+        "hours": str(validated["hours"]),
+        "note": validated["note"],
+        "id": str(uuid.uuid4()),
+    }
+
+def _record_write(old_row: dict = None, new_row: dict = None) -> None:
+    """Refleja una escritura en los totales en memoria (tope diario, rollups, almacén columnar y meses cerrados)."""
+    daily_totals.apply(old_row=old_row, new_row=new_row)
+    hours_rollups.apply(old_row=old_row, new_row=new_row)
+    columnar_hours.apply(old_row=old_row, new_row=new_row)
+    closed_months.invalidate_row(old_row)
+    closed_months.invalidate_row(new_row)
+
+def _discard_journal_row(row: dict) -> None:
+    # La fila ya se había contado al encolarla; el servidor la rechazó definitivamente
+    _record_write(old_row=_adjust_row_types(dict(row)))
+
+hours_journal.add_dead_letter_listener(_discard_journal_row)
+
+def create_reported_hour(hour: schemas.ReportedHourCreate):
+    # 1. Validar y sanitizar los datos de entrada
+    validated = _validate_new_hour(hour)
+
+    # 2. Validar que el proyecto existe
+    project = get_project_by_code(validated["project_code"])
+    if not project:
+        raise ValueError(f"Proyecto no encontrado: {validated['project_code']}")
+
+    # 3. Obtener el ID de la actividad
+    get_activity_id(
+        validated["project_code"], validated["phase"], validated["discipline"], validated["activity"]
+    )
+
+    # 4. Validar el tope de horas del día (totales en memoria) y reservar las horas hasta registrar el insert
+    with daily_totals.reserved(validated["employee_id"], validated["date"], validated["hours"]):
+        # 5. Preparar los datos para la inserción
+        data_to_insert = _hour_insert_payload(validated)
+
+        # 6. Insertar en la base de datos
+        response = db.table("IB_Reported_Hours").insert(data_to_insert).execute()
+        error_info = getattr(response, "error", None)
+        if error_info:
+            logger.error(f"Supabase insert error: {error_info}")
+        if not response.data:
+            raise ValueError("Error al insertar el registro de horas en la base de datos.")
+
+        row = _adjust_row_types(response.data[0])
+        _record_write(new_row=row)
+    return row
+
+def enqueue_reported_hour(hour: schemas.ReportedHourCreate):
+    """
+    Valida un registro y lo deja en el diario local (modo write-behind).
+
+    El proyecto y la actividad se validan contra las copias en memoria, así que
+    no hace falta que Supabase responda; el flusher del diario hace el insert.
+    """
+    validated = _validate_new_hour(hour)
+
+    if not projects_table.get(validated["project_code"]) and not get_project_by_code(validated["project_code"]):
+        raise ValueError(f"Proyecto no encontrado: {validated['project_code']}")
 
+    get_activity_id(
+        validated["project_code"], validated["phase"], validated["discipline"], validated["activity"]
+    )
+
+    with daily_totals.reserved(validated["employee_id"], validated["date"], validated["hours"]):
+        data_to_insert = _hour_insert_payload(validated)
+        hours_journal.append(data_to_insert)
+        row = _adjust_row_types(dict(data_to_insert))
+        _record_write(new_row=row)
     return row
 
+def _existing_project_codes(project_codes: set) -> set:
+    """Códigos que existen en IB_Projects: primero en memoria, una sola consulta para el resto."""
+    found = {code for code in project_codes if projects_table.get(code)}
+    missing = project_codes - found
+    if missing:
+        response = (
+            db
+            .table("IB_Projects")
+            .select("code")
+            .in_("code", sorted(missing))
+            .execute()
+        )
+        found |= {row["code"] for row in response.data or []}
+    return found
+
+def create_reported_hours_batch(hours: list[schemas.ReportedHourCreate]) -> dict:
+    """
+    Valida y registra varias horas a la vez.
+
+    Los proyectos y actividades se resuelven en conjunto (memoria + una consulta
+    por lo que falte) y todas las filas válidas van en un solo insert. Una fila
+    inválida no impide registrar las demás.
+
+    Returns:
+        Dict con el número de filas creadas y fallidas y el resultado de cada fila
+    """
+    results = [{"index": index, "ok": False, "data": None, "error": None} for index in range(len(hours))]
+
+    # 1. Validar cada fila por separado
+    validated_rows = {}
+    for index, hour in enumerate(hours):
+        try:
+            validated_rows[index] = _validate_new_hour(hour)
+        except ValueError as e:
+            results[index]["error"] = str(e)
+
+    # 2. Validar los proyectos en conjunto
+    existing_codes = _existing_project_codes({row["project_code"] for row in validated_rows.values()})
+
+    # 3. Resolver actividades, validar el tope diario y armar el insert. Cada
+    #    fila reserva sus horas, así que las siguientes del lote ya las cuentan
+    payloads = []
+    payload_indexes = []
+    reservations = []
+    try:
+        for index, validated in validated_rows.items():
+            if validated["project_code"] not in existing_codes:
+                results[index]["error"] = f"Proyecto no encontrado: {validated['project_code']}"
+                continue
+            try:
+                get_activity_id(
+                    validated["project_code"], validated["phase"], validated["discipline"], validated["activity"]
+                )
+                reservations.append(
+                    daily_totals.reserve(validated["employee_id"], validated["date"], validated["hours"])
+                )
+            except ValueError as e:
+                results[index]["error"] = str(e)
+                continue
+            payloads.append(_hour_insert_payload(validated))
+            payload_indexes.append(index)
+
+        # 4. Un solo insert con todas las filas válidas (COPY con el backend postgres)
+        if payloads:
+            try:
+                inserted = {row["id"]: _adjust_row_types(row) for row in bulk_insert("IB_Reported_Hours", payloads)}
+            except Exception as e:
+                logger.error(f"Supabase batch insert error: {e}", exc_info=True)
+                inserted = {}
+            for index, payload in zip(payload_indexes, payloads):
+                row = inserted.get(payload["id"])
+                if row is None:
+                    results[index]["error"] = "Error al insertar el registro de horas en la base de datos."
+                else:
+                    results[index]["ok"] = True
+                    results[index]["data"] = row
+                    _record_write(new_row=row)
+    finally:
+        for token in reservations:
+            daily_totals.release(token)
+
+    created = sum(1 for result in results if result["ok"])
+    logger.info(f"Batch de horas: {created} creadas, {len(results) - created} con error")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+# Campos que se comparan para decidir si un registro de la semana cambió
+_WEEK_COMPARED_FIELDS = ("date", "project_code", "phase", "discipline", "activity", "hours", "note")
+
+def _week_comparable(row: dict) -> tuple:
+    row = _adjust_row_types(dict(row))
+    return tuple(
+        float(row.get(field) or 0) if field == "hours" else row.get(field)
+        for field in _WEEK_COMPARED_FIELDS
+    )
+
+def upsert_week_hours(week: schemas.WeekHoursUpsert) -> dict:
+    """
+    Deja la semana ISO de un empleado igual al conjunto de registros recibido.
+
+    Calcula la diferencia contra lo guardado y aplica solo lo necesario: una
+    consulta de lectura, un upsert para altas y cambios y un delete para bajas.
+
+    Returns:
+        Dict con los registros resultantes de la semana y el resumen de cambios
+    """
+    employee_id = validate_employee_id(week.employee_id)
+    try:
+        week_start = date.fromisocalendar(week.year, week.week, 1)
+    except ValueError:
+        raise ValueError(f"Semana ISO inválida: {week.year}-W{week.week}")
+    week_end = date.fromisocalendar(week.year, week.week, 7)
+
+    # 1. Validar todos los registros antes de tocar nada
+    desired = []
+    for entry in week.entries:
+        if not week_start <= entry.date <= week_end:
+            raise ValueError(f"La fecha {entry.date.isoformat()} no pertenece a la semana {week.year}-W{week.week:02d}")
+        validated = _validate_new_hour(schemas.ReportedHourCreate(
+            date=entry.date,
+            employee_id=employee_id,
+            project_code=entry.project_code,
+            phase=entry.phase,
+            discipline=entry.discipline,
+            activity=entry.activity,
+            hours=entry.hours,
+            note=entry.note,
+        ))
+        desired.append((entry.id, validated))
+
+    existing_codes = _existing_project_codes({validated["project_code"] for _, validated in desired})
+    for _, validated in desired:
+        if validated["project_code"] not in existing_codes:
+            raise ValueError(f"Proyecto no encontrado: {validated['project_code']}")
+        get_activity_id(
+            validated["project_code"], validated["phase"], validated["discipline"], validated["activity"]
+        )
+
+    # La semana recibida reemplaza a la guardada, así que el total de cada día es
+    # la suma recibida; se reserva hasta dejar registrada la semana escrita
+    week_day_hours = {}
+    for _, validated in desired:
+        week_day_hours[validated["date"]] = week_day_hours.get(validated["date"], 0.0) + validated["hours"]
+    reservations = []
+    try:
+        for day, total in sorted(week_day_hours.items()):
+            reservations.append(daily_totals.reserve(employee_id, day, total, replace=True))
+
+        # 2. Lo que hay guardado para esa semana
+        stored_resp = (
+            db
+            .table("IB_Reported_Hours")
+            .select("*")
+            .eq("employee_id", str(employee_id))
+            .gte("date", week_start.isoformat())
+            .lte("date", week_end.isoformat())
+            .execute()
+        )
+        stored = {row["id"]: row for row in stored_resp.data or []}
+
+        # 3. Diferencia: los registros con id se comparan con el suyo; los que no traen id
+        #    se emparejan con un registro idéntico sin reclamar antes de darlos por nuevos
+        upserts = []
+        kept_ids = set()
+        unchanged_rows = []
+        inserted = updated = 0
+        pending_new = []
+        for entry_id, validated in desired:
+            if entry_id is None:
+                pending_new.append(validated)
+                continue
+            if entry_id not in stored:
+                raise ValueError(f"El registro {entry_id} no pertenece al empleado {employee_id} en esa semana")
+            if entry_id in kept_ids:
+                raise ValueError(f"El registro {entry_id} aparece más de una vez")
+            kept_ids.add(entry_id)
+            payload = {**_hour_insert_payload(validated), "id": entry_id}
+            if _week_comparable(payload) == _week_comparable(stored[entry_id]):
+                unchanged_rows.append(stored[entry_id])
+            else:
+                upserts.append(payload)
+                updated += 1
+
+        for validated in pending_new:
+            payload = _hour_insert_payload(validated)
+            wanted = _week_comparable(payload)
+            twin = next(
+                (row_id for row_id, row in stored.items() if row_id not in kept_ids and _week_comparable(row) == wanted),
+                None,
+            )
+            if twin is not None:
+                kept_ids.add(twin)
+                unchanged_rows.append(stored[twin])
+            else:
+                upserts.append(payload)
+                inserted += 1
+
+        to_delete = [row_id for row_id in stored if row_id not in kept_ids]
+
+        # 4. Aplicar con el mínimo de llamadas; con el backend postgres, todo o nada
+        written_rows = []
+        with transaction():
+            if upserts:
+                response = db.table("IB_Reported_Hours").upsert(upserts, on_conflict="id").execute()
+                if not response.data:
+                    raise ValueError("Error al guardar los registros de la semana en la base de datos.")
+                written_rows = response.data
+            if to_delete:
+                db.table("IB_Reported_Hours").delete().in_("id", to_delete).execute()
+
+        entries = [_adjust_row_types(dict(row)) for row in unchanged_rows + written_rows]
+        entries.sort(key=lambda row: (row.get("date") or "", row.get("id") or ""))
+        for row in written_rows:
+            _record_write(new_row=row)
+        for row_id in to_delete:
+            _record_write(old_row=stored[row_id])
+        daily_totals.seed_week(employee_id, week_start.isoformat(), entries)
+    finally:
+        for token in reservations:
+            daily_totals.release(token)
+    logger.info(
+        f"Semana {week.year}-W{week.week:02d} empleado {employee_id}: "
+        f"{inserted} nuevos, {updated} actualizados, {len(to_delete)} eliminados"
+    )
+    return {
+        "employee_id": employee_id,
+        "year": week.year,
+        "week": week.week,
+        "entries": entries,
+        "diff": {
+            "inserted": inserted,
+            "updated": updated,
+            "deleted": len(to_delete),
+            "unchanged": len(unchanged_rows),
+        },
+    }
+
+def _current_hour_totals(hour_id: str) -> dict:
+    """Empleado, fecha y horas actuales de un registro: de los totales en memoria o con una consulta."""
+    cached = daily_totals.lookup(hour_id)
+    if cached is not None:
+        (employee_id, day), hours = cached
+        return {"id": hour_id, "employee_id": employee_id, "date": day, "hours": hours}
+    response = (
+        db
+        .table("IB_Reported_Hours")
+        .select("id, employee_id, date, hours")
+        .eq("id", hour_id)
+        .execute()
+    )
+    if not response.data:
+        raise ValueError(f"No se encontró el registro con id {hour_id} para actualizar.")
+    return _adjust_row_types(response.data[0])
+
 def update_reported_hour(hour_id: str, hour_update: schemas.ReportedHourUpdate):
     try:
         data_to_update = hour_update.dict(exclude_unset=True)
@@ -392,29 +598,44 @@ def update_reported_hour(hour_id: str, hour_update: schemas.ReportedHourUpdate):
         if "note" in data_to_update:
             data_to_update["note"] = validate_note(data_to_update["note"])
 
-        response = (
-            supabase
-            .table("IB_Reported_Hours")
-            .update(data_to_update)
-            .eq("id", hour_id)
-            .execute()
-        )
-        if not response.data:
-            raise ValueError(f"No se encontró el registro con id {hour_id} para actualizar.")
+        # Validar el tope diario solo si cambian las horas, la fecha o el empleado,
+        # reservando las horas nuevas hasta registrar la actualización
+        current = {"id": hour_id}
+        reservation = nullcontext()
+        if {"hours", "date", "employee_id"} & data_to_update.keys():
+            current = _current_hour_totals(hour_id)
+            reservation = daily_totals.reserved(
+                data_to_update.get("employee_id", current["employee_id"]),
+                str(data_to_update.get("date") or current["date"])[:10],
+                data_to_update.get("hours", current["hours"]),
+                exclude_id=hour_id,
+            )
 
-        row = response.data[0]
-        # Ajustar tipos para el esquema
-        if isinstance(row.get("employee_id"), str):
-            try:
-                row["employee_id"] = int(row["employee_id"])
-            except ValueError:
-                pass
-        if isinstance(row.get("hours"), str):
-            try:
-                row["hours"] = float(row["hours"])
-            except ValueError:
-                pass
+        with reservation:
+            response = (
+                db
+                .table("IB_Reported_Hours")
+                .update(data_to_update)
+                .eq("id", hour_id)
+                .execute()
+            )
+            if not response.data:
+                raise ValueError(f"No se encontró el registro con id {hour_id} para actualizar.")
 
+            row = response.data[0]
+            # Ajustar tipos para el esquema
+            if isinstance(row.get("employee_id"), str):
+                try:
+                    row["employee_id"] = int(row["employee_id"])
+                except ValueError:
+                    pass
+            if isinstance(row.get("hours"), str):
+                try:
+                    row["hours"] = float(row["hours"])
+                except ValueError:
+                    pass
+
+            _record_write(old_row=current, new_row=row)
         return row
 
     except Exception as e:
@@ -424,7 +645,7 @@ def update_reported_hour(hour_id: str, hour_update: schemas.ReportedHourUpdate):
 def delete_reported_hour(hour_id: str):
     try:
         response = (
-            supabase
+            db
             .table("IB_Reported_Hours")
             .delete()
             .eq("id", hour_id)
@@ -446,39 +667,41 @@ def delete_reported_hour(hour_id: str):
             except ValueError:
                 pass
 
+        _record_write(old_row=row)
         return row
 
     except Exception as e:
         logger.error(f"Error al eliminar el registro de horas: {e}", exc_info=True)
         raise
 
+@reads.wrap()
 def get_daily_activities(date: str, employee_id: int):
     """Devuelve las horas reportadas del día (YYYY-MM-DD) junto al nombre del proyecto."""
     logger.info("▶ get_daily_activities | date=%s employee_id=%s", date, employee_id)
 
     try:
-        # 1. Traer horas del día para el empleado con retry
-        hours_resp = _retry_supabase_operation(
-            lambda: supabase
-                .table("IB_Reported_Hours")
-                .select("*")
-                .eq("date", date)
-                .eq("employee_id", str(employee_id))
-                .execute()
+        # 1. Traer horas del día para el empleado (los reintentos los hace el repositorio)
+        hours_resp = (
+            db
+            .table("IB_Reported_Hours")
+            .select("*")
+            .eq("date", date)
+            .eq("employee_id", str(employee_id))
+            .execute()
         )
 
         if not hours_resp.data:
             logger.info("Sin registros de horas para esos criterios")
             return []
 
-        # 2. Obtener nombres de proyectos con retry
+        # 2. Obtener nombres de proyectos
         project_codes = list({h["project_code"] for h in hours_resp.data})
-        proj_resp = _retry_supabase_operation(
-            lambda: supabase
-                .table("IB_Projects")
-                .select("code, name")
-                .in_("code", project_codes)
-                .execute()
+        proj_resp = (
+            db
+            .table("IB_Projects")
+            .select("code, name")
+            .in_("code", project_codes)
+            .execute()
         )
 
         projects_map = {p["code"]: p["name"] for p in (proj_resp.data or [])}
@@ -508,95 +731,360 @@ def get_daily_activities(date: str, employee_id: int):
         raise
 
 
-def get_grouped_hours_by_employee(year: int, month: int):
-    """Fetch records from IB_Reported_Hours for a specific year and month, grouped by employee, summing hours per day."""
-    logger.info(f"▶ get_grouped_hours_by_employee | year={year} month={month}")
-    
-    # Calculate the start and end date for the given month
-    from datetime import date
-    import calendar
-    
-    start_date = date(year, month, 1)
-    last_day = calendar.monthrange(year, month)[1]
-    end_date = date(year, month, last_day)
-    
-    # 1. Fetch records from IB_Reported_Hours for the specific month
-    hours_resp = (
-        supabase
-        .table("IB_Reported_Hours")
-        .select("*")
-        .gte("date", start_date.isoformat())
-        .lte("date", end_date.isoformat())
-        .execute()
+@reads.wrap()
+def get_daily_activities_range(date_from: str, date_to: str, employee_id: int) -> dict:
+    """
+    Horas reportadas de un empleado entre dos fechas, agrupadas por día.
+
+    Una sola lectura paginada de IB_Reported_Hours; el nombre del proyecto sale
+    de la copia en memoria de IB_Projects. Cada día del rango aparece aunque
+    no tenga registros, con banderas de cobertura para el calendario.
+
+    Returns:
+        Dict con los días del rango, sus actividades y el resumen de cobertura
+    """
+    logger.info("▶ get_daily_activities_range | from=%s to=%s employee_id=%s", date_from, date_to, employee_id)
+    employee_id = validate_employee_id(employee_id)
+    start = date.fromisoformat(validate_date(date_from))
+    end = date.fromisoformat(validate_date(date_to))
+    if start > end:
+        raise ValueError("La fecha inicial no puede ser posterior a la fecha final")
+    day_count = (end - start).days + 1
+    if day_count > DAILY_ACTIVITIES_MAX_DAYS:
+        raise ValueError(f"El rango no puede superar {DAILY_ACTIVITIES_MAX_DAYS} días")
+
+    rows = iter_rows(
+        lambda: db
+            .table("IB_Reported_Hours")
+            .select("*")
+            .eq("employee_id", str(employee_id))
+            .gte("date", start.isoformat())
+            .lte("date", end.isoformat()),
+        key=("date", "id"),
     )
-    
-    if not hours_resp.data:
-        logger.info("No records found in IB_Reported_Hours")
-        return []
-    
-    # 2. Fetch all employees to get their short names
-    employees_resp = supabase.table("IB_Members").select("id, name, short_name").execute()
-    employees_map = {emp["id"]: {"name": emp["name"], "short_name": emp["short_name"]} for emp in employees_resp.data}
-    
-    # 3. Process and group the data
-    grouped_data = {}
-    
-    for row in hours_resp.data:
-        # Extract date and employee_id
-        date = row.get("date")
-        employee_id = row.get("employee_id")
-        
-        # Convert employee_id to int for lookup if it's a string
-        employee_id_key = employee_id
-        if isinstance(employee_id, str):
-            try:
-                employee_id_key = int(employee_id)
-            except ValueError:
-                # Skip records with invalid employee_id
+    by_day = {}
+    for row in rows:
+        project = projects_table.get(row.get("project_code")) or {}
+        by_day.setdefault(str(row.get("date"))[:10], []).append({
+            **row,
+            "project_name": project.get("name") or "Proyecto no encontrado",
+        })
+
+    days = []
+    missing_workdays = []
+    total_hours = 0.0
+    for offset in range(day_count):
+        day = start + timedelta(days=offset)
+        activities = by_day.get(day.isoformat(), [])
+        day_hours = sum(_coerce_hours(activity.get("hours")) for activity in activities)
+        is_workday = day.weekday() < 5
+        if is_workday and not activities:
+            missing_workdays.append(day)
+        total_hours += day_hours
+        days.append({
+            "date": day,
+            "weekday": day.weekday(),
+            "is_workday": is_workday,
+            "has_activities": bool(activities),
+            "total_hours": round(day_hours, 2),
+            "activities": activities,
+        })
+
+    return {
+        "employee_id": employee_id,
+        "date_from": start,
+        "date_to": end,
+        "total_hours": round(total_hours, 2),
+        "days_with_activities": sum(1 for day in days if day["has_activities"]),
+        "missing_workdays": missing_workdays,
+        "days": days,
+    }
+
+def _coerce_hours(hours) -> float:
+    # Las horas se guardan como texto; un valor ilegible cuenta como 0
+    if isinstance(hours, str):
+        try:
+            return float(hours)
+        except ValueError:
+            return 0.0
+    if isinstance(hours, (int, float)):
+        return float(hours)
+    return 0.0
+
+def _aggregate_rpc(function_name: str, params: dict, key: tuple):
+    """
+    Llama a una función de agregación de Postgres por RPC.
+
+    max-rows de PostgREST también corta las respuestas de RPC, así que el
+    resultado se pide por páginas con iter_rows sobre `key`, las columnas de
+    agrupación que identifican cada fila.
+
+    Returns:
+        Las filas devueltas, o None si la función no está disponible
+    """
+    if not function_name or time.monotonic() < _rpc_unavailable_until.get(function_name, 0.0):
+        return None
+    try:
+        return fetch_all(lambda: db.rpc(function_name, params), key=key)
+    except Exception as e:
+        # Sin la función en la base: agregar en Python y volver a intentar más tarde
+        _rpc_unavailable_until[function_name] = time.monotonic() + AGGREGATE_RPC_RETRY_SECONDS
+        logger.warning(f"RPC {function_name} no disponible, se agrega en Python: {e}")
+        return None
+
+def _grouped_hours_rpc(start_date: date, end_date: date):
+    """Suma por (fecha, empleado) calculada en Postgres (ver backend/sql/grouped_hours_by_employee.sql)."""
+    return _aggregate_rpc(
+        GROUPED_HOURS_RPC,
+        {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
+        key=("date", "employee_id"),
+    )
+
+def _grouped_hours_python(start_date: date, end_date: date) -> list:
+    """Agrupa en Python las filas del rango; solo se piden las columnas necesarias."""
+    rows = iter_rows(
+        lambda: db
+            .table("IB_Reported_Hours")
+            .select("id, date, employee_id, hours")
+            .gte("date", start_date.isoformat())
+            .lte("date", end_date.isoformat()),
+        key="id",
+    )
+    totals = {}
+    for row in rows:
+        key = (row.get("date"), str(row.get("employee_id")))
+        totals[key] = totals.get(key, 0.0) + _coerce_hours(row.get("hours", 0))
+    return [
+        {"date": day, "employee_id": employee_id, "hours": hours}
+        for (day, employee_id), hours in totals.items()
+    ]
+
+def _month_range(from_month: str, to_month: str) -> list:
+    """Meses YYYY-MM desde `from_month` hasta `to_month`, ambos incluidos."""
+    try:
+        first = date.fromisoformat(f"{from_month}-01")
+        last = date.fromisoformat(f"{to_month}-01")
+    except (TypeError, ValueError):
+        raise ValueError("Los meses deben tener el formato YYYY-MM")
+    if first > last:
+        raise ValueError("El mes inicial no puede ser posterior al mes final")
+    count = (last.year - first.year) * 12 + last.month - first.month + 1
+    if count > GROUPED_HOURS_MAX_MONTHS:
+        raise ValueError(f"El rango no puede superar {GROUPED_HOURS_MAX_MONTHS} meses")
+    return [
+        month_key(first.year + (first.month - 1 + offset) // 12, (first.month - 1 + offset) % 12 + 1)
+        for offset in range(count)
+    ]
+
+def _grouped_rows_by_month(months: list):
+    """
+    Sumas por (fecha, empleado) de cada mes pedido.
+
+    Con rollups se lee cada mes de memoria; sin ellos se hace una consulta
+    (RPC paginada o Python) por cada tramo de meses consecutivos, para no
+    volver a pedir los meses ya cacheados que quedan entre medias.
+
+    Returns:
+        (dict mes -> filas, origen)
+    """
+    if HOURS_ROLLUPS_ENABLED:
+        by_month = {}
+        for month in months:
+            days = hours_rollups.employee_days(int(month[:4]), int(month[5:7]))
+            by_month[month] = [
+                {"date": day, "employee_id": employee_id, "hours": hours}
+                for (employee_id, day), hours in sorted(days.items(), key=lambda item: item[0][1])
+            ]
+        return by_month, "rollup"
+
+    by_month = {month: [] for month in months}
+    source = "rpc"
+    for run in _contiguous_runs(months):
+        start_date = date.fromisoformat(f"{run[0]}-01")
+        end_date = month_end(run[-1])
+        rows = _grouped_hours_rpc(start_date, end_date)
+        if rows is None:
+            rows = _grouped_hours_python(start_date, end_date)
+            source = "python"
+        for row in sorted(rows, key=lambda row: str(row.get("date"))):
+            bucket = by_month.get(str(row.get("date"))[:7])
+            if bucket is not None:
+                bucket.append(row)
+    return by_month, source
+
+def _contiguous_runs(months: list) -> list:
+    """Parte la lista ordenada de meses YYYY-MM en tramos de meses consecutivos."""
+    runs = []
+    for month in months:
+        if runs:
+            following = month_end(runs[-1][-1]) + timedelta(days=1)
+            if month == month_key(following.year, following.month):
+                runs[-1].append(month)
                 continue
-        
-        # Get employee info
-        employee_info = employees_map.get(employee_id_key)
-        
-        # Skip records with missing employee data
-        if not employee_info:
-            continue
-        
-        # Create a unique key for grouping
-        key = (date, employee_id)
-        
-        # Convert hours to float
-        hours = row.get("hours", 0)
-        if isinstance(hours, str):
-            try:
-                hours = float(hours)
-            except ValueError:
-                hours = 0
-        elif not isinstance(hours, (int, float)):
-            hours = 0
-        
-        # Add to grouped data
-        if key in grouped_data:
-            grouped_data[key]["hours"] += hours
-        else:
-            grouped_data[key] = {
-                "date": date,
-                "employee_id": str(employee_id),
+        runs.append([month])
+    return runs
+
+@reads.wrap()
+def get_grouped_hours_by_employee_range(from_month: str, to_month: str):
+    """
+    Horas sumadas por (fecha, empleado) entre dos meses YYYY-MM, con el nombre corto del empleado.
+
+    Los meses cerrados (ver utils/month_cache.py) se sirven de la caché y solo
+    se recalculan después de una escritura en ese mes; el mes abierto y los
+    que falten se calculan juntos. Los nombres salen de la copia en memoria
+    de IB_Members.
+    """
+    logger.info(f"▶ get_grouped_hours_by_employee_range | from={from_month} to={to_month}")
+    months = _month_range(from_month, to_month)
+
+    source = "cache"
+
+    def compute(missing: list) -> dict:
+        nonlocal source
+        computed, source = _grouped_rows_by_month(missing)
+        return computed
+
+    grouped, from_cache = closed_months.get_or_compute(months, compute)
+
+    result = []
+    for month in months:
+        for row in grouped[month]:
+            employee_id = str(row.get("employee_id"))
+            # Se omiten registros de empleados que no existen en IB_Members
+            employee_info = members_table.get(employee_id)
+            if not employee_info:
+                continue
+            result.append({
+                "date": str(row.get("date")),
+                "employee_id": employee_id,
                 "short_name": employee_info["short_name"],
-                "hours": hours
-            }
-    
-    # 4. Convert to list format
-    result = list(grouped_data.values())
-    
-    logger.info(f"Grouped hours by employee: {len(result)} records")
+                "hours": _coerce_hours(row.get("hours", 0)),
+            })
+
+    logger.info(
+        f"Grouped hours by employee ({source}): {len(result)} records, "
+        f"{from_cache}/{len(months)} months from cache"
+    )
     return result
 
+def get_grouped_hours_by_employee(year: int, month: int):
+    """Horas del mes sumadas por (fecha, empleado); ver get_grouped_hours_by_employee_range."""
+    return get_grouped_hours_by_employee_range(month_key(year, month), month_key(year, month))
+
+@reads.wrap()
+def get_grouped_hours_by_activity(year: int, month: int, project_code: str = None):
+    """Horas del mes sumadas por (proyecto, fase, disciplina), leídas del rollup mensual."""
+    logger.info(f"▶ get_grouped_hours_by_activity | year={year} month={month} project={project_code}")
+    totals = hours_rollups.activity_totals(year, month, project_code)
+    result = [
+        {
+            "project_code": code,
+            "phase": phase,
+            "discipline": discipline,
+            "month": f"{year:04d}-{month:02d}",
+            "hours": hours,
+        }
+        for (code, phase, discipline), hours in totals.items()
+    ]
+    result.sort(key=lambda row: (row["project_code"] or "", row["phase"] or "", row["discipline"] or ""))
+    return result
+
+def _project_hours_by_activity(project_code: str) -> list:
+    """Horas reportadas del proyecto sumadas por (fase, disciplina, actividad): por RPC o en Python."""
+    grouped = _aggregate_rpc(PROJECT_HOURS_RPC, {"code": project_code}, key=("phase", "discipline", "activity"))
+    if grouped is not None:
+        return grouped
+    totals = {}
+    rows = iter_rows(
+        lambda: db
+            .table("IB_Reported_Hours")
+            .select("id, phase, discipline, activity, hours")
+            .eq("project_code", project_code),
+        key="id",
+    )
+    for row in rows:
+        key = (row.get("phase"), row.get("discipline"), row.get("activity"))
+        totals[key] = totals.get(key, 0.0) + _coerce_hours(row.get("hours", 0))
+    return [
+        {"phase": phase, "discipline": discipline, "activity": activity, "hours": hours}
+        for (phase, discipline, activity), hours in totals.items()
+    ]
+
+@reads.wrap()
+def get_project_burn(project_code: str):
+    """
+    Presupuesto de horas de cada actividad del proyecto contra las horas reportadas.
+
+    Returns:
+        Dict con totales del proyecto, por fase, por disciplina y por actividad,
+        o None si el proyecto no existe
+    """
+    clean_code = project_code.strip()
+    if not projects_table.get(clean_code) and not get_project_by_code(clean_code):
+        return None
+    budgets = fetch_all(
+        lambda: db
+            .table("IB_Activities")
+            .select("activity_id, phase, discipline, activity, hours_direction, hours_engineering, hours_modeling_ad, hours")
+            .eq("project_code", clean_code),
+        key="activity_id",
+    )
+    return compute_burn(clean_code, budgets, _project_hours_by_activity(clean_code))
+
+def get_hours_analytics(group_by: list, date_from: str = None, date_to: str = None, filters: dict = None):
+    """
+    Horas agrupadas por cualquier combinación de dimensiones, desde el almacén columnar.
+
+    Agrega el nombre corto del empleado y el nombre del proyecto cuando se
+    agrupa por esas dimensiones.
+    """
+    rows = columnar_hours.group_by(group_by, date_from, date_to, filters)
+    if "employee" in group_by:
+        for row in rows:
+            member = members_table.get(row["employee"]) or {}
+            row["employee_short_name"] = member.get("short_name")
+    if "project" in group_by:
+        for row in rows:
+            project = projects_table.get(row["project"]) or {}
+            row["project_name"] = project.get("name")
+    return rows
+
+def iter_hours_export(date_from: str, date_to: str, project_code: str = None, employee_id: int = None):
+    """
+    Recorre las horas reportadas de un rango de fechas (inclusive), ordenadas por fecha.
+
+    Las filas se leen por páginas y se completan con los nombres de proyecto y
+    empleado de las copias en memoria, así que el consumo de memoria es el de
+    una página sin importar el tamaño del rango.
+    """
+    def query():
+        builder = (
+            db
+            .table("IB_Reported_Hours")
+            .select("id, date, employee_id, project_code, phase, discipline, activity, hours, note")
+            .gte("date", date_from)
+            .lte("date", date_to)
+        )
+        if project_code:
+            builder = builder.eq("project_code", project_code)
+        if employee_id is not None:
+            builder = builder.eq("employee_id", str(employee_id))
+        return builder
+
+    for row in iter_rows(query, key=("date", "id")):
+        row = _adjust_row_types(row)
+        project = projects_table.get(row.get("project_code")) or {}
+        member = members_table.get(row.get("employee_id")) or {}
+        row["project_name"] = project.get("name")
+        row["employee_name"] = member.get("name")
+        row["employee_short_name"] = member.get("short_name")
+        yield row
+
 def update_user_password(username: str, new_password_hash: str):
     """Update a user's password hash in the database"""
     try:
         response = (
-            supabase
+            db
             .table("IB_Authentication")
             .update({"password": new_password_hash})
             .eq("user", username)
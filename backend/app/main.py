@@ -1,5 +1,8 @@
 # main.py
-from fastapi import FastAPI, status, Request
+from contextlib import asynccontextmanager
+import logging
+from fastapi import Depends, FastAPI, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
@@ -10,6 +13,19 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from .routers import projects, activities, hours, employees, daily_activities, auth
+from . import async_crud
+from .utils import metrics
+from .utils.admin import require_admin
+from .utils.catalog import activity_catalog
+from .utils.reference import projects_table, members_table
+from .utils.snapshot import snapshot_store
+from .utils.sync import sync_engine
+from .utils.journal import HOURS_WRITE_BEHIND, hours_journal
+from .utils.rollups import HOURS_ROLLUPS_ENABLED, hours_rollups
+from .utils.columnar import COLUMNAR_ANALYTICS_ENABLED, columnar_hours
+from .utils.resilience import UpstreamUnavailableError, request_budget
+
+logger = logging.getLogger(__name__)
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
@@ -20,10 +36,61 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         response.headers['Content-Security-Policy'] = "default-src 'self'; style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://fonts.googleapis.com; script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; img-src 'self' https://fastapi.tiangolo.com data: https://*.gravatar.com; connect-src 'self' https://backend.yeisonduque.top https://gdbcmjorqafcwmwhyhrn.supabase.co https://cdn.jsdelivr.net wss: ws:; font-src 'self' https://fonts.gstatic.com;"
         return response
 
+class UpstreamBudgetMiddleware(BaseHTTPMiddleware):
+    """
+    Fija el deadline de la petición para los reintentos (utils/resilience.py)
+    y responde 503 con Retry-After si falló porque el circuit breaker está abierto.
+    """
+
+    async def dispatch(self, request, call_next):
+        with request_budget() as budget:
+            try:
+                response = await call_next(request)
+            except UpstreamUnavailableError as e:
+                budget.unavailable = e
+                response = JSONResponse(status_code=500, content={"detail": str(e)})
+        # Los routers convierten los errores en 500; aquí se distingue la indisponibilidad
+        if budget.unavailable is not None and response.status_code == 500:
+            return JSONResponse(
+                status_code=503,
+                content={"detail": str(budget.unavailable)},
+                headers={"Retry-After": str(budget.unavailable.retry_after)},
+            )
+        return response
+
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Arrancar desde la copia en disco si existe y refrescar en segundo plano;
+    # si no hay copia, precargar desde Supabase (o en la primera petición si falla)
+    for cache in (activity_catalog, projects_table, members_table):
+        snapshot_store.attach(cache)
+        if await run_in_threadpool(snapshot_store.restore, cache):
+            cache.refresh_in_background()
+            continue
+        try:
+            await run_in_threadpool(cache.refresh)
+        except Exception as e:
+            logger.warning(f"{cache.name} preload failed: {e}")
+    # A partir de aquí solo se traen los cambios
+    sync_engine.start()
+    if HOURS_WRITE_BEHIND:
+        hours_journal.start()
+    if HOURS_ROLLUPS_ENABLED:
+        hours_rollups.start()
+    if COLUMNAR_ANALYTICS_ENABLED:
+        columnar_hours.start()
+    yield
+    sync_engine.stop()
+    hours_rollups.stop()
+    columnar_hours.stop()
+    if HOURS_WRITE_BEHIND:
+        await run_in_threadpool(hours_journal.stop)
+    await async_crud.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Custom exception handlers
 @app.exception_handler(StarletteHTTPException)
@@ -50,6 +117,7 @@ async def general_exception_handler(request: Request, exc: Exception):
 # Add rate limiting middleware
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_middleware(UpstreamBudgetMiddleware)
 app.add_middleware(SlowAPIMiddleware)
 
 # Configuración de CORS
@@ -102,8 +170,8 @@ def database_health_check(request: Request):
     """Endpoint de verificación de salud de la base de datos"""
     try:
         # Test basic database connectivity
-        from .database import supabase
-        response = supabase.table("IB_Projects").select("code").limit(1).execute()
+        from .repository import db
+        response = db.table("IB_Projects").select("code").limit(1).execute()
 
         return {
             "status": "ok",
@@ -119,3 +187,9 @@ def database_health_check(request: Request):
                 "timestamp": request.headers.get("date", "unknown")
             }
         )
+
+@app.get("/metrics", status_code=status.HTTP_200_OK, dependencies=[Depends(require_admin)])
+@limiter.limit("30/minute")
+def read_metrics(request: Request):
+    """Métricas internas de los índices y cachés en memoria"""
+    return metrics.collect()
@@ -0,0 +1,61 @@
+"""
+Backend de datos del API, elegido con DATA_BACKEND.
+
+- "rest" (por defecto): cliente de Supabase, una petición HTTP a PostgREST por consulta.
+- "postgres": SQL directo con el pool de SQLAlchemy (ver sql.py), con
+  transacciones, GROUP BY en el servidor y COPY para inserciones masivas.
+- "memory": tablas en memoria con índices (ver memory.py), cargadas desde
+  seed.py; no necesita red ni credenciales.
+
+`db` implementa la interfaz de base.Repository en los tres casos. Los
+backends con red van envueltos en ResilientRepository (reintentos, circuit
+breaker y deadline por petición, ver utils/resilience.py).
+"""
+import logging
+import os
+from typing import Iterator, List
+
+from ..utils import metrics
+from .base import TABLES, Repository
+from .resilient import ResilientRepository
+
+logger = logging.getLogger(__name__)
+
+DATA_BACKEND = os.getenv("DATA_BACKEND", "rest").strip().lower()
+DATA_BACKENDS = ("rest", "postgres", "memory")
+
+def create_repository(backend: str) -> Repository:
+    if backend == "rest":
+        from ..database import get_supabase
+        from .rest import RestRepository
+
+        return ResilientRepository(RestRepository(get_supabase()))
+    if backend == "postgres":
+        from ..database import engine
+        from .sql import SqlRepository
+
+        return ResilientRepository(SqlRepository(engine))
+    if backend == "memory":
+        from .memory import MemoryRepository
+        from .seed import seed_data
+
+        repository = MemoryRepository()
+        repository.load(seed_data())
+        return repository
+    raise ValueError(f"DATA_BACKEND inválido: {backend!r} (opciones: {', '.join(DATA_BACKENDS)})")
+
+db = create_repository(DATA_BACKEND)
+logger.info(f"Data backend: {DATA_BACKEND}")
+
+def transaction() -> Iterator[None]:
+    """Group the writes of a `with` block in one transaction (postgres and memory backends)."""
+    return db.transaction()
+
+def bulk_insert(table_name: str, rows: List[dict]) -> List[dict]:
+    """Insert many rows at once (COPY on postgres) and return the inserted rows."""
+    return db.bulk_insert(table_name, rows)
+
+def stats() -> dict:
+    return {"backend": DATA_BACKEND, **db.stats()}
+
+metrics.register("data_backend", stats)
@@ -0,0 +1,53 @@
+"""
+Interfaz común de los backends de datos.
+
+Todos exponen la parte del cliente de Supabase que usa el backend:
+table(nombre) devuelve un builder con select/insert/upsert/update/delete,
+filtros (eq, neq, gt, gte, lt, lte, like, ilike, in_, or_), order, limit y
+range, que se ejecuta con execute() y devuelve un objeto con `data`;
+rpc(función, parámetros) devuelve lo mismo para las funciones de agregación.
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+# Tablas que usa el API
+TABLES = ("IB_Projects", "IB_Members", "IB_Activities", "IB_Reported_Hours", "IB_Authentication")
+
+class Repository(ABC):
+    """Data access backend used by crud and the in-memory caches."""
+
+    name = "base"
+
+    @abstractmethod
+    def table(self, table_name: str) -> Any:
+        """Query builder for one table."""
+
+    @abstractmethod
+    def rpc(self, function_name: str, params: dict) -> Any:
+        """Builder for a call to an aggregation function."""
+
+    def from_(self, table_name: str) -> Any:
+        return self.table(table_name)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group the writes of the block in one transaction.
+
+        Backends without transactions run each statement on its own.
+        """
+        yield
+
+    def in_transaction(self) -> bool:
+        """Whether the caller is inside a transaction() block."""
+        return False
+
+    def bulk_insert(self, table_name: str, rows: List[dict]) -> List[dict]:
+        """Insert many rows at once and return the inserted rows."""
+        if not rows:
+            return []
+        return self.table(table_name).insert(rows).execute().data or []
+
+    def stats(self) -> dict:
+        return {}
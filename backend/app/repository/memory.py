@@ -0,0 +1,738 @@
+"""
+Backend de datos en memoria, para correr, medir y perfilar el API sin red.
+
+Cada tabla guarda sus filas por clave primaria y mantiene dos tipos de índice:
+
+- Hash por columna (empleado, proyecto, usuario...): las consultas con eq/in_
+  sobre esas columnas solo recorren las filas que coinciden.
+- Ordenados (clave primaria, fecha, código de proyecto): los rangos
+  (gte/lte/gt/lt), el orden y la paginación por clave de pagination.py se
+  resuelven con bisect y se detienen al llenar el límite.
+
+Los valores se guardan con los tipos que devuelve PostgREST (según SCHEMA) y
+los filtros se convierten a ese tipo antes de comparar, como hace Postgres.
+
+Con MEMORY_MAX_ROWS las lecturas y las funciones de agregación devuelven como
+mucho esa cantidad de filas, sin avisar, igual que el max-rows de PostgREST;
+así se puede comprobar que las lecturas grandes paginan.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .base import Repository
+from .sql import SqlResponse, _split_top_level, _unquote
+
+logger = logging.getLogger(__name__)
+
+# 0 = sin tope (PostgREST usa 1000 por defecto)
+MEMORY_MAX_ROWS = int(os.getenv("MEMORY_MAX_ROWS", "0"))
+
+@dataclass(frozen=True)
+class TableSpec:
+    primary_key: str
+    # Tipo de Python de las columnas conocidas (el resto se guarda tal cual)
+    types: Dict[str, type] = field(default_factory=dict)
+    hash_indexes: Tuple[str, ...] = ()
+    ordered_indexes: Tuple[str, ...] = ()
+
+SCHEMA: Dict[str, TableSpec] = {
+    "IB_Projects": TableSpec(
+        primary_key="id",
+        types={"id": int, "code": str, "name": str},
+        ordered_indexes=("code",),
+    ),
+    "IB_Members": TableSpec(
+        primary_key="id",
+        types={"id": int, "name": str, "short_name": str},
+    ),
+    "IB_Activities": TableSpec(
+        primary_key="activity_id",
+        types={
+            "activity_id": int,
+            "project_code": str,
+            "phase": str,
+            "discipline": str,
+            "activity": str,
+            "hours_direction": float,
+            "hours_engineering": float,
+            "hours_modeling_ad": float,
+            "hours": float,
+        },
+        hash_indexes=("project_code",),
+    ),
+    # Como en Supabase: employee_id y hours son texto
+    "IB_Reported_Hours": TableSpec(
+        primary_key="id",
+        types={
+            "id": str,
+            "date": str,
+            "employee_id": str,
+            "project_code": str,
+            "phase": str,
+            "discipline": str,
+            "activity": str,
+            "hours": str,
+            "note": str,
+        },
+        hash_indexes=("employee_id", "project_code"),
+        ordered_indexes=("date",),
+    ),
+    "IB_Authentication": TableSpec(
+        primary_key="id_authentication",
+        types={"id_authentication": int, "id_members": int, "user": str, "password": str},
+        hash_indexes=("user",),
+    ),
+}
+
+class MemoryIntegrityError(Exception):
+    """Duplicate primary key, as Postgres would report it."""
+
+def _coerce(kind: Optional[type], value: Any) -> Any:
+    if value is None or kind is None or isinstance(value, kind):
+        return value
+    try:
+        if kind is str:
+            return str(value)
+        if kind is int:
+            return int(value)
+        if kind is float:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+    return value
+
+# Clave de orden: los NULL van al final, como en Postgres con ASC
+def _sort_key(value: Any) -> tuple:
+    return (1, 0) if value is None else (0, value)
+
+# Mayor que cualquier clave de orden (límite exclusivo en bisect)
+_TOP = (2,)
+
+def _like_regex(pattern: str, flags: int = 0):
+    parts = []
+    escaped = False
+    for char in str(pattern):
+        if escaped:
+            # Como en Postgres, \ deja literal el carácter siguiente
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in "%*":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("^" + "".join(parts) + "$", flags | re.S)
+
+# --- Predicados -------------------------------------------------------------
+
+def _comparison(column: str, operator: str, value: Any) -> Callable[[dict], bool]:
+    if operator == "eq":
+        return lambda row: row.get(column) is not None and row.get(column) == value
+    if operator == "neq":
+        return lambda row: row.get(column) is not None and row.get(column) != value
+    if operator in ("gt", "gte", "lt", "lte"):
+        compare = {
+            "gt": lambda a, b: a > b,
+            "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b,
+            "lte": lambda a, b: a <= b,
+        }[operator]
+        return lambda row: row.get(column) is not None and compare(row.get(column), value)
+    if operator in ("like", "ilike"):
+        regex = _like_regex(value, re.I if operator == "ilike" else 0)
+        return lambda row: row.get(column) is not None and regex.match(str(row.get(column))) is not None
+    if operator == "is":
+        expected = None if str(value).lower() == "null" else value
+        return lambda row: row.get(column) is expected
+    raise ValueError(f"Operador de filtro no soportado: {operator}")
+
+def _parse_tree(item: str) -> tuple:
+    """PostgREST logic expression -> ("and"|"or", [nodes]) or ("cmp", column, operator, value)."""
+    for prefix, kind in (("and(", "and"), ("or(", "or")):
+        if item.startswith(prefix) and item.endswith(")"):
+            return (kind, [_parse_tree(part) for part in _split_top_level(item[len(prefix):-1])])
+    column, operator, value = item.split(".", 2)
+    return ("cmp", column, operator, _unquote(value))
+
+def _compile_tree(node: tuple, types: Dict[str, type]) -> Callable[[dict], bool]:
+    if node[0] == "cmp":
+        _, column, operator, value = node
+        if operator not in ("like", "ilike", "is"):
+            value = _coerce(types.get(column), value)
+        return _comparison(column, operator, value)
+    children = [_compile_tree(child, types) for child in node[1]]
+    if node[0] == "and":
+        return lambda row: all(check(row) for check in children)
+    return lambda row: any(check(row) for check in children)
+
+def _keyset_bound(node: tuple, columns: List[str], types: Dict[str, type]) -> Optional[tuple]:
+    """
+    Recognize the keyset condition built by pagination._after:
+    c1 > v1 or (c1 = v1 and c2 > v2) ... Returns (v1, v2, ...) for `columns`.
+    """
+    branches = node[1] if node[0] == "or" else [node]
+    if node[0] not in ("or", "cmp") or len(branches) != len(columns):
+        return None
+    values: List[Any] = []
+    for position, branch in enumerate(branches):
+        comparisons = [branch] if branch[0] == "cmp" else (branch[1] if branch[0] == "and" else None)
+        if comparisons is None or len(comparisons) != position + 1 or any(item[0] != "cmp" for item in comparisons):
+            return None
+        for index, (_, column, operator, value) in enumerate(comparisons):
+            expected = "gt" if index == position else "eq"
+            if column != columns[index] or operator != expected:
+                return None
+            value = _coerce(types.get(column), value)
+            if index < position and value != values[index]:
+                return None
+        values.append(_coerce(types.get(columns[position]), comparisons[position][3]))
+    return tuple(values)
+
+class _MemoryTable:
+    def __init__(self, name: str, spec: TableSpec):
+        self.name = name
+        self.spec = spec
+        self.rows: Dict[Any, dict] = {}
+        self.hash_indexes: Dict[str, Dict[Any, Set[Any]]] = {column: {} for column in spec.hash_indexes}
+        # columna -> lista ordenada de (clave de orden del valor, clave de orden de la PK)
+        ordered = (spec.primary_key,) + tuple(column for column in spec.ordered_indexes if column != spec.primary_key)
+        self.ordered_indexes: Dict[str, List[tuple]] = {column: [] for column in ordered}
+        self._next_id = 1
+
+    def normalize(self, row: dict) -> dict:
+        return {column: _coerce(self.spec.types.get(column), value) for column, value in row.items()}
+
+    def _entry(self, column: str, row: dict) -> tuple:
+        return (_sort_key(row.get(column)), _sort_key(row.get(self.spec.primary_key)))
+
+    def _index(self, row: dict) -> None:
+        key = row[self.spec.primary_key]
+        for column, index in self.hash_indexes.items():
+            index.setdefault(row.get(column), set()).add(key)
+        for column, entries in self.ordered_indexes.items():
+            bisect.insort(entries, self._entry(column, row))
+
+    def _unindex(self, row: dict) -> None:
+        key = row[self.spec.primary_key]
+        for column, index in self.hash_indexes.items():
+            keys = index.get(row.get(column))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[row.get(column)]
+        for column, entries in self.ordered_indexes.items():
+            entry = self._entry(column, row)
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def new_key(self) -> Any:
+        if self.spec.types.get(self.spec.primary_key) is int:
+            key = self._next_id
+            self._next_id += 1
+            return key
+        return str(uuid.uuid4())
+
+    def put(self, row: dict) -> None:
+        key = row[self.spec.primary_key]
+        previous = self.rows.get(key)
+        if previous is not None:
+            self._unindex(previous)
+        self.rows[key] = row
+        self._index(row)
+        if isinstance(key, int) and key >= self._next_id:
+            self._next_id = key + 1
+
+    def remove(self, key: Any) -> Optional[dict]:
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self._unindex(row)
+        return row
+
+    def load(self, rows: Iterable[dict]) -> None:
+        """Bulk load: index lists are sorted once at the end."""
+        for row in rows:
+            row = self.normalize(row)
+            if row.get(self.spec.primary_key) is None:
+                row[self.spec.primary_key] = self.new_key()
+            key = row[self.spec.primary_key]
+            self.rows[key] = row
+            if isinstance(key, int) and key >= self._next_id:
+                self._next_id = key + 1
+        for index in self.hash_indexes.values():
+            index.clear()
+        for column in self.ordered_indexes:
+            self.ordered_indexes[column] = []
+        for row in self.rows.values():
+            key = row[self.spec.primary_key]
+            for column, index in self.hash_indexes.items():
+                index.setdefault(row.get(column), set()).add(key)
+            for column, entries in self.ordered_indexes.items():
+                entries.append(self._entry(column, row))
+        for entries in self.ordered_indexes.values():
+            entries.sort()
+
+class MemoryQuery:
+    """Same builder as the postgrest client, run against a _MemoryTable."""
+
+    def __init__(self, repository: "MemoryRepository", table_name: str):
+        self._repository = repository
+        self._table_name = table_name
+        spec = repository.spec(table_name)
+        self._types = spec.types
+        self._action = "select"
+        self._columns = "*"
+        self._values: Any = None
+        self._on_conflict: Optional[str] = None
+        self._predicates: List[Callable[[dict], bool]] = []
+        # Condiciones que el planificador puede resolver con un índice
+        self._equalities: List[Tuple[str, Set[Any]]] = []
+        self._ranges: List[Tuple[str, str, Any]] = []
+        self._keysets: List[tuple] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+
+    def select(self, columns: str = "*", *args, **kwargs) -> "MemoryQuery":
+        self._action = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, rows, **kwargs) -> "MemoryQuery":
+        self._action = "insert"
+        self._values = rows
+        return self
+
+    def upsert(self, rows, on_conflict: Optional[str] = None, **kwargs) -> "MemoryQuery":
+        self._action = "upsert"
+        self._values = rows
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, values: dict, **kwargs) -> "MemoryQuery":
+        self._action = "update"
+        self._values = values
+        return self
+
+    def delete(self, **kwargs) -> "MemoryQuery":
+        self._action = "delete"
+        return self
+
+    def _compare(self, column: str, operator: str, value: Any) -> "MemoryQuery":
+        value = _coerce(self._types.get(column), value)
+        self._predicates.append(_comparison(column, operator, value))
+        if operator == "eq":
+            self._equalities.append((column, {value}))
+            # También acota un índice ordenado sobre la misma columna
+            self._ranges.extend(((column, "gte", value), (column, "lte", value)))
+        elif operator in ("gt", "gte", "lt", "lte"):
+            self._ranges.append((column, operator, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "MemoryQuery":
+        return self._compare(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "MemoryQuery":
+        return self._compare(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "MemoryQuery":
+        return self._compare(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "MemoryQuery":
+        return self._compare(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "MemoryQuery":
+        return self._compare(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "MemoryQuery":
+        return self._compare(column, "lte", value)
+
+    def like(self, column: str, pattern: str) -> "MemoryQuery":
+        self._predicates.append(_comparison(column, "like", pattern))
+        return self
+
+    def ilike(self, column: str, pattern: str) -> "MemoryQuery":
+        self._predicates.append(_comparison(column, "ilike", pattern))
+        return self
+
+    def in_(self, column: str, values) -> "MemoryQuery":
+        kind = self._types.get(column)
+        wanted = {_coerce(kind, value) for value in values}
+        self._predicates.append(lambda row: row.get(column) in wanted)
+        self._equalities.append((column, wanted))
+        return self
+
+    def or_(self, filters: str, **kwargs) -> "MemoryQuery":
+        parts = [_parse_tree(part) for part in _split_top_level(filters)]
+        tree = parts[0] if len(parts) == 1 else ("or", parts)
+        self._predicates.append(_compile_tree(tree, self._types))
+        self._keysets.append(tree)
+        return self
+
+    def order(self, column: str, *, desc: bool = False, **kwargs) -> "MemoryQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "MemoryQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> "MemoryQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def execute(self) -> SqlResponse:
+        rows = self._repository.run(self)
+        if self._action == "select":
+            rows = self._repository.cap(rows)
+        return SqlResponse(rows)
+
+# Tipos de las columnas que devuelven las funciones de agregación (ver backend/sql/)
+FUNCTION_TYPES: Dict[str, Dict[str, type]] = {
+    "grouped_hours_by_employee": {"date": str, "employee_id": str, "hours": float},
+    "project_hours_by_activity": {"phase": str, "discipline": str, "activity": str, "hours": float},
+}
+
+class _MemoryCall(MemoryQuery):
+    """rpc() builder; as in PostgREST, the result can be filtered, ordered and paged."""
+
+    def __init__(self, repository: "MemoryRepository", function_name: str, params: dict):
+        super().__init__(repository, function_name)
+        self._types = FUNCTION_TYPES.get(function_name, {})
+        self._function_name = function_name
+        self._params = params
+
+    def execute(self) -> SqlResponse:
+        return SqlResponse(self._repository.cap(self._repository.call(self._function_name, self._params, self)))
+
+def _hours_value(value: Any) -> float:
+    try:
+        return float(value) if value not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+class MemoryRepository(Repository):
+    """
+    In-memory tables with hash and ordered indexes.
+
+    All operations run under one re-entrant lock; transaction() holds it for
+    the whole block and undoes the block's writes if it raises.
+    """
+
+    name = "memory"
+
+    def __init__(self, schema: Dict[str, TableSpec] = SCHEMA, max_rows: int = MEMORY_MAX_ROWS):
+        self._schema = schema
+        self.max_rows = max_rows
+        self._tables: Dict[str, _MemoryTable] = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.statements = 0
+        self.index_scans = 0
+        self.full_scans = 0
+        self.transactions = 0
+        self.rollbacks = 0
+        self.capped_responses = 0
+
+    def spec(self, table_name: str) -> TableSpec:
+        return self._schema.get(table_name) or TableSpec(primary_key="id")
+
+    def cap(self, rows: List[dict]) -> List[dict]:
+        """Cut a response to max_rows, as PostgREST does with its max-rows setting."""
+        if self.max_rows and len(rows) > self.max_rows:
+            with self._lock:
+                self.capped_responses += 1
+            return rows[:self.max_rows]
+        return rows
+
+    def _table(self, table_name: str) -> _MemoryTable:
+        table = self._tables.get(table_name)
+        if table is None:
+            table = self._tables[table_name] = _MemoryTable(table_name, self.spec(table_name))
+        return table
+
+    def load(self, data: Dict[str, List[dict]]) -> None:
+        """Replace the content of the given tables (e.g. with seed data)."""
+        with self._lock:
+            for table_name, rows in data.items():
+                table = self._tables[table_name] = _MemoryTable(table_name, self.spec(table_name))
+                table.load(rows)
+                logger.info(f"Memory backend: {len(table.rows)} rows loaded into {table_name}")
+
+    def table(self, table_name: str) -> MemoryQuery:
+        return MemoryQuery(self, table_name)
+
+    def rpc(self, function_name: str, params: dict) -> _MemoryCall:
+        return _MemoryCall(self, function_name, params)
+
+    # --- Transacciones ------------------------------------------------------
+
+    def _undo_log(self) -> Optional[list]:
+        return getattr(self._local, "undo", None)
+
+    def _remember(self, table: _MemoryTable, key: Any) -> None:
+        undo = self._undo_log()
+        if undo is not None:
+            previous = table.rows.get(key)
+            undo.append((table, key, dict(previous) if previous is not None else None))
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self._undo_log() is not None:
+            yield
+            return
+        with self._lock:
+            self._local.undo = []
+            self.transactions += 1
+            try:
+                yield
+            except Exception:
+                self.rollbacks += 1
+                for table, key, previous in reversed(self._local.undo):
+                    table.remove(key)
+                    if previous is not None:
+                        table.put(previous)
+                raise
+            finally:
+                self._local.undo = None
+
+    def in_transaction(self) -> bool:
+        return self._undo_log() is not None
+
+    # --- Lecturas -----------------------------------------------------------
+
+    def _candidates(self, table: _MemoryTable, query: MemoryQuery) -> Tuple[Iterable[dict], bool]:
+        """
+        Rows that may match, and whether they already come in `order`.
+
+        Uses the most selective of: an equality on a hash index, or the slice
+        of an ordered index bounded by the range and keyset conditions.
+        """
+        primary_key = table.spec.primary_key
+        order_columns = [column for column, _ in query._order]
+        descending = any(desc for _, desc in query._order)
+
+        # Columna ordenada que sirve para el ORDER BY (empates por PK, como hace la paginación)
+        ordered_column = None
+        if not order_columns:
+            ordered_column = primary_key
+        elif not descending and order_columns[0] in table.ordered_indexes and (
+            len(order_columns) == 1 or order_columns[1:] == [primary_key]
+        ):
+            ordered_column = order_columns[0]
+
+        # Igualdad más selectiva sobre un índice hash
+        best_keys: Optional[Set[Any]] = None
+        for column, values in query._equalities:
+            index = table.hash_indexes.get(column)
+            if index is None:
+                continue
+            keys: Set[Any] = set()
+            for value in values:
+                keys |= index.get(value, set())
+            if best_keys is None or len(keys) < len(best_keys):
+                best_keys = keys
+
+        # Tramo del índice ordenado que cumple los rangos y la condición de keyset
+        range_column = ordered_column or next(
+            (column for column, _, _ in query._ranges if column in table.ordered_indexes), None
+        )
+        bounds = None
+        if range_column is not None:
+            entries = table.ordered_indexes[range_column]
+            start, stop = 0, len(entries)
+            for column, operator, value in query._ranges:
+                if column != range_column:
+                    continue
+                key = _sort_key(value)
+                if operator == "gte":
+                    start = max(start, bisect.bisect_left(entries, (key,)))
+                elif operator == "gt":
+                    start = max(start, bisect.bisect_left(entries, (key, _TOP)))
+                elif operator == "lte":
+                    stop = min(stop, bisect.bisect_left(entries, (key, _TOP)))
+                else:
+                    stop = min(stop, bisect.bisect_left(entries, (key,)))
+            # Página siguiente de pagination.iter_rows: empezar justo después de la última clave
+            keyset_columns = [primary_key] if range_column == primary_key else [range_column, primary_key]
+            if order_columns == keyset_columns:
+                for tree in query._keysets:
+                    bound = _keyset_bound(tree, keyset_columns, table.spec.types)
+                    if bound is None:
+                        continue
+                    probe = tuple(_sort_key(value) for value in bound)
+                    if range_column == primary_key:
+                        probe = (probe[0], probe[0])
+                    start = max(start, bisect.bisect_left(entries, probe + (_TOP,)))
+            bounds = (range_column, entries, start, stop)
+
+        if best_keys is not None and (bounds is None or len(best_keys) < bounds[3] - bounds[2]):
+            self.index_scans += 1
+            return (table.rows[key] for key in best_keys), False
+        if bounds is not None and (bounds[2] > 0 or bounds[3] < len(bounds[1]) or ordered_column is not None):
+            self.index_scans += 1
+            _, entries, start, stop = bounds
+            rows = (table.rows[entry[1][1]] for entry in entries[start:stop])
+            return rows, range_column == ordered_column
+        self.full_scans += 1
+        return iter(table.rows.values()), False
+
+    def _select(self, table: _MemoryTable, query: MemoryQuery) -> List[dict]:
+        rows, ordered = self._candidates(table, query)
+        predicates = query._predicates
+        wanted = None if query._limit is None else query._offset + query._limit
+        if ordered:
+            matched = []
+            for row in rows:
+                if all(check(row) for check in predicates):
+                    matched.append(row)
+                    if wanted is not None and len(matched) >= wanted:
+                        break
+        else:
+            return self._finish(rows, query)
+        matched = matched[query._offset:wanted]
+        return self._project(matched, query._columns)
+
+    def _finish(self, rows: Iterable[dict], query: MemoryQuery) -> List[dict]:
+        """Filter, order, slice and project rows that come in no particular order."""
+        matched = [row for row in rows if all(check(row) for check in query._predicates)]
+        for column, desc in reversed(query._order):
+            matched.sort(key=lambda row: _sort_key(row.get(column)), reverse=desc)
+        wanted = None if query._limit is None else query._offset + query._limit
+        return self._project(matched[query._offset:wanted], query._columns)
+
+    @staticmethod
+    def _project(rows: List[dict], columns: str) -> List[dict]:
+        if columns.strip() == "*":
+            return [dict(row) for row in rows]
+        names = [name.strip() for name in columns.split(",")]
+        return [{name: row.get(name) for name in names} for row in rows]
+
+    def _matching(self, table: _MemoryTable, query: MemoryQuery) -> List[dict]:
+        rows, _ = self._candidates(table, query)
+        return [row for row in rows if all(check(row) for check in query._predicates)]
+
+    # --- Escrituras ---------------------------------------------------------
+
+    def _insert(self, table: _MemoryTable, rows: List[dict], upsert: bool, on_conflict: Optional[str]) -> List[dict]:
+        primary_key = table.spec.primary_key
+        conflict = on_conflict.strip() if on_conflict else primary_key
+        written = []
+        for row in rows:
+            row = table.normalize(row)
+            existing = None
+            if conflict == primary_key:
+                existing = table.rows.get(row.get(primary_key))
+            elif row.get(conflict) is not None:
+                existing = next((item for item in table.rows.values() if item.get(conflict) == row.get(conflict)), None)
+            if existing is not None:
+                if not upsert:
+                    raise MemoryIntegrityError(
+                        f'duplicate key value violates unique constraint on "{table.name}" ({conflict})'
+                    )
+                merged = {**existing, **row}
+                self._remember(table, existing[primary_key])
+                if merged[primary_key] != existing[primary_key]:
+                    table.remove(existing[primary_key])
+                table.put(merged)
+                written.append(dict(merged))
+                continue
+            if row.get(primary_key) is None:
+                row[primary_key] = table.new_key()
+            self._remember(table, row[primary_key])
+            table.put(row)
+            written.append(dict(row))
+        return written
+
+    def run(self, query: MemoryQuery) -> List[dict]:
+        with self._lock:
+            self.statements += 1
+            table = self._table(query._table_name)
+            if query._action == "select":
+                return self._select(table, query)
+            if query._action in ("insert", "upsert"):
+                rows = [query._values] if isinstance(query._values, dict) else list(query._values or [])
+                return self._insert(table, rows, query._action == "upsert", query._on_conflict)
+            primary_key = table.spec.primary_key
+            matched = self._matching(table, query)
+            result = []
+            for row in matched:
+                self._remember(table, row[primary_key])
+                if query._action == "update":
+                    updated = {**row, **table.normalize(query._values)}
+                    if updated[primary_key] != row[primary_key]:
+                        table.remove(row[primary_key])
+                        self._remember(table, updated[primary_key])
+                    table.put(updated)
+                    result.append(dict(updated))
+                else:
+                    table.remove(row[primary_key])
+                    result.append(dict(row))
+            return result
+
+    # --- Agregaciones -------------------------------------------------------
+
+    def _grouped_hours_by_employee(self, params: dict) -> List[dict]:
+        # run() directamente: el tope de filas solo se aplica a la respuesta final
+        rows = self.run(self.table("IB_Reported_Hours").select("date, employee_id, hours")
+                        .gte("date", params["start_date"]).lte("date", params["end_date"]))
+        totals: Dict[Tuple[str, str], float] = {}
+        for row in rows:
+            key = (str(row.get("date"))[:10], str(row.get("employee_id")))
+            totals[key] = totals.get(key, 0.0) + _hours_value(row.get("hours"))
+        return [{"date": day, "employee_id": employee_id, "hours": hours} for (day, employee_id), hours in totals.items()]
+
+    def _project_hours_by_activity(self, params: dict) -> List[dict]:
+        rows = self.run(self.table("IB_Reported_Hours").select("phase, discipline, activity, hours")
+                        .eq("project_code", params["code"]))
+        totals: Dict[Tuple[str, str, str], float] = {}
+        for row in rows:
+            key = (row.get("phase"), row.get("discipline"), row.get("activity"))
+            totals[key] = totals.get(key, 0.0) + _hours_value(row.get("hours"))
+        return [
+            {"phase": phase, "discipline": discipline, "activity": activity, "hours": hours}
+            for (phase, discipline, activity), hours in totals.items()
+        ]
+
+    def call(self, function_name: str, params: dict, query: Optional[MemoryQuery] = None) -> List[dict]:
+        """Run an aggregation function; `query` adds the filters, order and limit of the rpc() builder."""
+        aggregates = {
+            "grouped_hours_by_employee": self._grouped_hours_by_employee,
+            "project_hours_by_activity": self._project_hours_by_activity,
+        }
+        if function_name not in aggregates:
+            raise ValueError(f"Función no disponible en el backend en memoria: {function_name}")
+        rows = aggregates[function_name](params)
+        return rows if query is None else self._finish(rows, query)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tables = {
+                name: {
+                    "rows": len(table.rows),
+                    "hash_indexes": {column: len(index) for column, index in table.hash_indexes.items()},
+                    "ordered_indexes": sorted(table.ordered_indexes),
+                }
+                for name, table in self._tables.items()
+            }
+        return {
+            "tables": tables,
+            "statements": self.statements,
+            "index_scans": self.index_scans,
+            "full_scans": self.full_scans,
+            "transactions": self.transactions,
+            "rollbacks": self.rollbacks,
+            "max_rows": self.max_rows,
+            "capped_responses": self.capped_responses,
+        }
@@ -0,0 +1,82 @@
+"""
+Repositorio que pasa cada execute() por la política de utils/resilience.py.
+
+Los builders se envuelven en un proxy: los métodos que encadenan (filtros,
+order, insert, ...) devuelven el builder envuelto de nuevo y execute() corre
+bajo la política. insert/update/delete marcan la consulta como escritura.
+Dentro de una transacción no se reintenta: la conexión puede haber quedado
+a medias y la transacción entera debe fallar.
+"""
+from typing import Any, Iterator, List
+
+from ..utils.resilience import RetryPolicy, upstream
+from .base import Repository
+
+_WRITES = {"insert", "upsert", "update", "delete"}
+
+class _ResilientBuilder:
+    __slots__ = ("_builder", "_repository", "_idempotent", "_label")
+
+    def __init__(self, builder: Any, repository: "ResilientRepository", idempotent: bool, label: str):
+        self._builder = builder
+        self._repository = repository
+        self._idempotent = idempotent
+        self._label = label
+
+    def execute(self) -> Any:
+        repository = self._repository
+        return repository.policy.call(
+            self._builder.execute,
+            idempotent=self._idempotent,
+            retry=not repository.in_transaction(),
+            label=self._label,
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._builder, name)
+        if not callable(attribute):
+            return attribute
+
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            idempotent = self._idempotent and name not in _WRITES
+            return _ResilientBuilder(result, self._repository, idempotent, self._label)
+
+        return chained
+
+class ResilientRepository(Repository):
+    """Wraps another repository so every upstream call is retried and guarded."""
+
+    def __init__(self, inner: Repository, policy: RetryPolicy = upstream):
+        self.inner = inner
+        self.policy = policy
+        self.name = inner.name
+
+    def table(self, table_name: str) -> Any:
+        return _ResilientBuilder(self.inner.table(table_name), self, True, f"{self.name}:{table_name}")
+
+    def rpc(self, function_name: str, params: dict) -> Any:
+        return _ResilientBuilder(self.inner.rpc(function_name, params), self, True, f"{self.name}:rpc {function_name}")
+
+    def transaction(self) -> Iterator[Any]:
+        return self.inner.transaction()
+
+    def in_transaction(self) -> bool:
+        return self.inner.in_transaction()
+
+    def bulk_insert(self, table_name: str, rows: List[dict]) -> List[dict]:
+        return self.policy.call(
+            lambda: self.inner.bulk_insert(table_name, rows),
+            idempotent=False,
+            retry=not self.inner.in_transaction(),
+            label=f"{self.name}:bulk insert {table_name}",
+        )
+
+    def stats(self) -> dict:
+        return self.inner.stats()
+
+    def __getattr__(self, name: str) -> Any:
+        # Métodos propios del backend (reflect, copy_rows, load, ...)
+        return getattr(self.inner, name)
@@ -0,0 +1,20 @@
+"""Backend REST: el cliente de Supabase (PostgREST), una petición HTTP por consulta."""
+from typing import Any
+
+from supabase import Client
+
+from .base import Repository
+
+class RestRepository(Repository):
+    """Supabase client behind the repository interface."""
+
+    name = "rest"
+
+    def __init__(self, client: Client):
+        self.client = client
+
+    def table(self, table_name: str) -> Any:
+        return self.client.table(table_name)
+
+    def rpc(self, function_name: str, params: dict) -> Any:
+        return self.client.rpc(function_name, params)
@@ -0,0 +1,138 @@
+"""
+Datos para el backend en memoria.
+
+Con MEMORY_SEED_PATH se cargan de un JSON {"tabla": [filas, ...]} (por
+ejemplo, una exportación de Supabase); si no, se generan datos sintéticos
+con volúmenes parecidos a los reales. La generación es determinista para una
+misma MEMORY_SEED_RANDOM, así dos corridas de benchmark ven los mismos datos.
+
+Los usuarios generados son usuario1, usuario2, ... con contraseña en texto
+plano MEMORY_SEED_PASSWORD; el login la migra a bcrypt la primera vez.
+"""
+import json
+import logging
+import os
+import random
+import uuid
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MEMORY_SEED_PATH = os.getenv("MEMORY_SEED_PATH", "")
+MEMORY_SEED_PROJECTS = int(os.getenv("MEMORY_SEED_PROJECTS", "40"))
+MEMORY_SEED_MEMBERS = int(os.getenv("MEMORY_SEED_MEMBERS", "60"))
+MEMORY_SEED_HOURS = int(os.getenv("MEMORY_SEED_HOURS", "100000"))
+MEMORY_SEED_RANDOM = int(os.getenv("MEMORY_SEED_RANDOM", "42"))
+MEMORY_SEED_PASSWORD = os.getenv("MEMORY_SEED_PASSWORD", "demo")
+
+PHASES = ("Diseño conceptual", "Ingeniería básica", "Ingeniería de detalle", "Acompañamiento en obra")
+DISCIPLINES = ("Civil", "Estructural", "Eléctrica", "Mecánica", "Hidrosanitaria", "N/A - No Aplica")
+ACTIVITIES = (
+    "Memoria de cálculo",
+    "Planos",
+    "Modelado BIM",
+    "Especificaciones técnicas",
+    "Cantidades de obra",
+    "Revisión interna",
+    "Coordinación",
+    "Reuniones con el cliente",
+)
+
+def load_file(path: str) -> Dict[str, List[dict]]:
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: se esperaba un objeto {{tabla: [filas]}}")
+    return data
+
+def generate(
+    projects: int = MEMORY_SEED_PROJECTS,
+    members: int = MEMORY_SEED_MEMBERS,
+    hours: int = MEMORY_SEED_HOURS,
+    seed: int = MEMORY_SEED_RANDOM,
+    today: Optional[date] = None,
+) -> Dict[str, List[dict]]:
+    """
+    Build synthetic rows for every table of the API.
+
+    Reported hours fall on weekdays of the last 18 months, spread over the
+    members and over the activities of each project.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    created = (today - timedelta(days=800)).isoformat()
+
+    project_rows = [
+        {"id": number, "code": f"{number:04d}", "name": f"Proyecto {number:04d}", "created_at": created, "updated_at": created}
+        for number in range(1, projects + 1)
+    ]
+    member_rows = [
+        {"id": number, "name": f"Empleado {number}", "short_name": f"E{number:02d}", "created_at": created, "updated_at": created}
+        for number in range(1, members + 1)
+    ]
+    auth_rows = [
+        {"id_authentication": number, "id_members": number, "user": f"usuario{number}", "password": MEMORY_SEED_PASSWORD}
+        for number in range(1, members + 1)
+    ]
+
+    activity_rows = []
+    for project in project_rows:
+        for phase in rng.sample(PHASES, k=rng.randint(2, len(PHASES))):
+            for discipline in rng.sample(DISCIPLINES, k=rng.randint(2, len(DISCIPLINES))):
+                for activity in rng.sample(ACTIVITIES, k=rng.randint(3, len(ACTIVITIES))):
+                    roles = [float(rng.choice((0, 4, 8, 16, 24, 40))) for _ in range(3)]
+                    activity_rows.append({
+                        "activity_id": len(activity_rows) + 1,
+                        "project_code": project["code"],
+                        "phase": phase,
+                        "discipline": discipline,
+                        "activity": activity,
+                        "hours_direction": roles[0],
+                        "hours_engineering": roles[1],
+                        "hours_modeling_ad": roles[2],
+                        "hours": sum(roles),
+                        "status": "Activa",
+                        "created_at": created,
+                        "updated_at": created,
+                    })
+
+    first_day = today - timedelta(days=548)
+    workdays = [
+        first_day + timedelta(days=offset)
+        for offset in range((today - first_day).days + 1)
+        if (first_day + timedelta(days=offset)).weekday() < 5
+    ]
+    hour_rows = []
+    for _ in range(hours):
+        activity = rng.choice(activity_rows)
+        hour_rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "date": rng.choice(workdays).isoformat(),
+            "employee_id": str(rng.randint(1, members)),
+            "project_code": activity["project_code"],
+            "phase": activity["phase"],
+            "discipline": activity["discipline"],
+            "activity": activity["activity"],
+            "hours": str(rng.choice((0.5, 1.0, 2.0, 3.0, 4.0, 8.0))),
+            "note": None,
+        })
+
+    return {
+        "IB_Projects": project_rows,
+        "IB_Members": member_rows,
+        "IB_Activities": activity_rows,
+        "IB_Reported_Hours": hour_rows,
+        "IB_Authentication": auth_rows,
+    }
+
+def seed_data() -> Dict[str, List[dict]]:
+    """Rows for the memory backend, from MEMORY_SEED_PATH or generated."""
+    if MEMORY_SEED_PATH:
+        logger.info(f"Memory backend: loading seed data from {MEMORY_SEED_PATH}")
+        return load_file(MEMORY_SEED_PATH)
+    logger.info(
+        f"Memory backend: generating {MEMORY_SEED_PROJECTS} projects, "
+        f"{MEMORY_SEED_MEMBERS} members and {MEMORY_SEED_HOURS} reported hours"
+    )
+    return generate()
@@ -0,0 +1,456 @@
+"""
+Backend de datos sobre Postgres directo, con el pool de SQLAlchemy de database.py.
+
+SqlRepository implementa la interfaz de base.py (la misma del cliente de
+Supabase), así crud.py y los módulos de utils no dependen del backend
+elegido. Además:
+
+- transaction(): varias sentencias en una sola transacción de Postgres.
+- Las funciones de agregación conocidas (backend/sql/) se resuelven con un
+  GROUP BY en el servidor, estén o no creadas en la base.
+- copy_rows(): inserción masiva con COPY ... FROM STDIN.
+
+Las filas se devuelven como las devuelve PostgREST: fechas en ISO 8601,
+numéricos como float y UUID como texto.
+"""
+import csv
+import io
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from uuid import UUID
+
+from sqlalchemy import Date, DateTime, Float, Integer, MetaData, Numeric, String, Table, and_, cast, func, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection, Engine
+
+from .base import Repository
+
+logger = logging.getLogger(__name__)
+
+# Desde cuántas filas bulk_insert usa COPY en lugar de un INSERT ... RETURNING
+SQL_COPY_MIN_ROWS = int(os.getenv("SQL_COPY_MIN_ROWS", "50"))
+# Marca de NULL en el CSV de COPY
+_COPY_NULL = "\\N"
+
+# Conexión de la transacción en curso (la hereda todo lo que corre en el mismo contexto)
+_current_connection: ContextVar[Optional[Connection]] = ContextVar("sql_connection", default=None)
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+def _bind(column, value: Any) -> Any:
+    """Convert a PostgREST-style value (usually text) to the column's Python type."""
+    if value is None:
+        return None
+    column_type = column.type
+    try:
+        if isinstance(column_type, DateTime) and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        if isinstance(column_type, Date) and isinstance(value, str):
+            return date.fromisoformat(value[:10])
+        if isinstance(column_type, Integer) and isinstance(value, str):
+            return int(value)
+        if isinstance(column_type, (Float, Numeric)) and isinstance(value, str):
+            return float(value)
+    except ValueError:
+        return value
+    if isinstance(column_type, String) and not isinstance(value, str):
+        return str(value)
+    return value
+
+def _bind_row(table: Table, row: dict) -> dict:
+    return {name: _bind(table.c[name], value) if name in table.c else value for name, value in row.items()}
+
+class SqlResponse:
+    """Same shape as the postgrest APIResponse: `data` rows and an optional `count`."""
+
+    def __init__(self, data: List[dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+# --- Filtros con la sintaxis de PostgREST (usada por or_) -------------------
+
+def _pattern(value: Any) -> str:
+    # PostgREST acepta * como comodín en like/ilike
+    return str(value).replace("*", "%")
+
+_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "eq": lambda column, value: column == _bind(column, value),
+    "neq": lambda column, value: column != _bind(column, value),
+    "gt": lambda column, value: column > _bind(column, value),
+    "gte": lambda column, value: column >= _bind(column, value),
+    "lt": lambda column, value: column < _bind(column, value),
+    "lte": lambda column, value: column <= _bind(column, value),
+    "like": lambda column, value: column.like(_pattern(value)),
+    "ilike": lambda column, value: column.ilike(_pattern(value)),
+    "is": lambda column, value: column.is_(None if str(value).lower() == "null" else value),
+}
+
+def _split_top_level(expression: str) -> List[str]:
+    """Split on commas that are outside parentheses and double quotes."""
+    parts, current = [], []
+    depth = 0
+    quoted = escaped = False
+    for char in expression:
+        if escaped:
+            escaped = False
+        elif char == "\\" and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+def _parse_condition(table: Table, item: str):
+    for prefix, combine in (("and(", and_), ("or(", or_)):
+        if item.startswith(prefix) and item.endswith(")"):
+            return combine(*(_parse_condition(table, part) for part in _split_top_level(item[len(prefix):-1])))
+    column, operator, value = item.split(".", 2)
+    if operator not in _OPERATORS:
+        raise ValueError(f"Operador de filtro no soportado: {operator}")
+    return _OPERATORS[operator](table.c[column], _unquote(value))
+
+# --- Agregaciones en el servidor --------------------------------------------
+
+def _hours_value(hours: Table):
+    # Las horas se guardan como texto: vacío o nulo cuenta como 0
+    return func.coalesce(cast(func.nullif(cast(hours.c.hours, String), ""), Float), 0.0)
+
+def _grouped_hours_by_employee(tables: Callable[[str], Table], params: dict):
+    hours = tables("IB_Reported_Hours")
+    day = cast(hours.c.date, Date)
+    employee = cast(hours.c.employee_id, String)
+    return (
+        select(day.label("date"), employee.label("employee_id"), func.sum(_hours_value(hours)).label("hours"))
+        .where(day.between(date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])))
+        .group_by(day, employee)
+    )
+
+def _project_hours_by_activity(tables: Callable[[str], Table], params: dict):
+    hours = tables("IB_Reported_Hours")
+    return (
+        select(hours.c.phase, hours.c.discipline, hours.c.activity, func.sum(_hours_value(hours)).label("hours"))
+        .where(hours.c.project_code == params["code"])
+        .group_by(hours.c.phase, hours.c.discipline, hours.c.activity)
+    )
+
+# Mismo resultado que las funciones de backend/sql/, sin necesidad de crearlas
+SERVER_AGGREGATES: Dict[str, Callable[[Callable[[str], Table], dict], Any]] = {
+    "grouped_hours_by_employee": _grouped_hours_by_employee,
+    "project_hours_by_activity": _project_hours_by_activity,
+}
+
+class SqlQuery:
+    """One table operation, built with the postgrest builder methods and run by execute()."""
+
+    def __init__(self, client: "SqlRepository", table_name: str):
+        self._client = client
+        self._table_name = table_name
+        self._action = "select"
+        self._columns = "*"
+        self._values: Any = None
+        self._on_conflict: Optional[str] = None
+        # Los filtros reciben la tabla reflejada; no se consulta el esquema hasta execute()
+        self._filters: List[Callable[[Table], Any]] = []
+        self._order: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    def select(self, columns: str = "*", *args, **kwargs) -> "SqlQuery":
+        self._action = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, rows: Union[dict, List[dict]], **kwargs) -> "SqlQuery":
+        self._action = "insert"
+        self._values = rows
+        return self
+
+    def upsert(self, rows: Union[dict, List[dict]], on_conflict: Optional[str] = None, **kwargs) -> "SqlQuery":
+        self._action = "upsert"
+        self._values = rows
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, values: dict, **kwargs) -> "SqlQuery":
+        self._action = "update"
+        self._values = values
+        return self
+
+    def delete(self, **kwargs) -> "SqlQuery":
+        self._action = "delete"
+        return self
+
+    def _filter(self, build: Callable[[Table], Any]) -> "SqlQuery":
+        self._filters.append(build)
+        return self
+
+    def eq(self, column: str, value: Any) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["eq"](table.c[column], value))
+
+    def neq(self, column: str, value: Any) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["neq"](table.c[column], value))
+
+    def gt(self, column: str, value: Any) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["gt"](table.c[column], value))
+
+    def gte(self, column: str, value: Any) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["gte"](table.c[column], value))
+
+    def lt(self, column: str, value: Any) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["lt"](table.c[column], value))
+
+    def lte(self, column: str, value: Any) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["lte"](table.c[column], value))
+
+    def like(self, column: str, pattern: str) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["like"](table.c[column], pattern))
+
+    def ilike(self, column: str, pattern: str) -> "SqlQuery":
+        return self._filter(lambda table: _OPERATORS["ilike"](table.c[column], pattern))
+
+    def in_(self, column: str, values) -> "SqlQuery":
+        values = list(values)
+        return self._filter(lambda table: table.c[column].in_([_bind(table.c[column], value) for value in values]))
+
+    def or_(self, filters: str, **kwargs) -> "SqlQuery":
+        return self._filter(lambda table: or_(*(_parse_condition(table, part) for part in _split_top_level(filters))))
+
+    def order(self, column: str, *, desc: bool = False, **kwargs) -> "SqlQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "SqlQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> "SqlQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def _statement(self, table: Table):
+        where = [build(table) for build in self._filters]
+        if self._action == "select":
+            if self._columns.strip() == "*":
+                statement = select(table)
+            else:
+                statement = select(*(table.c[name.strip()] for name in self._columns.split(",")))
+            statement = statement.where(*where)
+            for column, descending in self._order:
+                statement = statement.order_by(table.c[column].desc() if descending else table.c[column].asc())
+            if self._limit is not None:
+                statement = statement.limit(self._limit)
+            if self._offset:
+                statement = statement.offset(self._offset)
+            return statement
+
+        if self._action in ("insert", "upsert"):
+            rows = [_bind_row(table, row) for row in ([self._values] if isinstance(self._values, dict) else self._values)]
+            statement = pg_insert(table).values(rows)
+            if self._action == "upsert":
+                conflict = (
+                    [name.strip() for name in self._on_conflict.split(",")]
+                    if self._on_conflict else [column.name for column in table.primary_key]
+                )
+                changed = {name: statement.excluded[name] for name in rows[0] if name not in conflict}
+                if changed:
+                    statement = statement.on_conflict_do_update(index_elements=conflict, set_=changed)
+                else:
+                    statement = statement.on_conflict_do_nothing(index_elements=conflict)
+            return statement.returning(*table.c)
+
+        if self._action == "update":
+            return table.update().where(*where).values(_bind_row(table, self._values)).returning(*table.c)
+        return table.delete().where(*where).returning(*table.c)
+
+    def execute(self) -> SqlResponse:
+        if self._action in ("insert", "upsert") and not self._values:
+            return SqlResponse([])
+        table = self._client.reflect(self._table_name)
+        return SqlResponse(self._client.run(self._statement(table)))
+
+class _SqlCall(SqlQuery):
+    """
+    rpc() builder. As in PostgREST the result can be filtered, ordered and
+    paged; the known aggregates run as a subquery with those clauses on top.
+    """
+
+    def __init__(self, client: "SqlRepository", function_name: str, params: dict):
+        super().__init__(client, function_name)
+        self._function_name = function_name
+        self._params = params
+
+    def execute(self) -> SqlResponse:
+        aggregate = SERVER_AGGREGATES.get(self._function_name)
+        if aggregate is None:
+            if self._filters or self._order or self._limit is not None:
+                raise ValueError(f"La función {self._function_name} no admite filtros ni paginación en el backend postgres")
+            return SqlResponse(self._client.call(self._function_name, self._params))
+        result = aggregate(self._client.reflect, self._params).subquery(self._function_name)
+        return SqlResponse(self._client.run(self._statement(result)))
+
+class SqlRepository(Repository):
+    """
+    Postgres data access through the pooled SQLAlchemy engine.
+
+    Every statement borrows a pooled connection and commits on its own,
+    unless it runs inside transaction().
+    """
+
+    name = "postgres"
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        self._lock = threading.Lock()
+        self.statements = 0
+        self.transactions = 0
+        self.rollbacks = 0
+        self.copies = 0
+        self.copied_rows = 0
+
+    def reflect(self, table_name: str) -> Table:
+        """Table definition read from the database once and then reused."""
+        with self._lock:
+            table = self._tables.get(table_name)
+            if table is None:
+                table = self._tables[table_name] = Table(table_name, self._metadata, autoload_with=self.engine)
+            return table
+
+    def table(self, table_name: str) -> SqlQuery:
+        return SqlQuery(self, table_name)
+
+    def rpc(self, function_name: str, params: dict) -> _SqlCall:
+        return _SqlCall(self, function_name, params)
+
+    @contextmanager
+    def _connection(self) -> Iterator[Connection]:
+        current = _current_connection.get()
+        if current is not None:
+            yield current
+            return
+        with self.engine.begin() as connection:
+            yield connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        """
+        Run every statement issued inside the block in one transaction.
+
+        Commits when the block ends and rolls back if it raises. Nested
+        blocks join the outer transaction.
+        """
+        current = _current_connection.get()
+        if current is not None:
+            yield current
+            return
+        with self.engine.connect() as connection:
+            token = _current_connection.set(connection)
+            self.transactions += 1
+            try:
+                with connection.begin():
+                    yield connection
+            except Exception:
+                self.rollbacks += 1
+                raise
+            finally:
+                _current_connection.reset(token)
+
+    def in_transaction(self) -> bool:
+        return _current_connection.get() is not None
+
+    def run(self, statement) -> List[dict]:
+        with self._connection() as connection:
+            result = connection.execute(statement)
+            self.statements += 1
+            if not result.returns_rows:
+                return []
+            return [{key: _to_json(value) for key, value in row.items()} for row in result.mappings()]
+
+    def call(self, function_name: str, params: dict) -> List[dict]:
+        """Run an aggregation function, with a server-side GROUP BY when it is a known one."""
+        aggregate = SERVER_AGGREGATES.get(function_name)
+        if aggregate is not None:
+            return self.run(aggregate(self.reflect, params))
+        preparer = self.engine.dialect.identifier_preparer
+        arguments = ", ".join(f"{preparer.quote(name)} => :{name}" for name in params)
+        return self.run(text(f"select * from {preparer.quote(function_name)}({arguments})").bindparams(**params))
+
+    def copy_rows(self, table_name: str, rows: List[dict]) -> int:
+        """
+        Insert rows with COPY ... FROM STDIN (CSV).
+
+        Every row must have the keys of the first one. Nothing is returned
+        from the server, so defaults filled in by Postgres are not read back.
+        """
+        if not rows:
+            return 0
+        table = self.reflect(table_name)
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in rows:
+            writer.writerow([_COPY_NULL if row.get(name) is None else row.get(name) for name in columns])
+        buffer.seek(0)
+
+        preparer = self.engine.dialect.identifier_preparer
+        statement = (
+            f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(name) for name in columns)}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '{_COPY_NULL}')"
+        )
+        with self._connection() as connection:
+            cursor = connection.connection.cursor()
+            try:
+                cursor.copy_expert(statement, buffer)
+            finally:
+                cursor.close()
+        self.copies += 1
+        self.copied_rows += len(rows)
+        return len(rows)
+
+    def bulk_insert(self, table_name: str, rows: List[dict]) -> List[dict]:
+        """Insert rows, with COPY from SQL_COPY_MIN_ROWS rows up; returns the inserted rows."""
+        if len(rows) < SQL_COPY_MIN_ROWS:
+            return self.table(table_name).insert(rows).execute().data
+        self.copy_rows(table_name, rows)
+        return [{key: _to_json(value) for key, value in row.items()} for row in rows]
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "pool": pool.status() if hasattr(pool, "status") else None,
+            "statements": self.statements,
+            "transactions": self.transactions,
+            "rollbacks": self.rollbacks,
+            "copies": self.copies,
+            "copied_rows": self.copied_rows,
+            "reflected_tables": sorted(self._tables),
+        }
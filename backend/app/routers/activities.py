@@ -1,28 +1,60 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from urllib.parse import unquote, unquote_plus
-from .. import crud
+from .. import async_crud, crud
 from ..schemas import ActivityItem
-from ..database import supabase  # Importación añadida
+from ..utils.admin import require_admin
+from ..utils.catalog import activity_catalog
+from ..utils.http_cache import REFERENCE_CACHE_CONTROL, cache_headers, is_not_modified, not_modified, scoped_etag
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+import asyncio
 import logging
 import re
 
 # Configuración del logger
 logger = logging.getLogger(__name__)
 
+limiter = Limiter(key_func=get_remote_address)
+
 router = APIRouter()
 
+def _catalog_etag(request: Request) -> str:
+    # Cada URL de la cascada es una vista distinta de la misma versión del catálogo
+    return scoped_etag(activity_catalog.version, request.url.path)
+
+@router.post("/catalog/refresh", dependencies=[Depends(require_admin)])
+@limiter.limit("5/minute")
+def refresh_catalog(request: Request):
+    """Fuerza la recarga del catálogo de actividades en memoria."""
+    try:
+        activity_catalog.refresh()
+        return activity_catalog.stats()
+    except Exception as e:
+        logger.error(f"Error refreshing activity catalog: {str(e)}")
+        raise HTTPException(status_code=503, detail="Error refreshing activity catalog")
+
 @router.get("/project/{project_code:path}/stages")
-def get_stages_by_project(project_code: str):
+def get_stages_by_project(request: Request, response: Response, project_code: str):
     try:
+        etag = _catalog_etag(request)
+        if is_not_modified(request, etag):
+            return not_modified(etag, REFERENCE_CACHE_CONTROL)
+
         decoded_project_code = unquote(project_code)
         stages = crud.get_stages_by_project(decoded_project_code)
+        response.headers.update(cache_headers(etag, REFERENCE_CACHE_CONTROL))
         return stages
     except Exception as e:
         raise HTTPException(500, f"Error retrieving stages: {str(e)}")
     
 @router.get("/{params_str:path}/disciplines")
-def get_disciplines(params_str: str):
+def get_disciplines(request: Request, response: Response, params_str: str):
     try:
+        etag = _catalog_etag(request)
+        if is_not_modified(request, etag):
+            return not_modified(etag, REFERENCE_CACHE_CONTROL)
+
         params = params_str.split('::')
         if len(params) != 2:
             raise HTTPException(status_code=400, detail="Invalid URL format. Expected project_code::stage.")
@@ -31,13 +63,14 @@ def get_disciplines(params_str: str):
         decoded_stage = unquote_plus(params[1]).strip()
         
         disciplines = crud.get_disciplines_by_stage(decoded_project_code, decoded_stage)
+        response.headers.update(cache_headers(etag, REFERENCE_CACHE_CONTROL))
         return disciplines
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving disciplines: {str(e)}")
 
 # Endpoint corregido para obtener actividades
 @router.get("/{params_str:path}/activities")
-async def get_activities(request: Request, params_str: str):
+async def get_activities(request: Request, response: Response, params_str: str):
     """
     Obtiene actividades para un proyecto, etapa y disciplina específicos.
     
@@ -45,6 +78,11 @@ async def get_activities(request: Request, params_str: str):
     /activities/0010/SIN/N%2FA%20-%20No%20Aplica/activities
     """
     try:
+        # La versión del catálogo puede disparar su carga: calcularla fuera del event loop
+        etag = await run_in_threadpool(_catalog_etag, request)
+        if is_not_modified(request, etag):
+            return not_modified(etag, REFERENCE_CACHE_CONTROL)
+
         # Dividir los parámetros usando '::' como delimitador
         params = params_str.split('::')
         if len(params) != 3:
@@ -71,56 +109,54 @@ async def get_activities(request: Request, params_str: str):
         
         # Log para debugging
         logger.info(f"Searching activities for: project='{decoded_project_code}', stage='{decoded_stage}', discipline='{decoded_discipline}'")
-        
+
+        # Todas las disciplinas de la fase salen del catálogo en memoria
+        # (en un hilo: si aún no está cargado, la primera carga no bloquea el loop)
+        phase_disciplines = await run_in_threadpool(activity_catalog.get_phase, decoded_project_code, decoded_stage)
+
         # Intentar con cada variación de disciplina
-        response = None
+        matches = []
         for variation in discipline_variations:
             logger.info(f"Trying with discipline: '{variation}'")
-            
+
             # 1. Búsqueda exacta primero
-            response = supabase.table("IB_Activities") \
-                .select("activity") \
-                .eq("project_code", decoded_project_code) \
-                .eq("phase", decoded_stage) \
-                .eq("discipline", variation) \
-                .execute()
-            
-            if response.data:
+            matches = phase_disciplines.get(variation, [])
+            if matches:
                 logger.info(f"Found exact match with variation: '{variation}'")
                 break
-                
+
             # 2. Búsqueda insensible a mayúsculas/minúsculas y espacios
-            if not response.data:
-                response = supabase.table("IB_Activities") \
-                    .select("activity") \
-                    .eq("project_code", decoded_project_code) \
-                    .eq("phase", decoded_stage) \
-                    .ilike("discipline", f"%{variation.strip()}%") \
-                    .execute()
-                
-                if response.data:
-                    logger.info(f"Found case-insensitive match with variation: '{variation}'")
-                    break
-        
+            needle = variation.strip().lower()
+            matches = [
+                item
+                for discipline, items in phase_disciplines.items()
+                if needle in discipline.lower()
+                for item in items
+            ]
+            if matches:
+                logger.info(f"Found case-insensitive match with variation: '{variation}'")
+                break
+
         # Si aún no hay resultados, intentar una búsqueda más amplia
-        if not response or not response.data:
+        if not matches:
             logger.info("Trying broader search with partial matches")
-            response = supabase.table("IB_Activities") \
-                .select("*") \
-                .eq("project_code", decoded_project_code) \
-                .eq("phase", decoded_stage) \
-                .ilike("discipline", "%N/A%") \
-                .execute()
-            
-            if response.data:
-                logger.info(f"Found {len(response.data)} potential matches with 'N/A' in discipline")
-        
-        if not response.data:
+            matches = [
+                item
+                for discipline, items in phase_disciplines.items()
+                if "n/a" in discipline.lower()
+                for item in items
+            ]
+
+            if matches:
+                logger.info(f"Found {len(matches)} potential matches with 'N/A' in discipline")
+
+        response.headers.update(cache_headers(etag, REFERENCE_CACHE_CONTROL))
+        if not matches:
             logger.warning(f"No activities found for discipline: '{decoded_discipline}'")
             return []
-        
+
         # Extraer solo los nombres de las actividades
-        activities = [item["activity"] for item in response.data]
+        activities = [item["name"] for item in matches]
         logger.info(f"Found {len(activities)} activities")
         return activities
     
@@ -166,26 +202,17 @@ async def debug_activities(request: Request, params_str: str):
             }
         }
         
-        # Consulta exacta
-        response = supabase.table("IB_Activities") \
-            .select("*") \
-            .eq("project_code", decoded_project_code) \
-            .eq("phase", decoded_stage) \
-            .eq("discipline", decoded_discipline) \
-            .execute()
+        # Consulta exacta y disciplinas del catálogo a la vez
+        exact_rows, unique_disciplines = await asyncio.gather(
+            async_crud.get_activities_exact(decoded_project_code, decoded_stage, decoded_discipline),
+            run_in_threadpool(activity_catalog.get_disciplines, decoded_project_code, decoded_stage),
+        )
         
-        debug_info["exact_match_count"] = len(response.data) if response.data else 0
+        debug_info["exact_match_count"] = len(exact_rows)
         
         # Si no hay coincidencias exactas, buscar similares
-        if not response.data:
-            # Buscar todas las disciplinas para este proyecto y etapa
-            all_disciplines_response = supabase.table("IB_Activities") \
-                .select("discipline") \
-                .eq("project_code", decoded_project_code) \
-                .eq("phase", decoded_stage) \
-                .execute()
-            
-            unique_disciplines = list(set([item["discipline"] for item in all_disciplines_response.data])) if all_disciplines_response.data else []
+        if not exact_rows:
+            # Todas las disciplinas para este proyecto y etapa
             debug_info["available_disciplines"] = unique_disciplines
             
             # Buscar disciplinas que contengan "N/A" si es el caso
@@ -205,20 +232,24 @@ async def debug_activities(request: Request, params_str: str):
                         "search_bytes": [ord(c) for c in decoded_discipline]
                     }
             
-            # Buscar coincidencias aproximadas
-            similar_response = supabase.table("IB_Activities") \
-                .select("*") \
-                .ilike("project_code", decoded_project_code) \
-                .ilike("phase", decoded_stage) \
-                .ilike("discipline", decoded_discipline) \
-                .execute()
-            
-            debug_info["similar_match_count"] = len(similar_response.data) if similar_response.data else 0
-            
-            if similar_response.data:
-                debug_info["first_similar_item"] = similar_response.data[0]
+            # Buscar coincidencias aproximadas, ordenadas por similitud de trigramas
+            similar_disciplines = await run_in_threadpool(
+                activity_catalog.suggest_disciplines, decoded_project_code, decoded_stage, decoded_discipline
+            )
+            debug_info["similar_disciplines"] = similar_disciplines
+
+            similar_items = []
+            if similar_disciplines:
+                best_discipline = similar_disciplines[0]["discipline"]
+                similar_items = await run_in_threadpool(
+                    activity_catalog.get_activities, decoded_project_code, decoded_stage, best_discipline
+                )
+            debug_info["similar_match_count"] = len(similar_items)
+
+            if similar_items:
+                debug_info["first_similar_item"] = {**similar_items[0], "discipline": best_discipline}
         else:
-            debug_info["first_exact_item"] = response.data[0]
+            debug_info["first_exact_item"] = exact_rows[0]
         
         return debug_info
         
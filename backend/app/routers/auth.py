@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Request
 from fastapi.responses import JSONResponse
-from .. import crud, schemas
+from fastapi.concurrency import run_in_threadpool
+from .. import async_crud, schemas
 from passlib.context import CryptContext
 import logging
 
@@ -22,7 +23,7 @@ async def login(user_credentials: schemas.UserLogin, request: Request):
 
         # Get user from database
         try:
-            db_user = crud.get_user_by_username(username=user_credentials.username)
+            db_user = await async_crud.get_user_by_username(username=user_credentials.username)
         except Exception as db_e:
             logger.error(f"Database error getting user {user_credentials.username}: {db_e}", exc_info=True)
             raise HTTPException(
@@ -57,8 +58,8 @@ async def login(user_credentials: schemas.UserLogin, request: Request):
             input_password = input_bytes.decode('utf-8', errors='ignore')
         
         try:
-            # First try to verify as a bcrypt hash
-            password_valid = pwd_context.verify(input_password, user_password)
+            # First try to verify as a bcrypt hash (CPU-bound: run it off the event loop)
+            password_valid = await run_in_threadpool(pwd_context.verify, input_password, user_password)
         except Exception as pwd_e:
             # If bcrypt verification fails, check if it's a plain text password
             if "hash could not be identified" in str(pwd_e):
@@ -98,8 +99,8 @@ async def login(user_credentials: schemas.UserLogin, request: Request):
                     password_to_hash = password_bytes.decode('utf-8', errors='ignore')
                     logger.info(f"Truncated password for hashing (72-byte limit) for user: {user_credentials.username}")
                 
-                hashed_password = pwd_context.hash(password_to_hash)
-                crud.update_user_password(user_credentials.username, hashed_password)
+                hashed_password = await run_in_threadpool(pwd_context.hash, password_to_hash)
+                await async_crud.update_user_password(user_credentials.username, hashed_password)
                 logger.info(f"Successfully migrated password for user: {user_credentials.username}")
             except Exception as e:
                 logger.error(f"Failed to migrate password for user {user_credentials.username}: {e}", exc_info=True)
@@ -114,7 +115,7 @@ async def login(user_credentials: schemas.UserLogin, request: Request):
 
         # Get member from database
         try:
-            member = crud.get_member_by_id(member_id=member_id)
+            member = await async_crud.get_member_by_id(member_id=member_id)
         except Exception as member_e:
             logger.error(f"Database error getting member {member_id} for user {user_credentials.username}: {member_e}", exc_info=True)
             raise HTTPException(
@@ -1,10 +1,23 @@
 # app/routers/daily_activities.py
 from fastapi import APIRouter, Query, HTTPException
 from .. import crud
-from ..schemas import DailyActivity
+from ..schemas import DailyActivity, DailyActivitiesRange
 
 router = APIRouter(redirect_slashes=False)
 
+@router.get("/range", response_model=DailyActivitiesRange)
+def get_daily_activities_range(
+    date_from: str = Query(..., alias="from", description="Fecha inicial en formato YYYY-MM-DD"),
+    date_to: str = Query(..., alias="to", description="Fecha final en formato YYYY-MM-DD"),
+    employee_id: int = Query(..., description="ID del empleado")
+):
+    try:
+        return crud.get_daily_activities_range(date_from, date_to, employee_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error al obtener actividades diarias: {str(e)}")
+
 @router.get("", response_model=list[DailyActivity])
 def get_daily_activities(
     date: str = Query(..., description="Fecha en formato YYYY-MM-DD"),
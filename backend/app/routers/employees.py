@@ -1,12 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from .. import crud
+from fastapi import APIRouter, HTTPException, Request
+import json
+from ..utils.http_cache import PRIVATE_CACHE_CONTROL, conditional_response, is_not_modified, not_modified
+from ..utils.reference import members_table
 
 router = APIRouter()
 
 @router.get("/")
-def get_employees_endpoint():
+def get_employees_endpoint(request: Request):
     try:
-        employees = crud.get_employees()
-        return employees
+        # Validar contra la versión en memoria antes de tocar la tabla
+        etag = members_table.version
+        last_modified = members_table.last_modified
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL, last_modified)
+
+        body = members_table.document(
+            "employees", lambda rows: json.dumps(rows, ensure_ascii=False, default=str).encode("utf-8")
+        )
+        return conditional_response(request, body, etag, PRIVATE_CACHE_CONTROL, last_modified)
     except Exception as e:
         raise HTTPException(500, f"Error retrieving employees: {str(e)}")
\ No newline at end of file
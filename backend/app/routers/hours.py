@@ -1,29 +1,151 @@
 # hours.py
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from typing import Callable, Optional
+import itertools
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 import logging
 logging.basicConfig(level=logging.DEBUG)
 from .. import crud
-from ..schemas import ReportedHourCreate, ReportedHourUpdate, ReportedHour, GroupedHour
+from ..schemas import (
+    ReportedHourCreate,
+    ReportedHourUpdate,
+    ReportedHour,
+    GroupedHour,
+    GroupedActivityHour,
+    ReportedHourBatchResponse,
+    WeekHoursUpsert,
+    WeekHoursResponse,
+)
+from ..utils.journal import HOURS_WRITE_BEHIND, JournalFullError
+from ..utils.daily_totals import DailyCapExceededError
+from ..utils.export import EXPORT_FORMATS, csv_chunks, ndjson_chunks
+from ..utils.columnar import COLUMNAR_ANALYTICS_ENABLED, columnar_hours
+from ..utils.validation import validate_date, validate_employee_id, validate_project_code
+from ..utils.idempotency import (
+    idempotency_store,
+    request_fingerprint,
+    MAX_KEY_LENGTH,
+    REPLAY,
+    IN_PROGRESS,
+    MISMATCH,
+)
 
 limiter = Limiter(key_func=get_remote_address)
 
+# Una semana completa cabe holgadamente; evita lotes que bloqueen un worker
+MAX_BATCH_SIZE = 200
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _run_idempotent(idempotency_key: Optional[str], scope: str, payload: str, operation: Callable, response_model):
+    """
+    Ejecuta una escritura una sola vez por Idempotency-Key.
+
+    Un reintento con la misma clave y el mismo cuerpo recibe la respuesta
+    guardada sin tocar Supabase; si la primera petición falla la clave se
+    libera para que el reintento se ejecute de verdad.
+    """
+    if not idempotency_key:
+        return operation()
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key demasiado larga")
+
+    key = f"{scope}:{idempotency_key}"
+    state, stored = idempotency_store.begin(key, request_fingerprint(payload))
+    if state == REPLAY:
+        status_code, body = stored
+        return Response(
+            content=body,
+            status_code=status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+    if state == IN_PROGRESS:
+        raise HTTPException(status_code=409, detail="Ya hay una petición en curso con esta Idempotency-Key")
+    if state == MISMATCH:
+        raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con un cuerpo distinto")
+
+    try:
+        result = operation()
+    except BaseException:
+        idempotency_store.release(key)
+        raise
+    adapter = TypeAdapter(response_model)
+    idempotency_store.complete(key, 200, adapter.dump_json(adapter.validate_python(result)).decode("utf-8"))
+    return result
+
 @router.post("/", response_model=ReportedHour)
 @limiter.limit("20/minute")
-def create_hour(request: Request, hour: ReportedHourCreate):
+def create_hour(
+    request: Request,
+    hour: ReportedHourCreate,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
     logger.debug(f"Creando hora con: {hour}")
     try:
-        return crud.create_reported_hour(hour)
+        return _run_idempotent(
+            idempotency_key,
+            "POST /hours/",
+            hour.model_dump_json(),
+            lambda: crud.enqueue_reported_hour(hour) if HOURS_WRITE_BEHIND else crud.create_reported_hour(hour),
+            ReportedHour,
+        )
     except HTTPException:
         raise
+    except JournalFullError as e:
+        logger.warning(f"Diario de horas lleno: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except DailyCapExceededError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.exception("🔴 Error interno al crear hora")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch", response_model=ReportedHourBatchResponse)
+@limiter.limit("10/minute")
+def create_hours_batch(
+    request: Request,
+    hours: list[ReportedHourCreate] = Body(...),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
+    logger.debug(f"Creando {len(hours)} horas en lote")
+    if not hours:
+        raise HTTPException(status_code=422, detail="El lote no contiene registros")
+    if len(hours) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"El lote admite como máximo {MAX_BATCH_SIZE} registros")
+    try:
+        return _run_idempotent(
+            idempotency_key,
+            "POST /hours/batch",
+            TypeAdapter(list[ReportedHourCreate]).dump_json(hours).decode("utf-8"),
+            lambda: crud.create_reported_hours_batch(hours),
+            ReportedHourBatchResponse,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("🔴 Error interno al crear horas en lote")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/week", response_model=WeekHoursResponse)
+@limiter.limit("30/minute")
+def upsert_week(request: Request, week: WeekHoursUpsert):
+    logger.info(f"--- Guardando semana {week.year}-W{week.week} del empleado {week.employee_id} ({len(week.entries)} registros) ---")
+    try:
+        return crud.upsert_week_hours(week)
+    except DailyCapExceededError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Error de valor al guardar la semana: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Excepción inesperada al guardar la semana", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno al guardar la semana: {str(e)}")
+
 @router.put("/{hour_id}", response_model=ReportedHour)
 @limiter.limit("30/minute")
 def update_hour(request: Request, hour_id: str, hour: ReportedHourUpdate):
@@ -33,6 +155,9 @@ def update_hour(request: Request, hour_id: str, hour: ReportedHourUpdate):
         updated_hour = crud.update_reported_hour(hour_id, hour)
         logger.info(f"Hora ID: {hour_id} actualizada exitosamente.")
         return updated_hour
+    except DailyCapExceededError as e:
+        logger.error(f"Tope diario excedido al actualizar hora ID: {hour_id} - {e}")
+        raise HTTPException(status_code=422, detail=str(e))
     except ValueError as e:
         logger.error(f"Error de valor al actualizar hora ID: {hour_id} - {e}")
         raise HTTPException(status_code=404, detail=str(e))
@@ -54,12 +179,125 @@ def delete_hour(request: Request, hour_id: str):
 
 @router.get("/grouped-by-employee", response_model=list[GroupedHour])
 @limiter.limit("50/minute")
-def get_grouped_hours_by_employee(request: Request, year: int, month: int):
-    logger.info(f"▶ get_grouped_hours_by_employee | year={year} month={month}")
+def get_grouped_hours_by_employee(
+    request: Request,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    from_month: Optional[str] = Query(default=None, alias="from"),
+    to_month: Optional[str] = Query(default=None, alias="to"),
+):
+    logger.info(f"▶ get_grouped_hours_by_employee | year={year} month={month} from={from_month} to={to_month}")
+    if from_month or to_month:
+        # Un solo extremo equivale a un rango de un mes
+        from_month, to_month = from_month or to_month, to_month or from_month
+    elif year is None or month is None:
+        raise HTTPException(status_code=400, detail="Indique year y month, o un rango from/to (YYYY-MM)")
+    elif not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="El mes debe estar entre 1 y 12")
     try:
-        grouped_data = crud.get_grouped_hours_by_employee(year, month)
+        if from_month:
+            grouped_data = crud.get_grouped_hours_by_employee_range(from_month, to_month)
+        else:
+            grouped_data = crud.get_grouped_hours_by_employee(year, month)
         logger.info(f"Grouped hours by employee: {len(grouped_data)} records")
         return grouped_data
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Excepción inesperada al obtener horas agrupadas por empleado", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error interno al obtener horas agrupadas: {str(e)}")
+
+@router.get("/grouped-by-activity", response_model=list[GroupedActivityHour])
+@limiter.limit("50/minute")
+def get_grouped_hours_by_activity(request: Request, year: int, month: int, project: Optional[str] = None):
+    logger.info(f"▶ get_grouped_hours_by_activity | year={year} month={month} project={project}")
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="El mes debe estar entre 1 y 12")
+    try:
+        return crud.get_grouped_hours_by_activity(year, month, project.strip() if project else None)
+    except Exception as e:
+        logger.error("Excepción inesperada al obtener horas agrupadas por actividad", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno al obtener horas agrupadas: {str(e)}")
+
+@router.get("/analytics")
+@limiter.limit("30/minute")
+def get_hours_analytics(
+    request: Request,
+    group_by: str = "employee,project,month",
+    date_from: Optional[str] = Query(default=None, alias="from"),
+    date_to: Optional[str] = Query(default=None, alias="to"),
+    project: Optional[str] = None,
+    employee: Optional[int] = None,
+    phase: Optional[str] = None,
+    discipline: Optional[str] = None,
+):
+    """
+    Horas agrupadas por dimensiones (employee, project, phase, discipline, activity,
+    year, month, day) con filtros opcionales; requiere COLUMNAR_ANALYTICS=1.
+    """
+    if not COLUMNAR_ANALYTICS_ENABLED:
+        raise HTTPException(status_code=503, detail="El almacén analítico no está habilitado (COLUMNAR_ANALYTICS)")
+    if not columnar_hours.loaded:
+        raise HTTPException(status_code=503, detail="El almacén analítico se está cargando", headers={"Retry-After": "30"})
+    dimensions = [dimension.strip() for dimension in group_by.split(",") if dimension.strip()]
+    filters = {}
+    if project:
+        filters["project"] = [project.strip()]
+    if employee is not None:
+        filters["employee"] = [str(employee)]
+    if phase:
+        filters["phase"] = [phase.strip()]
+    if discipline:
+        filters["discipline"] = [discipline.strip()]
+    try:
+        if date_from:
+            date_from = validate_date(date_from)
+        if date_to:
+            date_to = validate_date(date_to)
+        return crud.get_hours_analytics(dimensions, date_from, date_to, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Excepción inesperada en la analítica de horas", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno en la analítica de horas: {str(e)}")
+
+@router.get("/export")
+@limiter.limit("10/minute")
+def export_hours(
+    request: Request,
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    project: Optional[str] = None,
+    employee: Optional[int] = None,
+    format: str = "csv",
+):
+    """Exporta las horas de un rango de fechas como CSV o NDJSON, en streaming."""
+    logger.info(f"▶ export_hours | from={date_from} to={date_to} project={project} employee={employee} format={format}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}. Use csv o ndjson")
+    try:
+        date_from = validate_date(date_from)
+        date_to = validate_date(date_to)
+        if date_from > date_to:
+            raise ValueError("La fecha 'from' debe ser anterior o igual a 'to'")
+        project_code = validate_project_code(project) if project else None
+        employee_id = validate_employee_id(employee) if employee is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = crud.iter_hours_export(date_from, date_to, project_code, employee_id)
+    try:
+        # Pedir la primera página antes de responder: si Supabase falla se devuelve un 500
+        first = next(rows, None)
+    except Exception as e:
+        logger.error("Excepción inesperada al exportar horas", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno al exportar horas: {str(e)}")
+    rows = itertools.chain([first], rows) if first is not None else iter(())
+
+    encode = csv_chunks if format == "csv" else ndjson_chunks
+    filename = f"horas_{date_from}_{date_to}.{format}"
+    return StreamingResponse(
+        encode(rows),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,17 +1,61 @@
 # projects.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import TypeAdapter
 from urllib.parse import unquote
 from .. import crud
-from ..schemas import ProjectBase
+from ..schemas import ProjectBase, ProjectBurn
+from ..utils.catalog import activity_catalog
+from ..utils.http_cache import REFERENCE_CACHE_CONTROL, conditional_response, is_not_modified, not_modified
+from ..utils.reference import projects_table
 
 router = APIRouter()
 
+_projects_adapter = TypeAdapter(list[ProjectBase])
+
 @router.get("/", response_model=list[ProjectBase])
-def read_projects():
+def read_projects(request: Request):
+    # Validar contra la versión en memoria antes de tocar la tabla
+    etag = projects_table.version
+    last_modified = projects_table.last_modified
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, REFERENCE_CACHE_CONTROL, last_modified)
+
     projects = crud.get_projects()
     if not projects:
         raise HTTPException(404, "No se encontraron proyectos")
-    return projects
+    body = projects_table.document(
+        "projects", lambda rows: _projects_adapter.dump_json(_projects_adapter.validate_python(rows))
+    )
+    return conditional_response(request, body, etag, REFERENCE_CACHE_CONTROL, last_modified)
+
+@router.get("/{project_code:path}/catalog")
+def get_project_catalog(request: Request, project_code: str):
+    """
+    Árbol completo fase -> disciplina -> actividades del proyecto en una sola respuesta.
+
+    Lleva un ETag fuerte calculado del contenido; con If-None-Match responde 304.
+    """
+    decoded_project_code = unquote(project_code)
+    try:
+        document = activity_catalog.project_document(decoded_project_code)
+    except Exception as e:
+        raise HTTPException(500, f"Error retrieving project catalog: {str(e)}")
+    if document is None:
+        raise HTTPException(404, f"Proyecto {decoded_project_code} no encontrado")
+    body, etag = document
+    return conditional_response(request, body, etag, REFERENCE_CACHE_CONTROL)
+
+@router.get("/{project_code:path}/burn", response_model=ProjectBurn)
+def get_project_burn(project_code: str):
+    """Consumo del presupuesto de horas por fase, disciplina y actividad."""
+    decoded_project_code = unquote(project_code)
+    try:
+        burn = crud.get_project_burn(decoded_project_code)
+    except Exception as e:
+        raise HTTPException(500, f"Error retrieving project burn: {str(e)}")
+    if burn is None:
+        raise HTTPException(404, f"Proyecto {decoded_project_code} no encontrado")
+    return burn
 
 @router.get("/{project_code:path}", response_model=ProjectBase)
 def get_project(project_code: str):
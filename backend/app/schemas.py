@@ -62,6 +62,23 @@ class DailyActivity(BaseModel):
     note: Optional[str] = Field(default=None)
     model_config = ConfigDict(from_attributes=True)
 
+class DailyActivitiesDay(BaseModel):
+    date: date
+    weekday: int  # 0 = lunes
+    is_workday: bool
+    has_activities: bool
+    total_hours: float
+    activities: list[DailyActivity]
+
+class DailyActivitiesRange(BaseModel):
+    employee_id: int
+    date_from: date
+    date_to: date
+    total_hours: float
+    days_with_activities: int
+    missing_workdays: list[date]
+    days: list[DailyActivitiesDay]
+
 # Añade esta clase al final del archivo
 class ActivityItem(BaseModel):
     id: int
@@ -83,3 +100,88 @@ class GroupedHour(BaseModel):
     short_name: str
     hours: float
     model_config = ConfigDict(from_attributes=True)
+
+class GroupedActivityHour(BaseModel):
+    project_code: str
+    phase: Optional[str] = None
+    discipline: Optional[str] = None
+    month: str
+    hours: float
+    model_config = ConfigDict(from_attributes=True)
+
+class ReportedHourBatchResult(BaseModel):
+    index: int
+    ok: bool
+    data: Optional[ReportedHour] = None
+    error: Optional[str] = None
+
+class ReportedHourBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: list[ReportedHourBatchResult]
+
+class WeekHourEntry(BaseModel):
+    id: Optional[str] = None  # UUID de un registro existente; sin id es un registro nuevo
+    date: date
+    project_code: str
+    phase: str
+    discipline: str
+    activity: str
+    hours: float
+    note: Optional[str] = Field(default=None)
+
+class WeekHoursUpsert(BaseModel):
+    employee_id: int
+    year: int  # Año ISO
+    week: int  # Semana ISO (1-53)
+    entries: list[WeekHourEntry]
+
+class WeekDiffSummary(BaseModel):
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+class WeekHoursResponse(BaseModel):
+    employee_id: int
+    year: int
+    week: int
+    entries: list[ReportedHour]
+    diff: WeekDiffSummary
+
+class BurnFigures(BaseModel):
+    budget_hours: float
+    actual_hours: float
+    remaining_hours: float
+    overrun_hours: float
+    consumed_pct: Optional[float] = None
+
+class PhaseBurn(BurnFigures):
+    phase: Optional[str] = None
+
+class DisciplineBurn(BurnFigures):
+    phase: Optional[str] = None
+    discipline: Optional[str] = None
+
+class ActivityBurn(BurnFigures):
+    activity_id: Optional[int] = None
+    phase: Optional[str] = None
+    discipline: Optional[str] = None
+    activity: Optional[str] = None
+    budget_direction: Optional[float] = None
+    budget_engineering: Optional[float] = None
+    budget_modeling_ad: Optional[float] = None
+
+class UnbudgetedHours(BaseModel):
+    phase: Optional[str] = None
+    discipline: Optional[str] = None
+    activity: Optional[str] = None
+    actual_hours: float
+
+class ProjectBurn(BurnFigures):
+    project_code: str
+    unbudgeted_hours: float
+    phases: list[PhaseBurn]
+    disciplines: list[DisciplineBurn]
+    activities: list[ActivityBurn]
+    unbudgeted: list[UnbudgetedHours]
@@ -0,0 +1,22 @@
+"""
+Protección de los endpoints operativos (/metrics, recarga del catálogo).
+
+Se habilitan con ADMIN_TOKEN y se llaman con `Authorization: Bearer <token>`.
+Sin ADMIN_TOKEN configurado responden 404, así que nunca quedan abiertos en
+el API público por omisión.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(authorization: Optional[str] = Header(default=None)) -> None:
+    """FastAPI dependency that rejects requests without the admin bearer token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administración inválido", headers={"WWW-Authenticate": "Bearer"})
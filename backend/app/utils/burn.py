@@ -0,0 +1,170 @@
+"""
+Consumo del presupuesto de horas de un proyecto (presupuesto vs. real).
+
+Los presupuestos de IB_Activities y las horas reales ya sumadas por actividad
+se pasan a arreglos de NumPy; el cruce y los totales por fase y disciplina
+son operaciones vectorizadas (bincount), así que el costo crece con el
+número de actividades y no con el de registros.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .catalog import normalize_name
+
+BUDGET_ROLE_COLUMNS = ("hours_direction", "hours_engineering", "hours_modeling_ad")
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _column(rows: List[dict], name: str) -> np.ndarray:
+    return np.fromiter((_as_float(row.get(name)) for row in rows), dtype=np.float64, count=len(rows))
+
+def _key_function():
+    # Fases y disciplinas se repiten mucho: normalizar cada texto una sola vez
+    normalized: Dict[Optional[str], str] = {}
+
+    def normalize(value) -> str:
+        result = normalized.get(value)
+        if result is None:
+            result = normalized[value] = normalize_name(value)
+        return result
+
+    def key(row: dict) -> Tuple[str, str, str]:
+        return normalize(row.get("phase")), normalize(row.get("discipline")), normalize(row.get("activity"))
+
+    return key
+
+def _label(value) -> Optional[str]:
+    return " ".join(str(value).split()) if value is not None else None
+
+def _figures(budget: np.ndarray, actual: np.ndarray) -> Dict[str, np.ndarray]:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        consumed = np.where(budget > 0, actual / budget * 100.0, np.nan)
+    return {
+        "budget_hours": budget,
+        "actual_hours": actual,
+        "remaining_hours": np.maximum(budget - actual, 0.0),
+        "overrun_hours": np.maximum(actual - budget, 0.0),
+        "consumed_pct": consumed,
+    }
+
+def _rows(labels: List[dict], figures: Dict[str, np.ndarray]) -> List[dict]:
+    # Convertir a listas de Python una sola vez por columna
+    columns = {name: np.round(values, 2).tolist() for name, values in figures.items()}
+    result = []
+    for position, label in enumerate(labels):
+        row = dict(label)
+        for name, values in columns.items():
+            value = values[position]
+            row[name] = None if value != value else value  # NaN -> None
+        result.append(row)
+    return result
+
+def _group(codes: np.ndarray, size: int, budget: np.ndarray, actual: np.ndarray) -> Dict[str, np.ndarray]:
+    return _figures(
+        np.bincount(codes, weights=budget, minlength=size),
+        np.bincount(codes, weights=actual, minlength=size),
+    )
+
+def compute_burn(project_code: str, budget_rows: List[dict], actual_rows: Iterable[dict]) -> dict:
+    """
+    Compare activity budgets with the hours actually reported.
+
+    Args:
+        project_code: Project being analysed
+        budget_rows: IB_Activities rows of the project with the budget columns
+        actual_rows: Reported hours summed per (phase, discipline, activity)
+
+    Returns:
+        Dict with project totals plus per-phase, per-discipline and
+        per-activity figures, and the reported hours that match no activity
+    """
+    count = len(budget_rows)
+    roles = {name: _column(budget_rows, name) for name in BUDGET_ROLE_COLUMNS}
+    declared_total = _column(budget_rows, "hours")
+    role_total = sum(np.nan_to_num(values) for values in roles.values()) if count else np.zeros(0)
+    # Si la actividad no trae el total, el presupuesto es la suma de los tres roles
+    budget = np.where(np.isnan(declared_total), role_total, declared_total)
+
+    # Índice de cada actividad por nombre normalizado (si se repite, gana la primera)
+    key_of = _key_function()
+    budget_keys = [key_of(row) for row in budget_rows]
+    positions: Dict[Tuple[str, str, str], int] = {}
+    for position, key in enumerate(budget_keys):
+        positions.setdefault(key, position)
+
+    matched_positions: List[int] = []
+    matched_hours: List[float] = []
+    unbudgeted: Dict[Tuple[str, str, str], dict] = {}
+    for row in actual_rows:
+        hours = _as_float(row.get("hours"))
+        if hours != hours:
+            continue
+        key = key_of(row)
+        position = positions.get(key)
+        if position is None:
+            item = unbudgeted.setdefault(key, {
+                "phase": _label(row.get("phase")),
+                "discipline": _label(row.get("discipline")),
+                "activity": _label(row.get("activity")),
+                "actual_hours": 0.0,
+            })
+            item["actual_hours"] += hours
+        else:
+            matched_positions.append(position)
+            matched_hours.append(hours)
+
+    actual = np.bincount(
+        np.asarray(matched_positions, dtype=np.intp),
+        weights=np.asarray(matched_hours, dtype=np.float64),
+        minlength=count,
+    ) if count else np.zeros(0)
+
+    # Códigos de grupo por fase y por (fase, disciplina)
+    phase_codes: Dict[str, int] = {}
+    discipline_codes: Dict[Tuple[str, str], int] = {}
+    phase_labels: List[dict] = []
+    discipline_labels: List[dict] = []
+    phase_index = np.empty(count, dtype=np.intp)
+    discipline_index = np.empty(count, dtype=np.intp)
+    for position, row in enumerate(budget_rows):
+        phase_key, discipline_key, _ = budget_keys[position]
+        if phase_key not in phase_codes:
+            phase_codes[phase_key] = len(phase_labels)
+            phase_labels.append({"phase": _label(row.get("phase"))})
+        if (phase_key, discipline_key) not in discipline_codes:
+            discipline_codes[(phase_key, discipline_key)] = len(discipline_labels)
+            discipline_labels.append({"phase": _label(row.get("phase")), "discipline": _label(row.get("discipline"))})
+        phase_index[position] = phase_codes[phase_key]
+        discipline_index[position] = discipline_codes[(phase_key, discipline_key)]
+
+    activity_labels = [
+        {
+            "activity_id": row.get("activity_id"),
+            "phase": _label(row.get("phase")),
+            "discipline": _label(row.get("discipline")),
+            "activity": _label(row.get("activity")),
+        }
+        for row in budget_rows
+    ]
+    activity_figures = _figures(budget, actual)
+    for name, values in roles.items():
+        activity_figures[f"budget_{name[len('hours_'):]}"] = values
+
+    totals = _rows([{}], _figures(np.array([budget.sum()]), np.array([actual.sum()])))[0]
+    return {
+        "project_code": project_code,
+        **totals,
+        "unbudgeted_hours": round(sum(item["actual_hours"] for item in unbudgeted.values()), 2),
+        "phases": _rows(phase_labels, _group(phase_index, len(phase_labels), budget, actual)),
+        "disciplines": _rows(discipline_labels, _group(discipline_index, len(discipline_labels), budget, actual)),
+        "activities": _rows(activity_labels, activity_figures),
+        "unbudgeted": [
+            {**item, "actual_hours": round(item["actual_hours"], 2)}
+            for item in sorted(unbudgeted.values(), key=lambda item: -item["actual_hours"])
+        ],
+    }
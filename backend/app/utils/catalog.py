@@ -0,0 +1,369 @@
+"""
+Índice en memoria del catálogo de actividades (IB_Activities).
+
+Carga la tabla completa una sola vez y responde la cascada
+proyecto -> fase -> disciplina -> actividades sin ir a Supabase.
+"""
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+from .fuzzy import TrigramIndex
+from .http_cache import make_etag
+from .reference import ReferenceCache, RowChange
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+# Guiones tipográficos que aparecen al copiar desde Word/Excel
+_DASHES = re.compile(r"[\u2010\u2011\u2012\u2013\u2014\u2015\u2212]")
+_SPACED_DASH = re.compile(r"\s*-\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_name(value: str) -> str:
+    """
+    Normalize a catalog name for lookups.
+
+    Collapses case, runs of whitespace and dash variants, so that
+    'N/A - No Aplica', ' n/a-No  Aplica ' and 'N/A – No Aplica' share a key.
+
+    Args:
+        value: Raw phase, discipline or activity name
+
+    Returns:
+        Normalized key
+    """
+    if not isinstance(value, str):
+        return ""
+    normalized = _DASHES.sub("-", value)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    normalized = _SPACED_DASH.sub("-", normalized)
+    return normalized.casefold()
+
+ActivityKey = Tuple[str, str, str, str]
+
+class _ScopeIndex:
+    """Trigram indexes over the activities and disciplines of one (project, phase)."""
+
+    __slots__ = ("fingerprint", "activities", "disciplines")
+
+    def __init__(self, fingerprint: int, phase_disciplines: Dict[str, List[dict]]):
+        self.fingerprint = fingerprint
+        self.activities = TrigramIndex(
+            (normalize_name(item["name"]), {"id": item["id"], "activity": item["name"], "discipline": discipline})
+            for discipline, items in phase_disciplines.items()
+            for item in items
+        )
+        self.disciplines = TrigramIndex(
+            (normalize_name(discipline), discipline) for discipline in phase_disciplines
+        )
+
+    @staticmethod
+    def fingerprint_of(phase_disciplines: Dict[str, List[dict]]) -> int:
+        return hash(tuple(
+            (discipline, item["id"], item["name"])
+            for discipline, items in phase_disciplines.items()
+            for item in items
+        ))
+
+class ActivityCatalog(ReferenceCache):
+    """
+    Process-wide, read-mostly index of IB_Activities.
+
+    Keys keep the exact database values, matching the `.eq()` semantics of
+    the old queries.
+    """
+
+    table_name = "IB_Activities"
+    columns = "activity_id, project_code, phase, discipline, activity"
+    primary_key = "activity_id"
+
+    def __init__(self, ttl_seconds: float = CATALOG_TTL_SECONDS):
+        super().__init__("Activity catalog", ttl_seconds)
+        # project_code -> phase -> discipline -> [{"id": activity_id, "name": activity}]
+        self._tree: Dict[str, Dict[str, Dict[str, List[dict]]]] = {}
+        # (project_code, phase, disciplina normalizada, actividad normalizada) -> activity_id
+        self._activity_ids: Dict[ActivityKey, int] = {}
+        # (project_code, phase) -> índices de trigramas para sugerencias
+        self._scopes: Dict[Tuple[str, str], _ScopeIndex] = {}
+        self._scopes_rebuilt = 0
+
+    @staticmethod
+    def _build_tree(rows: List[dict]) -> Dict[str, Dict[str, Dict[str, List[dict]]]]:
+        tree: Dict[str, Dict[str, Dict[str, List[dict]]]] = {}
+        for row in rows:
+            project_code = row.get("project_code")
+            phase = row.get("phase")
+            discipline = row.get("discipline")
+            if project_code is None or phase is None or discipline is None:
+                continue
+            tree.setdefault(project_code, {}) \
+                .setdefault(phase, {}) \
+                .setdefault(discipline, []) \
+                .append({"id": row["activity_id"], "name": row["activity"]})
+        return tree
+
+    @staticmethod
+    def _build_activity_ids(rows: List[dict]) -> Dict[ActivityKey, int]:
+        activity_ids: Dict[ActivityKey, int] = {}
+        for row in rows:
+            project_code = row.get("project_code")
+            phase = row.get("phase")
+            if project_code is None or phase is None:
+                continue
+            key = (
+                project_code.strip(),
+                phase.strip(),
+                normalize_name(row.get("discipline")),
+                normalize_name(row.get("activity")),
+            )
+            # Igual que response.data[0]: gana la primera fila
+            activity_ids.setdefault(key, int(row["activity_id"]))
+        return activity_ids
+
+    def _build_scopes(self, tree: Dict[str, Dict[str, Dict[str, List[dict]]]]) -> Tuple[Dict[Tuple[str, str], _ScopeIndex], int]:
+        # Solo se reconstruyen los ámbitos cuyo contenido cambió desde la última carga
+        previous = self._scopes
+        scopes: Dict[Tuple[str, str], _ScopeIndex] = {}
+        rebuilt = 0
+        for project_code, phases in tree.items():
+            for phase, phase_disciplines in phases.items():
+                key = (project_code, phase)
+                fingerprint = _ScopeIndex.fingerprint_of(phase_disciplines)
+                scope = previous.get(key)
+                if scope is None or scope.fingerprint != fingerprint:
+                    scope = _ScopeIndex(fingerprint, phase_disciplines)
+                    rebuilt += 1
+                scopes[key] = scope
+        return scopes, rebuilt
+
+    def _rebuild(self, rows: List[dict]) -> None:
+        tree = self._build_tree(rows)
+        activity_ids = self._build_activity_ids(rows)
+        scopes, rebuilt = self._build_scopes(tree)
+
+        self._tree = tree
+        self._activity_ids = activity_ids
+        self._scopes = scopes
+        self._scopes_rebuilt = rebuilt
+
+    @staticmethod
+    def _place(row: Optional[dict]) -> Optional[Tuple[str, str, str]]:
+        if row is None:
+            return None
+        place = (row.get("project_code"), row.get("phase"), row.get("discipline"))
+        return None if None in place else place
+
+    def _update(self, rows: List[dict], changes: List[RowChange]) -> None:
+        # Se copian solo el proyecto y la fase de cada fila cambiada: los
+        # lectores siguen recorriendo el árbol anterior sin lock
+        previous_tree = self._tree
+        tree = dict(previous_tree)
+        copied_projects = set()
+        touched: Dict[Tuple[str, str], Dict[str, List[dict]]] = {}
+
+        def phase_of(project_code: str, phase: str) -> Dict[str, List[dict]]:
+            phase_disciplines = touched.get((project_code, phase))
+            if phase_disciplines is None:
+                if project_code not in copied_projects:
+                    tree[project_code] = dict(tree.get(project_code, {}))
+                    copied_projects.add(project_code)
+                phase_disciplines = {
+                    discipline: list(items)
+                    for discipline, items in tree[project_code].get(phase, {}).items()
+                }
+                tree[project_code][phase] = phase_disciplines
+                touched[(project_code, phase)] = phase_disciplines
+            return phase_disciplines
+
+        for old_row, new_row in changes:
+            old_place, new_place = self._place(old_row), self._place(new_row)
+            position = None
+            if old_place is not None:
+                items = phase_of(old_place[0], old_place[1]).get(old_place[2], [])
+                for index, item in enumerate(items):
+                    if item["id"] == old_row["activity_id"]:
+                        del items[index]
+                        # Un cambio dentro de la misma disciplina conserva el orden
+                        if old_place == new_place:
+                            position = index
+                        break
+            if new_place is not None:
+                items = phase_of(new_place[0], new_place[1]).setdefault(new_place[2], [])
+                item = {"id": new_row["activity_id"], "name": new_row["activity"]}
+                items.insert(len(items) if position is None else position, item)
+
+        activity_ids = self._activity_ids
+        rebuilt = 0
+        for (project_code, phase), phase_disciplines in touched.items():
+            for discipline in [d for d, items in phase_disciplines.items() if not items]:
+                del phase_disciplines[discipline]
+            if not phase_disciplines:
+                del tree[project_code][phase]
+                if not tree[project_code]:
+                    del tree[project_code]
+
+            # Los lectores solo hacen get() sobre estos índices: se tocan en el
+            # sitio, sin quitar antes una clave que la fase sigue teniendo
+            scope_key = (project_code.strip(), phase.strip())
+            stale = set()
+            for discipline, items in previous_tree.get(project_code, {}).get(phase, {}).items():
+                for item in items:
+                    key = scope_key + (normalize_name(discipline), normalize_name(item["name"]))
+                    if activity_ids.get(key) == int(item["id"]):
+                        stale.add(key)
+            fresh: Dict[ActivityKey, int] = {}
+            for discipline, items in phase_disciplines.items():
+                for item in items:
+                    key = scope_key + (normalize_name(discipline), normalize_name(item["name"]))
+                    fresh.setdefault(key, int(item["id"]))
+            for key in stale - fresh.keys():
+                del activity_ids[key]
+            for key, activity_id in fresh.items():
+                if key in stale or key not in activity_ids:
+                    activity_ids[key] = activity_id
+
+            if not phase_disciplines:
+                self._scopes.pop((project_code, phase), None)
+                continue
+            fingerprint = _ScopeIndex.fingerprint_of(phase_disciplines)
+            scope = self._scopes.get((project_code, phase))
+            if scope is None or scope.fingerprint != fingerprint:
+                self._scopes[(project_code, phase)] = _ScopeIndex(fingerprint, phase_disciplines)
+                rebuilt += 1
+
+        self._tree = tree
+        self._scopes_rebuilt = rebuilt
+
+    def get_project(self, project_code: str) -> Dict[str, Dict[str, List[dict]]]:
+        self._ensure_fresh()
+        return self._tree.get(project_code, {})
+
+    def get_phase(self, project_code: str, phase: str) -> Dict[str, List[dict]]:
+        return self.get_project(project_code).get(phase, {})
+
+    def get_stages(self, project_code: str) -> List[str]:
+        return list(self.get_project(project_code).keys())
+
+    def get_disciplines(self, project_code: str, phase: str) -> List[str]:
+        return list(self.get_phase(project_code, phase).keys())
+
+    def get_activities(self, project_code: str, phase: str, discipline: str) -> List[dict]:
+        return [dict(item) for item in self.get_phase(project_code, phase).get(discipline, [])]
+
+    def project_document(self, project_code: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Serialized phase/discipline/activity tree of a project and its ETag.
+
+        The body is built once per catalog version, so revalidations only cost
+        a dict lookup. The ETag is derived from the body, so it only changes
+        when the project's catalog content changes.
+
+        Returns:
+            (body, etag), or None if the project has no activities
+        """
+        clean_project_code = project_code.strip()
+        phases = self.get_project(clean_project_code)
+        if not phases:
+            return None
+
+        def render(rows: List[dict]) -> Tuple[bytes, str]:
+            body = json.dumps(
+                {"code": clean_project_code, "phases": phases},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+            return body, make_etag(body)
+
+        return self.document(f"project:{clean_project_code}", render)
+
+    def resolve_activity_id(self, project_code: str, phase: str, discipline: str, activity: str) -> Optional[int]:
+        """
+        Resolve an activity_id from the catalog without touching Supabase.
+
+        First a single hash lookup on the normalized key; on a miss, the same
+        partial matches the old ilike ladder tried, in the same order, but over
+        the in-memory phase bucket.
+
+        Returns:
+            The activity_id, or None if the catalog has no match
+        """
+        self._ensure_fresh()
+        clean_project_code = project_code.strip()
+        clean_phase = phase.strip()
+        wanted_discipline = normalize_name(discipline)
+        wanted_activity = normalize_name(activity)
+
+        activity_id = self._activity_ids.get(
+            (clean_project_code, clean_phase, wanted_discipline, wanted_activity)
+        )
+        if activity_id is not None:
+            return activity_id
+
+        phase_disciplines = self.get_phase(clean_project_code, clean_phase)
+        candidates = [
+            (normalize_name(discipline_name), normalize_name(item["name"]), item["id"])
+            for discipline_name, items in phase_disciplines.items()
+            for item in items
+        ]
+        ladder = (
+            # disciplina parcial, actividad exacta
+            lambda d, a: wanted_discipline in d and a == wanted_activity,
+            # disciplina exacta, actividad parcial
+            lambda d, a: d == wanted_discipline and wanted_activity in a,
+            # ambas parciales
+            lambda d, a: wanted_discipline in d and wanted_activity in a,
+        )
+        for matches in ladder:
+            for discipline_key, activity_key, candidate_id in candidates:
+                if matches(discipline_key, activity_key):
+                    return int(candidate_id)
+        return None
+
+    def suggest_activities(self, project_code: str, phase: str, activity: str, k: int = 5) -> List[dict]:
+        """
+        Rank the activities of a project phase by trigram similarity.
+
+        Returns:
+            Up to k dicts with id, activity, discipline and score, best first
+        """
+        self._ensure_fresh()
+        scope = self._scopes.get((project_code.strip(), phase.strip()))
+        if scope is None:
+            return []
+        return [
+            {**payload, "score": score}
+            for score, payload in scope.activities.search(normalize_name(activity), k)
+        ]
+
+    def suggest_disciplines(self, project_code: str, phase: str, discipline: str, k: int = 5) -> List[dict]:
+        """
+        Rank the disciplines of a project phase by trigram similarity.
+
+        Returns:
+            Up to k dicts with discipline and score, best first
+        """
+        self._ensure_fresh()
+        scope = self._scopes.get((project_code.strip(), phase.strip()))
+        if scope is None:
+            return []
+        return [
+            {"discipline": payload, "score": score}
+            for score, payload in scope.disciplines.search(normalize_name(discipline), k)
+        ]
+
+    def stats(self) -> dict:
+        tree = self._tree
+        return {
+            **super().stats(),
+            "projects": len(tree),
+            "phases": sum(len(p) for p in tree.values()),
+            "disciplines": sum(len(d) for p in tree.values() for d in p.values()),
+            "activity_keys": len(self._activity_ids),
+            "suggestion_scopes": len(self._scopes),
+            "suggestion_scopes_rebuilt": self._scopes_rebuilt,
+        }
+
+activity_catalog = ActivityCatalog()
+metrics.register("activity_catalog", activity_catalog.stats)
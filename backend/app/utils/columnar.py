@@ -0,0 +1,388 @@
+"""
+Almacén columnar en memoria de IB_Reported_Hours para análisis.
+
+Cada columna es un arreglo de NumPy: los textos (empleado, proyecto, fase,
+disciplina, actividad) van codificados con diccionario en int32, la fecha
+como número de día (int32) y las horas en float32. Un group-by filtrado por
+varias dimensiones sobre años de registros es una máscara vectorizada más un
+bincount, en milisegundos.
+
+Es opcional (COLUMNAR_ANALYTICS=1): se carga en segundo plano al arrancar,
+recibe las escrituras de crud y se recarga completo cada
+COLUMNAR_RELOAD_SECONDS para recoger lo escrito por otros workers.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date as date_type
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..repository import db
+from . import metrics
+from .pagination import iter_rows
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_ANALYTICS_ENABLED = os.getenv("COLUMNAR_ANALYTICS", "0").lower() in ("1", "true", "yes")
+COLUMNAR_RELOAD_SECONDS = float(os.getenv("COLUMNAR_RELOAD_SECONDS", "3600"))
+_INITIAL_CAPACITY = 1024
+# Con más de esta fracción de filas borradas se compactan los arreglos
+_COMPACT_RATIO = 0.25
+
+TEXT_DIMENSIONS = ("employee", "project", "phase", "discipline", "activity")
+DATE_DIMENSIONS = ("year", "month", "day")
+DIMENSIONS = TEXT_DIMENSIONS + DATE_DIMENSIONS
+# Las claves de grupo en base mixta son int64
+_MAX_KEY_SPACE = 2 ** 63
+_SOURCE_COLUMNS = {
+    "employee": "employee_id",
+    "project": "project_code",
+    "phase": "phase",
+    "discipline": "discipline",
+    "activity": "activity",
+}
+_EPOCH = date_type(1970, 1, 1)
+
+class _Dictionary:
+    """String <-> int32 code mapping; codes are never reused."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.codes: Dict[Optional[str], int] = {}
+
+    def encode(self, value) -> int:
+        value = None if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value) -> Optional[int]:
+        return self.codes.get(None if value is None else str(value))
+
+def _day_number(value) -> Optional[int]:
+    try:
+        return (date_type.fromisoformat(str(value)[:10]) - _EPOCH).days
+    except (TypeError, ValueError):
+        return None
+
+class _Columns:
+    """The arrays themselves: append-only, with a tombstone mask for updates and deletes."""
+
+    def __init__(self, capacity: int = _INITIAL_CAPACITY):
+        self.size = 0
+        self.dictionaries = {dimension: _Dictionary() for dimension in TEXT_DIMENSIONS}
+        self.codes = {dimension: np.zeros(capacity, dtype=np.int32) for dimension in TEXT_DIMENSIONS}
+        self.days = np.zeros(capacity, dtype=np.int32)
+        self.hours = np.zeros(capacity, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        self.positions: Dict[str, int] = {}
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.days)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for dimension in TEXT_DIMENSIONS:
+            self.codes[dimension] = np.resize(self.codes[dimension], capacity)
+        self.days = np.resize(self.days, capacity)
+        self.hours = np.resize(self.hours, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+
+    def append(self, row: dict) -> None:
+        hour_id = str(row.get("id"))
+        day = _day_number(row.get("date"))
+        self.remove(hour_id)
+        if day is None:
+            return
+        try:
+            hours = float(row.get("hours") or 0)
+        except (TypeError, ValueError):
+            hours = 0.0
+        self._grow(self.size + 1)
+        position = self.size
+        for dimension, column in _SOURCE_COLUMNS.items():
+            self.codes[dimension][position] = self.dictionaries[dimension].encode(row.get(column))
+        self.days[position] = day
+        self.hours[position] = hours
+        self.alive[position] = True
+        self.ids.append(hour_id)
+        self.positions[hour_id] = position
+        self.size += 1
+
+    def remove(self, hour_id: str) -> None:
+        position = self.positions.pop(hour_id, None)
+        if position is not None:
+            self.alive[position] = False
+            self.ids[position] = None
+
+    def needs_compaction(self) -> bool:
+        return self.size > _INITIAL_CAPACITY and len(self.positions) < self.size * (1 - _COMPACT_RATIO)
+
+    def compact(self) -> None:
+        keep = np.flatnonzero(self.alive[:self.size])
+        capacity = max(_INITIAL_CAPACITY, len(keep) * 2)
+
+        def packed(values: np.ndarray) -> np.ndarray:
+            result = np.zeros(capacity, dtype=values.dtype)
+            result[:len(keep)] = values[keep]
+            return result
+
+        for dimension in TEXT_DIMENSIONS:
+            self.codes[dimension] = packed(self.codes[dimension])
+        self.days = packed(self.days)
+        self.hours = packed(self.hours)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:len(keep)] = True
+        self.ids = [self.ids[position] for position in keep]
+        self.positions = {hour_id: position for position, hour_id in enumerate(self.ids)}
+        self.size = len(keep)
+
+    def nbytes(self) -> int:
+        return int(sum(codes.nbytes for codes in self.codes.values()) + self.days.nbytes + self.hours.nbytes + self.alive.nbytes)
+
+class ColumnarHoursStore:
+    """
+    Columnar copy of IB_Reported_Hours with vectorized group-bys.
+
+    Writes received while a reload is scanning the table are replayed on the
+    new columns before they are swapped in.
+    """
+
+    def __init__(self, reload_seconds: float = COLUMNAR_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._data = _Columns()
+        self._pending: Optional[List[Tuple[Optional[dict], Optional[dict]]]] = None
+        self.loaded = False
+        self.loads = 0
+        self.appends = 0
+        self.compactions = 0
+        self.last_load_ms = 0.0
+        self.last_load_wall: Optional[float] = None
+        self.last_query_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def _apply_to(self, data: _Columns, old_row: Optional[dict], new_row: Optional[dict]) -> None:
+        if old_row is not None:
+            data.remove(str(old_row.get("id")))
+        if new_row is not None:
+            data.append(new_row)
+
+    def load(self) -> None:
+        """Read the whole table (paginated) into fresh columns and swap them in."""
+        started = time.perf_counter()
+        with self._lock:
+            self._pending = []
+        fresh = _Columns()
+        try:
+            rows = iter_rows(
+                lambda: db
+                    .table("IB_Reported_Hours")
+                    .select("id, date, employee_id, project_code, phase, discipline, activity, hours"),
+                key="id",
+            )
+            for row in rows:
+                fresh.append(row)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for old_row, new_row in self._pending:
+                self._apply_to(fresh, old_row, new_row)
+            self._pending = None
+            self._data = fresh
+            self.loaded = True
+        self.loads += 1
+        self.last_load_ms = (time.perf_counter() - started) * 1000
+        self.last_load_wall = time.time()
+        self.last_error = None
+        logger.info(f"Columnar hours store loaded: {len(fresh.positions)} rows in {self.last_load_ms:.0f} ms")
+
+    def apply(self, old_row: Optional[dict] = None, new_row: Optional[dict] = None) -> None:
+        """Reflect one write: tombstone `old_row`, append `new_row`."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((old_row, new_row))
+            if not self.loaded:
+                return
+            self._apply_to(self._data, old_row, new_row)
+            if new_row is not None:
+                self.appends += 1
+            if self._data.needs_compaction():
+                self._data.compact()
+                self.compactions += 1
+
+    def group_by(
+        self,
+        dimensions: Sequence[str],
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        filters: Optional[Dict[str, Iterable]] = None,
+    ) -> List[dict]:
+        """
+        Sum hours grouped by any combination of dimensions.
+
+        Args:
+            dimensions: Subset of DIMENSIONS to group by (may be empty for a grand total)
+            date_from: First date included (YYYY-MM-DD)
+            date_to: Last date included (YYYY-MM-DD)
+            filters: Allowed values per text dimension, e.g. {"project": ["0010"]}
+
+        Returns:
+            One dict per group with the dimension values, `hours` and `entries`
+
+        Raises:
+            ValueError: If a dimension or filter is unknown
+        """
+        unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+        unknown += [dimension for dimension in (filters or {}) if dimension not in TEXT_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Dimensiones no soportadas: {', '.join(unknown)}")
+
+        started = time.perf_counter()
+        with self._lock:
+            data = self._data
+            size = data.size
+            codes = {dimension: data.codes[dimension][:size] for dimension in TEXT_DIMENSIONS}
+            days = data.days[:size]
+            hours = data.hours[:size]
+            mask = data.alive[:size].copy()
+            dictionaries = {dimension: list(data.dictionaries[dimension].values) for dimension in TEXT_DIMENSIONS}
+            wanted_codes = {
+                dimension: [
+                    code for code in (data.dictionaries[dimension].lookup(value) for value in values)
+                    if code is not None
+                ]
+                for dimension, values in (filters or {}).items()
+            }
+
+        # 1. Filtros vectorizados
+        if date_from:
+            mask &= days >= _day_number(date_from)
+        if date_to:
+            mask &= days <= _day_number(date_to)
+        for dimension, allowed in wanted_codes.items():
+            # Tabla booleana por código: más rápida que isin para pocos valores
+            allowed_table = np.zeros(len(dictionaries[dimension]), dtype=bool)
+            allowed_table[allowed] = True
+            mask &= allowed_table[codes[dimension]]
+
+        selected = np.flatnonzero(mask)
+        selected_hours = hours[selected].astype(np.float64)
+        selected_days = days[selected].astype("datetime64[D]")
+        columns: List[np.ndarray] = []
+        for dimension in dimensions:
+            if dimension in TEXT_DIMENSIONS:
+                columns.append(codes[dimension][selected].astype(np.int64))
+            elif dimension == "year":
+                columns.append(selected_days.astype("datetime64[Y]").astype(np.int64))
+            elif dimension == "month":
+                columns.append(selected_days.astype("datetime64[M]").astype(np.int64))
+            else:
+                columns.append(selected_days.astype(np.int64))
+
+        # 2. Clave de grupo en base mixta, luego unique + bincount
+        if not len(selected_hours):
+            self.last_query_ms = (time.perf_counter() - started) * 1000
+            return []
+        bases: List[Tuple[int, int]] = []
+        key_space = 1
+        for column in columns:
+            offset = int(column.min())
+            radix = int(column.max()) - offset + 1
+            bases.append((offset, radix))
+            key_space *= radix  # entero de Python: no desborda
+
+        decoded: List[np.ndarray] = []
+        if not columns or key_space < _MAX_KEY_SPACE:
+            key = np.zeros(len(selected_hours), dtype=np.int64)
+            for column, (offset, radix) in zip(columns, bases):
+                key = key * radix + (column - offset)
+            groups, inverse = np.unique(key, return_inverse=True)
+            group_count = len(groups)
+
+            # 3. Decodificar cada grupo
+            remainder = groups.copy()
+            for offset, radix in reversed(bases):
+                decoded.append(remainder % radix + offset)
+                remainder //= radix
+            decoded.reverse()
+        else:
+            # Demasiadas dimensiones para una clave int64 (se mezclarían grupos): unique por filas
+            group_rows, inverse = np.unique(np.stack(columns, axis=1), axis=0, return_inverse=True)
+            decoded = [group_rows[:, position] for position in range(len(columns))]
+            group_count = len(group_rows)
+        inverse = inverse.reshape(-1)
+        totals = np.bincount(inverse, weights=selected_hours, minlength=group_count)
+        counts = np.bincount(inverse, minlength=group_count)
+
+        # Cada dimensión se decodifica de forma vectorizada; luego se arman las filas
+        labels: List[list] = []
+        for dimension, values in zip(dimensions, decoded):
+            if dimension in TEXT_DIMENSIONS:
+                labels.append(np.asarray(dictionaries[dimension], dtype=object)[values].tolist())
+            elif dimension == "year":
+                labels.append((values + 1970).tolist())
+            elif dimension == "month":
+                labels.append(np.datetime_as_string(values.astype("datetime64[M]")).tolist())
+            else:
+                labels.append(np.datetime_as_string(values.astype("datetime64[D]")).tolist())
+        names = list(dimensions) + ["hours", "entries"]
+        result = [
+            dict(zip(names, values))
+            for values in zip(*labels, np.round(totals, 2).tolist(), counts.tolist())
+        ]
+        self.last_query_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Columnar hours store load failed: {e}")
+            if self._stop.wait(self.reload_seconds if self.loaded else 60):
+                return
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="columnar-hours-loader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": COLUMNAR_ANALYTICS_ENABLED,
+            "loaded": self.loaded,
+            "rows": len(self._data.positions),
+            "capacity": len(self._data.days),
+            "memory_bytes": self._data.nbytes(),
+            "dictionary_sizes": {dimension: len(d.values) for dimension, d in self._data.dictionaries.items()},
+            "loads": self.loads,
+            "appends": self.appends,
+            "compactions": self.compactions,
+            "last_load_ms": round(self.last_load_ms, 3),
+            "last_load_at": self.last_load_wall,
+            "last_query_ms": round(self.last_query_ms, 3),
+            "last_error": self.last_error,
+        }
+
+columnar_hours = ColumnarHoursStore()
+metrics.register("columnar_hours", columnar_hours.stats)
@@ -0,0 +1,258 @@
+"""
+Totales diarios por (empleado, fecha) para el tope de horas por día.
+
+Cada semana ISO de un empleado se carga de IB_Reported_Hours la primera vez
+que se toca (una consulta para los 7 días) y desde ahí se mantiene con cada
+alta, cambio y baja, así que validar el tope no agrega consultas al insert.
+Las horas que se están escribiendo quedan reservadas hasta que la escritura
+termina, para que dos peticiones simultáneas del mismo día no pasen el tope
+entre las dos (dentro de este proceso; otros workers se ven al recargar).
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date as date_type, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from ..repository import db
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DAILY_HOURS_CAP = float(os.getenv("DAILY_HOURS_CAP", "24"))
+OVERTIME_WARNING_HOURS = float(os.getenv("OVERTIME_WARNING_HOURS", "9"))
+# Otros workers también escriben: pasado este tiempo la semana se vuelve a cargar
+DAILY_TOTALS_TTL_SECONDS = float(os.getenv("DAILY_TOTALS_TTL_SECONDS", "300"))
+DAILY_TOTALS_MAX_WEEKS = int(os.getenv("DAILY_TOTALS_MAX_WEEKS", "20000"))
+
+DayKey = Tuple[int, str]
+WeekKey = Tuple[int, int, int]
+
+class DailyCapExceededError(ValueError):
+    """Raised when a write would take an employee's day over DAILY_HOURS_CAP."""
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _row_key(row: dict) -> Optional[DayKey]:
+    try:
+        return int(row.get("employee_id")), str(row.get("date"))[:10]
+    except (TypeError, ValueError):
+        return None
+
+def _week_of(day: str) -> Tuple[WeekKey, date_type, date_type]:
+    parsed = date_type.fromisoformat(day)
+    iso_year, iso_week, iso_weekday = parsed.isocalendar()
+    start = parsed - timedelta(days=iso_weekday - 1)
+    return (iso_year, iso_week), start, start + timedelta(days=6)
+
+class DailyTotals:
+    """
+    Running totals per (employee_id, date), loaded one ISO week at a time.
+
+    Each day keeps the hours of every entry by id, so an update or delete can
+    subtract exactly what that entry contributed. Writes in flight hold a
+    reservation on their day, counted like a stored entry until released.
+    """
+
+    def __init__(self, cap: float = DAILY_HOURS_CAP, overtime: float = OVERTIME_WARNING_HOURS):
+        self.cap = cap
+        self.overtime = overtime
+        self._lock = threading.Lock()
+        # (employee_id, iso_year, iso_week) -> momento de carga; orden LRU
+        self._weeks: "OrderedDict[WeekKey, float]" = OrderedDict()
+        # (employee_id, date) -> {hour_id: hours}
+        self._days: Dict[DayKey, Dict[str, float]] = {}
+        self._index: Dict[str, DayKey] = {}
+        # (employee_id, date) -> {reserva: horas} de escrituras en curso
+        self._pending: Dict[DayKey, Dict[int, float]] = {}
+        self._reservations: Dict[int, DayKey] = {}
+        self._tokens = itertools.count(1)
+        self.seeds = 0
+        self.hits = 0
+        self.rejections = 0
+        self.overtime_warnings = 0
+
+    def _drop_week(self, week_key: WeekKey, start: date_type) -> None:
+        employee_id = week_key[0]
+        for offset in range(7):
+            day_key = (employee_id, (start + timedelta(days=offset)).isoformat())
+            for hour_id in self._days.pop(day_key, {}):
+                self._index.pop(hour_id, None)
+
+    def _load_week(self, employee_id: int, day: str) -> None:
+        (iso_year, iso_week), start, end = _week_of(day)
+        week_key = (employee_id, iso_year, iso_week)
+        with self._lock:
+            loaded_at = self._weeks.get(week_key)
+            if loaded_at is not None and time.monotonic() - loaded_at <= DAILY_TOTALS_TTL_SECONDS:
+                self._weeks.move_to_end(week_key)
+                self.hits += 1
+                return
+
+        response = (
+            db
+            .table("IB_Reported_Hours")
+            .select("id, employee_id, date, hours")
+            .eq("employee_id", str(employee_id))
+            .gte("date", start.isoformat())
+            .lte("date", end.isoformat())
+            .execute()
+        )
+        self.seed_week(employee_id, day, response.data or [])
+
+    def seed_week(self, employee_id: int, day: str, rows: list) -> None:
+        """
+        Replace the cached ISO week containing `day` with the given stored rows.
+
+        Lets callers that already read a week (e.g. the weekly upsert) prime the
+        cache without another query.
+        """
+        (iso_year, iso_week), start, _ = _week_of(day)
+        week_key = (employee_id, iso_year, iso_week)
+        with self._lock:
+            self._drop_week(week_key, start)
+            for offset in range(7):
+                self._days[(employee_id, (start + timedelta(days=offset)).isoformat())] = {}
+            for row in rows:
+                key = _row_key(row)
+                if key is None or key not in self._days:
+                    continue
+                self._days[key][str(row["id"])] = _to_float(row.get("hours"))
+                self._index[str(row["id"])] = key
+            self._weeks[week_key] = time.monotonic()
+            self._weeks.move_to_end(week_key)
+            self.seeds += 1
+
+            while len(self._weeks) > DAILY_TOTALS_MAX_WEEKS:
+                (old_employee, old_year, old_week), _ = self._weeks.popitem(last=False)
+                self._drop_week(
+                    (old_employee, old_year, old_week), date_type.fromisocalendar(old_year, old_week, 1)
+                )
+
+    def total(self, employee_id: int, day: str, exclude_id: Optional[str] = None) -> float:
+        """Hours already logged by the employee that day, optionally ignoring one entry."""
+        self._load_week(employee_id, day)
+        with self._lock:
+            entries = self._days.get((employee_id, day), {})
+            return sum(hours for hour_id, hours in entries.items() if hour_id != exclude_id)
+
+    def lookup(self, hour_id: str) -> Optional[Tuple[DayKey, float]]:
+        """(employee_id, date) and hours of a cached entry, if known."""
+        with self._lock:
+            key = self._index.get(str(hour_id))
+            if key is None:
+                return None
+            return key, self._days[key][str(hour_id)]
+
+    def reserve(
+        self, employee_id: int, day: str, hours: float, exclude_id: Optional[str] = None, replace: bool = False
+    ) -> int:
+        """
+        Enforce the daily cap for a new or changed entry and hold its hours.
+
+        The check and the hold happen under one lock, so concurrent writes to
+        the same day see each other. Release the reservation once the write
+        has been recorded with `apply`, or once it failed.
+
+        Args:
+            employee_id: Employee logging the hours
+            day: Date in YYYY-MM-DD format
+            hours: Hours of the entry being written
+            exclude_id: Entry being replaced, whose current hours don't count
+            replace: The hours replace every stored entry of the day (weekly upsert)
+
+        Returns:
+            Reservation token for `release`
+
+        Raises:
+            DailyCapExceededError: If the total would go over the daily cap
+        """
+        self._load_week(employee_id, day)
+        key = (employee_id, day)
+        with self._lock:
+            stored = 0.0 if replace else sum(
+                entry_hours for hour_id, entry_hours in self._days.get(key, {}).items() if hour_id != exclude_id
+            )
+            self.enforce(employee_id, day, stored + sum(self._pending.get(key, {}).values()) + hours)
+            token = next(self._tokens)
+            self._pending.setdefault(key, {})[token] = hours
+            self._reservations[token] = key
+            return token
+
+    def release(self, token: int) -> None:
+        """Drop a reservation made by `reserve`; unknown tokens are ignored."""
+        with self._lock:
+            key = self._reservations.pop(token, None)
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.pop(token, None)
+                if not pending:
+                    del self._pending[key]
+
+    @contextmanager
+    def reserved(
+        self, employee_id: int, day: str, hours: float, exclude_id: Optional[str] = None
+    ) -> Iterator[int]:
+        """`reserve` for the duration of a block; record the write with `apply` inside it."""
+        token = self.reserve(employee_id, day, hours, exclude_id)
+        try:
+            yield token
+        finally:
+            self.release(token)
+
+    def enforce(self, employee_id: int, day: str, resulting: float) -> float:
+        """Reject a day total over the cap and log one over the overtime threshold."""
+        if resulting > self.cap:
+            self.rejections += 1
+            raise DailyCapExceededError(
+                f"El total del día {day} para el empleado {employee_id} sería {resulting:g} horas; "
+                f"el máximo es {self.cap:g}"
+            )
+        if resulting > self.overtime:
+            self.overtime_warnings += 1
+            logger.warning(f"Horas extra: empleado {employee_id} suma {resulting:g} horas el {day}")
+        return resulting
+
+    def apply(self, old_row: Optional[dict] = None, new_row: Optional[dict] = None) -> None:
+        """
+        Apply a write to the cached totals: remove `old_row`, add `new_row`.
+
+        Days that are not cached are left alone; they will be read fresh.
+        """
+        with self._lock:
+            if old_row is not None:
+                hour_id = str(old_row.get("id"))
+                key = self._index.pop(hour_id, None) or _row_key(old_row)
+                if key in self._days:
+                    self._days[key].pop(hour_id, None)
+            if new_row is not None:
+                key = _row_key(new_row)
+                if key in self._days:
+                    hour_id = str(new_row.get("id"))
+                    self._days[key][hour_id] = _to_float(new_row.get("hours"))
+                    self._index[hour_id] = key
+
+    def stats(self) -> dict:
+        return {
+            "cap_hours": self.cap,
+            "overtime_warning_hours": self.overtime,
+            "weeks_cached": len(self._weeks),
+            "days_cached": len(self._days),
+            "entries_cached": len(self._index),
+            "reservations": len(self._reservations),
+            "seeds": self.seeds,
+            "hits": self.hits,
+            "rejections": self.rejections,
+            "overtime_warnings": self.overtime_warnings,
+        }
+
+daily_totals = DailyTotals()
+metrics.register("daily_totals", daily_totals.stats)
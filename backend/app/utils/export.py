@@ -0,0 +1,62 @@
+"""
+Serialización por partes (CSV / NDJSON) para las exportaciones de horas.
+
+Las filas llegan de un generador paginado y salen en bloques de unos KB, así
+que la memoria no depende del tamaño del rango exportado.
+"""
+import csv
+import io
+import json
+from typing import Iterable, Iterator
+
+EXPORT_COLUMNS = (
+    "id",
+    "date",
+    "employee_id",
+    "employee_name",
+    "employee_short_name",
+    "project_code",
+    "project_name",
+    "phase",
+    "discipline",
+    "activity",
+    "hours",
+    "note",
+)
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+# Tamaño aproximado de cada bloque enviado al cliente
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def csv_chunks(rows: Iterable[dict]) -> Iterator[bytes]:
+    """Encode rows as CSV with a header line, in chunks of about EXPORT_CHUNK_BYTES."""
+    buffer = io.StringIO()
+    # utf-8-sig para que Excel reconozca las tildes al abrir el archivo
+    buffer.write("\ufeff")
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore", lineterminator="\r\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def ndjson_chunks(rows: Iterable[dict]) -> Iterator[bytes]:
+    """Encode rows as one JSON object per line, in chunks of about EXPORT_CHUNK_BYTES."""
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps({column: row.get(column) for column in EXPORT_COLUMNS}, ensure_ascii=False, default=str) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
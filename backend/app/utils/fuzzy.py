@@ -0,0 +1,82 @@
+"""
+Índice de trigramas en memoria para sugerir nombres parecidos.
+
+Misma idea que pg_trgm: cada palabra se rellena con dos espacios al inicio y
+uno al final, y la similitud es |comunes| / |unión| de los trigramas.
+"""
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """
+    Split a text into its set of trigrams.
+
+    Args:
+        text: Text to split, expected to be already normalized
+
+    Returns:
+        Set of trigrams (empty for blank text)
+    """
+    grams = set()
+    for word in text.casefold().split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return frozenset(grams)
+
+class TrigramIndex:
+    """
+    Immutable inverted index from trigram to entries.
+
+    Scoring only visits entries that share at least one trigram with the
+    query, so lookups stay proportional to the overlap, not the index size.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]]):
+        self._payloads: List[Any] = []
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for text, payload in entries:
+            grams = trigrams(text)
+            if not grams:
+                continue
+            position = len(self._payloads)
+            self._payloads.append(payload)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(position)
+        self._postings = dict(self._postings)
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.1) -> List[Tuple[float, Any]]:
+        """
+        Rank entries by trigram similarity to the query.
+
+        Args:
+            query: Text to look for
+            k: Maximum number of results
+            min_score: Minimum similarity (0..1) to keep a result
+
+        Returns:
+            List of (score, payload), best first
+        """
+        query_grams = trigrams(query)
+        if not query_grams or not self._payloads:
+            return []
+
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for position in self._postings.get(gram, ()):
+                shared[position] += 1
+
+        query_size = len(query_grams)
+        scored = []
+        for position, common in shared.items():
+            score = common / (query_size + self._sizes[position] - common)
+            if score >= min_score:
+                scored.append((score, position))
+        # Orden estable: a igual puntaje gana la entrada que apareció primero
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(round(score, 4), self._payloads[position]) for score, position in scored[:k]]
@@ -0,0 +1,130 @@
+import hashlib
+import os
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+REFERENCE_MAX_AGE_SECONDS = int(os.getenv("REFERENCE_MAX_AGE_SECONDS", "60"))
+REFERENCE_STALE_WHILE_REVALIDATE_SECONDS = int(os.getenv("REFERENCE_STALE_WHILE_REVALIDATE_SECONDS", "600"))
+
+# Directivas para datos de referencia: el navegador y nginx pueden servir la copia
+# un minuto sin preguntar y luego seguir sirviéndola mientras revalidan
+REFERENCE_CACHE_CONTROL = (
+    f"public, max-age={REFERENCE_MAX_AGE_SECONDS}, "
+    f"stale-while-revalidate={REFERENCE_STALE_WHILE_REVALIDATE_SECONDS}"
+)
+# Datos de personas (lista de empleados): solo el navegador guarda la copia y
+# la revalida con el ETag en cada uso; los proxies y CDN no la almacenan
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(body: bytes) -> str:
+    """
+    Build a strong ETag from a response body.
+
+    Args:
+        body: Serialized response body
+
+    Returns:
+        Quoted ETag value
+    """
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+
+    Uses the weak comparison RFC 9110 mandates for If-None-Match, so a
+    W/-prefixed validator sent back by a proxy still matches.
+
+    Args:
+        if_none_match: Raw header value, may list several ETags or be '*'
+        etag: Current ETag of the resource
+
+    Returns:
+        True if the client copy is still current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
+
+def scoped_etag(version: str, scope: str) -> str:
+    """
+    Derive the ETag of one view (e.g. one URL) of a versioned table.
+
+    Args:
+        version: Table version
+        scope: Anything that identifies the view, usually the request path
+
+    Returns:
+        Quoted ETag value
+    """
+    return make_etag(f"{version}:{scope}".encode("utf-8"))
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[str] = None) -> bool:
+    """
+    Evaluate the conditional headers of a GET request.
+
+    If-None-Match takes precedence; If-Modified-Since is only looked at when
+    the client sent no ETag, as RFC 9110 requires.
+
+    Returns:
+        True if a 304 can be sent
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def cache_headers(etag: str, cache_control: str, last_modified: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+def not_modified(etag: str, cache_control: str, last_modified: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, cache_control, last_modified))
+
+def conditional_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[str] = None,
+) -> Response:
+    """
+    Return 304 if the client copy is still current, else the JSON body.
+
+    Args:
+        request: Incoming request, read for the conditional headers
+        body: Pre-serialized JSON body
+        etag: ETag of the body
+        cache_control: Cache-Control directives to send
+        last_modified: Optional HTTP date of the last change
+
+    Returns:
+        A 304 or 200 response carrying the validators
+    """
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, cache_control, last_modified)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=cache_headers(etag, cache_control, last_modified),
+    )
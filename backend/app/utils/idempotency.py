@@ -0,0 +1,249 @@
+"""
+Almacén de claves de idempotencia (cabecera Idempotency-Key).
+
+Guarda la respuesta de la primera ejecución de una petición de escritura para
+devolverla tal cual cuando el cliente reintenta con la misma clave.
+
+Mientras la primera petición está en curso la clave se reserva solo por
+IDEMPOTENCY_LEASE_SECONDS: si el worker muere a mitad de camino, un
+reintento posterior puede tomarla. El TTL completo empieza al guardar la
+respuesta.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_DB_PATH = os.getenv(
+    "IDEMPOTENCY_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "idempotency.sqlite3"),
+)
+MAX_KEY_LENGTH = 255
+
+# Estados que devuelve begin()
+NEW = "new"
+REPLAY = "replay"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+def request_fingerprint(payload: str) -> str:
+    """Hash of the request body, to reject a key reused for a different request."""
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryIdempotencyStore:
+    """
+    Per-process store: an LRU bounded to `max_keys`, with TTL eviction.
+
+    Records are (expires_at, fingerprint, status_code, body); status_code is
+    None while the first request is still running, and expires_at is then
+    the end of its lease.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        max_keys: int = IDEMPOTENCY_MAX_KEYS,
+        lease_seconds: float = IDEMPOTENCY_LEASE_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, Tuple[float, str, Optional[int], Optional[str]]]" = OrderedDict()
+        self.replays = 0
+        self.evictions = 0
+        self.takeovers = 0
+
+    def _evict(self, now: float) -> None:
+        # Las claves más viejas están al principio
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record[0] > now and len(self._records) <= self.max_keys:
+                break
+            del self._records[key]
+            self.evictions += 1
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[Tuple[int, str]]]:
+        """
+        Claim a key for a new request or return the stored response.
+
+        Returns:
+            (state, (status_code, body)); the response is only set for REPLAY
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            record = self._records.get(key)
+            if record is not None and record[0] <= now:
+                # Reserva vencida de una petición que no terminó (p. ej. worker caído)
+                del self._records[key]
+                self.takeovers += 1
+                record = None
+            if record is None:
+                self._records[key] = (now + self.lease_seconds, fingerprint, None, None)
+                self._evict(now)
+                return NEW, None
+            if record[1] != fingerprint:
+                return MISMATCH, None
+            if record[2] is None:
+                return IN_PROGRESS, None
+            self._records.move_to_end(key)
+            self.replays += 1
+            return REPLAY, (record[2], record[3])
+
+    def complete(self, key: str, status_code: int, body: str) -> None:
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                self._records[key] = (time.time() + self.ttl_seconds, record[1], status_code, body)
+                self._records.move_to_end(key)
+
+    def release(self, key: str) -> None:
+        """Forget a claimed key whose request failed, so a retry can run again."""
+        with self._lock:
+            self._records.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "keys": len(self._records),
+            "max_keys": self.max_keys,
+            "ttl_seconds": self.ttl_seconds,
+            "lease_seconds": self.lease_seconds,
+            "replays": self.replays,
+            "evictions": self.evictions,
+            "takeovers": self.takeovers,
+        }
+
+class SqliteIdempotencyStore:
+    """
+    Store shared by every worker on the host through a local SQLite file.
+
+    The primary key on `key` makes the claim atomic across processes. An
+    unfinished claim expires after its lease like any other record, so the
+    eviction in begin() lets the next claim take it over.
+    """
+
+    def __init__(
+        self,
+        path: str = IDEMPOTENCY_DB_PATH,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        max_keys: int = IDEMPOTENCY_MAX_KEYS,
+        lease_seconds: float = IDEMPOTENCY_LEASE_SECONDS,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.lease_seconds = lease_seconds
+        self.replays = 0
+        connection = self._connect()
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency ("
+                " key TEXT PRIMARY KEY,"
+                " fingerprint TEXT NOT NULL,"
+                " status_code INTEGER,"
+                " body TEXT,"
+                " expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency (expires_at)")
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        connection.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+        connection.execute(
+            "DELETE FROM idempotency WHERE key IN ("
+            " SELECT key FROM idempotency ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        )
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[Tuple[int, str]]]:
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            self._evict(connection, now)
+            record = connection.execute(
+                "SELECT fingerprint, status_code, body FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+            if record is None:
+                connection.execute(
+                    "INSERT INTO idempotency (key, fingerprint, status_code, body, expires_at) VALUES (?, ?, NULL, NULL, ?)",
+                    (key, fingerprint, now + self.lease_seconds),
+                )
+                connection.execute("COMMIT")
+                return NEW, None
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+        if record[0] != fingerprint:
+            return MISMATCH, None
+        if record[1] is None:
+            return IN_PROGRESS, None
+        self.replays += 1
+        return REPLAY, (record[1], record[2])
+
+    def complete(self, key: str, status_code: int, body: str) -> None:
+        connection = self._connect()
+        try:
+            connection.execute(
+                "UPDATE idempotency SET status_code = ?, body = ?, expires_at = ? WHERE key = ?",
+                (status_code, body, time.time() + self.ttl_seconds, key),
+            )
+        finally:
+            connection.close()
+
+    def release(self, key: str) -> None:
+        connection = self._connect()
+        try:
+            connection.execute("DELETE FROM idempotency WHERE key = ?", (key,))
+        finally:
+            connection.close()
+
+    def stats(self) -> dict:
+        connection = self._connect()
+        try:
+            keys = connection.execute("SELECT COUNT(*) FROM idempotency").fetchone()[0]
+        finally:
+            connection.close()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "keys": keys,
+            "max_keys": self.max_keys,
+            "ttl_seconds": self.ttl_seconds,
+            "lease_seconds": self.lease_seconds,
+            "replays": self.replays,
+        }
+
+def _create_store():
+    if IDEMPOTENCY_BACKEND == "sqlite":
+        return SqliteIdempotencyStore()
+    if IDEMPOTENCY_BACKEND != "memory":
+        logger.warning(f"Unknown IDEMPOTENCY_BACKEND '{IDEMPOTENCY_BACKEND}', using memory")
+    return MemoryIdempotencyStore()
+
+idempotency_store = _create_store()
+metrics.register("idempotency", idempotency_store.stats)
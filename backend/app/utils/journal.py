@@ -0,0 +1,278 @@
+"""
+Diario local (write-behind) para los registros de horas.
+
+Con HOURS_WRITE_BEHIND activo, POST /hours/ valida el registro, lo agrega a
+un archivo con fsync y responde de inmediato; un hilo en segundo plano lo
+vacía hacia IB_Reported_Hours por lotes. El avance se guarda en un archivo de
+control aparte, así que tras una caída se reanuda desde el último lote
+confirmado. Los inserts son upserts por id, de modo que repetir un lote no
+duplica filas.
+
+Si el servidor rechaza un lote con un error permanente (restricción, 4xx,
+valor inválido), las filas se reenvían de una en una y las rechazadas se
+mueven a un archivo de descartes (HOURS_JOURNAL_DEAD_LETTER_PATH) con el
+error, para que una fila mala no detenga todas las siguientes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from ..repository import db
+from . import metrics
+from .resilience import is_transient
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HOURS_WRITE_BEHIND = os.getenv("HOURS_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+HOURS_JOURNAL_PATH = os.getenv("HOURS_JOURNAL_PATH", os.path.join(_BACKEND_DIR, "hours_journal.ndjson"))
+HOURS_JOURNAL_BATCH_SIZE = int(os.getenv("HOURS_JOURNAL_BATCH_SIZE", "100"))
+HOURS_JOURNAL_MAX_PENDING = int(os.getenv("HOURS_JOURNAL_MAX_PENDING", "5000"))
+HOURS_JOURNAL_FLUSH_SECONDS = float(os.getenv("HOURS_JOURNAL_FLUSH_SECONDS", "1"))
+HOURS_JOURNAL_DEAD_LETTER_PATH = os.getenv("HOURS_JOURNAL_DEAD_LETTER_PATH", f"{HOURS_JOURNAL_PATH}.dead")
+HOURS_JOURNAL_MAX_BACKOFF_SECONDS = 60.0
+
+class JournalFullError(Exception):
+    """Raised when too many entries are waiting to reach Supabase."""
+
+class HoursJournal:
+    """
+    Append-only NDJSON journal plus a checkpoint file with the flushed offset.
+
+    A single flusher drains entries strictly in journal order, which keeps the
+    order of each employee's entries.
+    """
+
+    def __init__(
+        self,
+        path: str = HOURS_JOURNAL_PATH,
+        batch_size: int = HOURS_JOURNAL_BATCH_SIZE,
+        max_pending: int = HOURS_JOURNAL_MAX_PENDING,
+        flush_interval: float = HOURS_JOURNAL_FLUSH_SECONDS,
+        dead_letter_path: Optional[str] = None,
+    ):
+        self.path = path
+        self.checkpoint_path = f"{path}.offset"
+        self.dead_letter_path = dead_letter_path or (
+            HOURS_JOURNAL_DEAD_LETTER_PATH if path == HOURS_JOURNAL_PATH else f"{path}.dead"
+        )
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._offset = 0
+        self.pending = 0
+        self.appended = 0
+        self.flushed = 0
+        self.recovered = 0
+        self.rejected = 0
+        self.dead_lettered = 0
+        self._dead_letter_listeners: List[Callable[[dict], None]] = []
+        self.last_flush_wall: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _write_checkpoint(self, offset: int) -> None:
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def recover(self) -> None:
+        """Load the checkpoint and count the entries left unflushed by a previous run."""
+        with self._lock:
+            try:
+                with open(self.checkpoint_path) as f:
+                    self._offset = int(f.read().strip() or 0)
+            except FileNotFoundError:
+                self._offset = 0
+
+            if not os.path.exists(self.path):
+                self.pending = 0
+                return
+
+            with open(self.path, "rb+") as f:
+                f.seek(self._offset)
+                pending = 0
+                position = self._offset
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    pending += 1
+                    position += len(line)
+                # Una línea sin salto final es una escritura interrumpida: se descarta
+                f.truncate(position)
+            self.pending = pending
+            self.recovered = pending
+            if pending:
+                logger.warning(f"Hours journal recovered {pending} unflushed entries")
+
+    def append(self, row: dict) -> None:
+        """
+        Durably queue a row for insertion.
+
+        Raises:
+            JournalFullError: If the backlog already holds max_pending entries
+        """
+        line = (json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise JournalFullError("Hay demasiados registros pendientes de enviar a la base de datos")
+            with open(self.path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending += 1
+            self.appended += 1
+        self._wake.set()
+
+    def _read_batch(self) -> Tuple[List[dict], int]:
+        rows: List[dict] = []
+        if not os.path.exists(self.path):
+            return rows, self._offset
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            position = self._offset
+            while len(rows) < self.batch_size:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                position += len(line)
+                rows.append(json.loads(line))
+        return rows, position
+
+    def _compact(self) -> None:
+        # Todo lo escrito ya está en Supabase: vaciar el archivo
+        with self._lock:
+            if os.path.exists(self.path) and self._offset > 0 and os.path.getsize(self.path) == self._offset:
+                with open(self.path, "rb+") as f:
+                    f.truncate(0)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._offset = 0
+                self._write_checkpoint(0)
+
+    def flush_once(self) -> int:
+        """
+        Send the next batch to IB_Reported_Hours.
+
+        Returns:
+            Number of entries flushed
+        """
+        rows, end_offset = self._read_batch()
+        if not rows:
+            self._compact()
+            return 0
+
+        try:
+            db.table("IB_Reported_Hours").upsert(rows, on_conflict="id").execute()
+        except Exception as e:
+            if is_transient(e):
+                raise
+            # El lote tiene al menos una fila que el servidor no acepta: separarla
+            logger.warning(f"Hours journal batch rejected ({e}); sending {len(rows)} entries one by one")
+            self._flush_one_by_one(rows)
+
+        with self._lock:
+            self._offset = end_offset
+            self._write_checkpoint(end_offset)
+            self.pending = max(0, self.pending - len(rows))
+            self.flushed += len(rows)
+        self.last_flush_wall = time.time()
+        self.last_error = None
+        return len(rows)
+
+    def _flush_one_by_one(self, rows: List[dict]) -> None:
+        for row in rows:
+            try:
+                db.table("IB_Reported_Hours").upsert(row, on_conflict="id").execute()
+            except Exception as e:
+                if is_transient(e):
+                    # El lote se reintenta completo; los upserts ya hechos no duplican filas
+                    raise
+                self._dead_letter(row, e)
+
+    def _dead_letter(self, row: dict, error: Exception) -> None:
+        entry = {"row": row, "error": f"{type(error).__name__}: {error}", "failed_at": time.time()}
+        line = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.dead_letter_path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.dead_lettered += 1
+        logger.error(f"Hours journal entry {row.get('id')} rejected permanently, moved to {self.dead_letter_path}: {error}")
+        for listener in self._dead_letter_listeners:
+            try:
+                listener(row)
+            except Exception as listener_error:
+                logger.error(f"Hours journal dead-letter listener failed: {listener_error}", exc_info=True)
+
+    def add_dead_letter_listener(self, listener: Callable[[dict], None]) -> None:
+        """Call `listener(row)` for every entry moved to the dead-letter file."""
+        self._dead_letter_listeners.append(listener)
+
+    def _loop(self) -> None:
+        backoff = self.flush_interval
+        while not self._stop.is_set():
+            try:
+                flushed = self.flush_once()
+                backoff = self.flush_interval
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Hours journal flush failed, retrying in {backoff:.0f}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, HOURS_JOURNAL_MAX_BACKOFF_SECONDS)
+                continue
+            if flushed < self.batch_size:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self.recover()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="hours-journal-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        # Último intento de vaciar lo pendiente antes de salir
+        try:
+            while self.flush_once():
+                pass
+        except Exception as e:
+            logger.warning(f"Hours journal left {self.pending} entries pending at shutdown: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": HOURS_WRITE_BEHIND,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "path": self.path,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "appended": self.appended,
+            "flushed": self.flushed,
+            "recovered": self.recovered,
+            "rejected": self.rejected,
+            "dead_lettered": self.dead_lettered,
+            "dead_letter_path": self.dead_letter_path,
+            "last_flush_at": self.last_flush_wall,
+            "last_error": self.last_error,
+        }
+
+hours_journal = HoursJournal()
+metrics.register("hours_journal", hours_journal.stats)
@@ -0,0 +1,35 @@
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Registro de proveedores de métricas: nombre -> función sin argumentos que devuelve un dict
+_providers: Dict[str, Callable[[], dict]] = {}
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    """
+    Register a metrics provider under a section name.
+
+    Args:
+        name: Section name shown in the /metrics payload
+        provider: Callable returning a JSON-serializable dict
+    """
+    _providers[name] = provider
+
+def collect() -> dict:
+    """
+    Collect the current value of every registered provider.
+
+    A failing provider is reported inline instead of breaking the whole payload.
+
+    Returns:
+        Dict mapping section name to its metrics
+    """
+    snapshot = {}
+    for name, provider in list(_providers.items()):
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            logger.error(f"Error collecting metrics for {name}: {e}", exc_info=True)
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -0,0 +1,122 @@
+"""
+Caché permanente de las horas agrupadas de meses cerrados.
+
+Un mes se considera cerrado cuando termina antes de HOURS_CLOSE_DATE o, si no
+se configura, cuando pasaron HOURS_CLOSE_AFTER_DAYS días desde su último día.
+El resultado de un mes cerrado se guarda sin vencimiento y solo se descarta
+cuando una escritura de este proceso toca una fecha de ese mes.
+"""
+import calendar
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+HOURS_CLOSE_DATE = os.getenv("HOURS_CLOSE_DATE", "")
+HOURS_CLOSE_AFTER_DAYS = int(os.getenv("HOURS_CLOSE_AFTER_DAYS", "5"))
+
+def month_key(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+def month_end(month: str) -> date:
+    year, number = int(month[:4]), int(month[5:7])
+    return date(year, number, calendar.monthrange(year, number)[1])
+
+def is_closed(month: str, today: Optional[date] = None) -> bool:
+    """True if no more hours are expected for `month` (YYYY-MM)."""
+    last_day = month_end(month)
+    if HOURS_CLOSE_DATE:
+        return last_day < date.fromisoformat(HOURS_CLOSE_DATE)
+    return (today or date.today()) > last_day + timedelta(days=HOURS_CLOSE_AFTER_DAYS)
+
+class ClosedMonthCache:
+    """Grouped results of closed months, kept until a write touches the month."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._months: Dict[str, List[dict]] = {}
+        # Se incrementa con cada invalidación: un cálculo que empezó antes no se guarda
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, month: str) -> Optional[List[dict]]:
+        with self._lock:
+            rows = self._months.get(month)
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return rows
+
+    def generation(self, month: str) -> int:
+        with self._lock:
+            return self._generations.get(month, 0)
+
+    def put(self, month: str, rows: List[dict], generation: int) -> None:
+        """Store a closed month computed while the month was at `generation`."""
+        if not is_closed(month):
+            return
+        with self._lock:
+            if self._generations.get(month, 0) == generation:
+                self._months[month] = rows
+
+    def get_or_compute(
+        self, months: List[str], compute: Callable[[List[str]], Dict[str, List[dict]]]
+    ) -> Tuple[Dict[str, List[dict]], int]:
+        """
+        Rows of every month, computing the ones not cached in a single call.
+
+        Args:
+            months: Months (YYYY-MM) wanted
+            compute: Receives the months to compute and returns month -> rows
+
+        Returns:
+            (month -> rows, number of months served from the cache)
+        """
+        by_month: Dict[str, List[dict]] = {}
+        generations: Dict[str, int] = {}
+        missing: List[str] = []
+        for month in months:
+            cached = self.get(month) if is_closed(month) else None
+            if cached is not None:
+                by_month[month] = cached
+            else:
+                generations[month] = self.generation(month)
+                missing.append(month)
+        if missing:
+            computed = compute(missing)
+            for month in missing:
+                by_month[month] = computed[month]
+                self.put(month, computed[month], generations[month])
+        return by_month, len(months) - len(missing)
+
+    def invalidate_row(self, row: Optional[dict]) -> None:
+        """Drop the cached month of a written row, if any."""
+        day = str((row or {}).get("date") or "")[:7]
+        if len(day) != 7:
+            return
+        with self._lock:
+            self._generations[day] = self._generations.get(day, 0) + 1
+            if self._months.pop(day, None) is not None:
+                self.invalidations += 1
+                logger.info(f"Closed month {day} invalidated by a write")
+
+    def stats(self) -> dict:
+        return {
+            "close_date": HOURS_CLOSE_DATE or None,
+            "close_after_days": HOURS_CLOSE_AFTER_DAYS,
+            "months": sorted(self._months),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+closed_months = ClosedMonthCache()
+metrics.register("closed_months", closed_months.stats)
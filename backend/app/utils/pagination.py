@@ -0,0 +1,134 @@
+"""
+Lectura paginada por clave (keyset) para consultas grandes a Supabase.
+
+PostgREST corta las respuestas en max-rows (1000 por defecto) sin avisar, así
+que una lectura sin paginar puede devolver datos incompletos. Aquí cada
+página pide las filas posteriores a la última clave vista, ordenadas por esa
+clave, hasta recibir una página incompleta. Opcionalmente la página siguiente
+se pide en segundo plano mientras se procesa la actual; esa petición corre con
+el contexto del llamador (deadline de la petición) y no se hace dentro de una
+transacción, cuya conexión no se puede usar desde dos hilos.
+"""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from ..repository import db
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# No debe superar el max-rows configurado en PostgREST
+FETCH_PAGE_SIZE = int(os.getenv("FETCH_PAGE_SIZE", "1000"))
+FETCH_PREFETCH = os.getenv("FETCH_PREFETCH", "1").lower() in ("1", "true", "yes")
+FETCH_PREFETCH_WORKERS = int(os.getenv("FETCH_PREFETCH_WORKERS", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_stats = {"scans": 0, "pages": 0, "rows": 0, "prefetched_pages": 0}
+_stats_lock = threading.Lock()
+
+def _count(**increments: int) -> None:
+    with _stats_lock:
+        for name, value in increments.items():
+            _stats[name] += value
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FETCH_PREFETCH_WORKERS, thread_name_prefix="fetch-prefetch")
+        return _executor
+
+def _filter_value(value: Any) -> str:
+    # Dentro de un filtro or=(...) las comas, puntos y paréntesis van entre comillas
+    text = str(value)
+    if any(char in text for char in ',.:()"\\ '):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return text
+
+def _after(query, key_columns: Tuple[str, ...], last_key: Tuple[Any, ...]):
+    """Restrict `query` to rows strictly after `last_key` in key order."""
+    if len(key_columns) == 1:
+        return query.gt(key_columns[0], last_key[0])
+    # (a, b) > (x, y)  <=>  a > x  or  (a = x and b > y), generalizado a n columnas
+    branches = []
+    for position, column in enumerate(key_columns):
+        equals = [f"{key_columns[i]}.eq.{_filter_value(last_key[i])}" for i in range(position)]
+        greater = f"{column}.gt.{_filter_value(last_key[position])}"
+        branches.append(f"and({','.join(equals + [greater])})" if equals else greater)
+    return query.or_(",".join(branches))
+
+def iter_rows(
+    query_factory: Callable[[], Any],
+    key: Union[str, Sequence[str]] = "id",
+    page_size: Optional[int] = None,
+    prefetch: Optional[bool] = None,
+) -> Iterator[dict]:
+    """
+    Yield every row of a query, one keyset page at a time.
+
+    Args:
+        query_factory: Returns a fresh select builder with its filters applied
+            (e.g. ``lambda: db.table("T").select("*").eq(...)``); it is
+            called once per page
+        key: Column, or columns, that uniquely order the rows; they must be
+            part of the selected columns
+        page_size: Rows per request (defaults to FETCH_PAGE_SIZE)
+        prefetch: Request the next page while the caller consumes the current
+            one (defaults to FETCH_PREFETCH)
+
+    Yields:
+        Rows in key order
+    """
+    key_columns = (key,) if isinstance(key, str) else tuple(key)
+    page_size = page_size or FETCH_PAGE_SIZE
+    prefetch = (FETCH_PREFETCH if prefetch is None else prefetch) and not db.in_transaction()
+
+    def fetch_page(last_key: Optional[Tuple[Any, ...]]) -> List[dict]:
+        query = query_factory()
+        if last_key is not None:
+            query = _after(query, key_columns, last_key)
+        for column in key_columns:
+            query = query.order(column)
+        rows = query.limit(page_size).execute().data or []
+        _count(pages=1, rows=len(rows))
+        return rows
+
+    _count(scans=1)
+    rows = fetch_page(None)
+    while rows:
+        pending = None
+        last_key = tuple(rows[-1].get(column) for column in key_columns)
+        if len(rows) >= page_size and prefetch:
+            # Con el contexto del llamador: deadline y presupuesto de reintentos de la petición
+            pending = _get_executor().submit(contextvars.copy_context().run, fetch_page, last_key)
+            _count(prefetched_pages=1)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        rows = pending.result() if pending is not None else fetch_page(last_key)
+
+def fetch_all(
+    query_factory: Callable[[], Any],
+    key: Union[str, Sequence[str]] = "id",
+    page_size: Optional[int] = None,
+    prefetch: Optional[bool] = None,
+) -> List[dict]:
+    """Same as iter_rows, collected into a list."""
+    return list(iter_rows(query_factory, key, page_size, prefetch))
+
+def stats() -> dict:
+    with _stats_lock:
+        snapshot = dict(_stats)
+    return {
+        "page_size": FETCH_PAGE_SIZE,
+        "prefetch": FETCH_PREFETCH,
+        **snapshot,
+    }
+
+metrics.register("pagination", stats)
@@ -0,0 +1,361 @@
+"""
+Copias en memoria de las tablas de referencia (IB_Projects, IB_Members, ...).
+
+Cada copia se carga completa, se refresca en segundo plano al vencer su TTL
+y expone una versión derivada del contenido para validar cachés HTTP. La
+versión combina con XOR un hash por fila, así que un cambio de pocas filas
+la actualiza sin volver a serializar la tabla.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from email.utils import formatdate
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..repository import db
+from . import metrics
+from .pagination import fetch_all
+from .singleflight import reads
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_TTL_SECONDS = float(os.getenv("REFERENCE_TTL_SECONDS", "300"))
+
+def row_hash(row: dict) -> str:
+    return hashlib.blake2b(
+        json.dumps(row, sort_keys=True, default=str).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+# (fila anterior, fila nueva); None en un lado para altas y bajas
+RowChange = Tuple[Optional[dict], Optional[dict]]
+
+class ReferenceCache:
+    """
+    Base class for a process-wide, read-mostly copy of one Supabase table.
+
+    New contents are indexed off to the side and swapped in by assignment, so
+    readers never take the lock and never see a half-built copy. Subclasses
+    build their own indexes in `_rebuild` and may patch them per row in
+    `_update`.
+    """
+
+    table_name: str = ""
+    columns: str = "*"
+    primary_key: str = "id"
+
+    def __init__(self, name: str, ttl_seconds: float = REFERENCE_TTL_SECONDS):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._rows: List[dict] = []
+        # primary_key -> fila y primary_key -> hash de la fila, en el orden de _rows
+        self._by_primary_key: Dict[Any, dict] = {}
+        self._row_hashes: Dict[Any, int] = {}
+        # XOR de los hashes de todas las filas
+        self._digest = 0
+        self._version: Optional[str] = None
+        # (filas, versión) publicados juntos en una sola asignación
+        self._published: Tuple[List[dict], Optional[str]] = ([], None)
+        self._modified_wall: Optional[float] = None
+        # Cuerpos HTTP ya serializados para la versión actual
+        self._documents: Dict[str, Any] = {}
+        self._loaded_at: Optional[float] = None
+        self._loaded_wall: Optional[float] = None
+        self._refresh_count = 0
+        self._incremental_count = 0
+        self._last_refresh_ms = 0.0
+        self._last_error: Optional[str] = None
+        # Momento en que los datos salieron de Supabase (anterior a _loaded_wall si vienen de disco)
+        self._data_wall: Optional[float] = None
+        self._source: Optional[str] = None
+        # Se llaman con la caché recién cambiada, p. ej. para guardarla en disco
+        self._listeners: List[Callable[["ReferenceCache"], None]] = []
+
+    def _fetch_rows(self) -> List[dict]:
+        return fetch_all(lambda: db.table(self.table_name).select(self.columns), key=self.primary_key)
+
+    def _rebuild(self, rows: List[dict]) -> None:
+        """Build subclass indexes for a new set of rows. Called with the lock held."""
+
+    def _update(self, rows: List[dict], changes: List[RowChange]) -> None:
+        """
+        Patch subclass indexes for a few changed rows. Called with the lock held.
+
+        Indexes that readers iterate must be copied along the changed path,
+        not mutated in place. The default rebuilds everything.
+
+        Args:
+            rows: Complete new set of rows
+            changes: (old row, new row) pairs, None for inserts and deletes
+        """
+        self._rebuild(rows)
+
+    def add_listener(self, listener: Callable[["ReferenceCache"], None]) -> None:
+        """Call `listener(cache)` after every load that changes the content."""
+        self._listeners.append(listener)
+
+    def _hash(self, row: dict) -> int:
+        return int(row_hash(row), 16)
+
+    def _version_of(self, digest: int, count: int) -> str:
+        return f'"{digest:032x}-{count:x}"'
+
+    def _swap(self, rows: List[dict], started: float, source: str = "upstream", data_wall: Optional[float] = None) -> None:
+        # Debe llamarse con self._lock tomado. Carga completa: se rehace todo
+        by_primary_key = {}
+        row_hashes = {}
+        digest = 0
+        for row in rows:
+            key = row.get(self.primary_key)
+            row_hash_value = self._hash(row)
+            previous = row_hashes.get(key)
+            if previous is not None:
+                digest ^= previous
+            by_primary_key[key] = row
+            row_hashes[key] = row_hash_value
+            digest ^= row_hash_value
+        self._rebuild(rows)
+        self._by_primary_key = by_primary_key
+        self._row_hashes = row_hashes
+        self._digest = digest
+        self._publish(rows, self._version_of(digest, len(row_hashes)), started, source, data_wall)
+
+    def _publish(self, rows: List[dict], version: str, started: float, source: str, data_wall: Optional[float]) -> None:
+        # Debe llamarse con self._lock tomado, con los índices ya construidos para `rows`
+        self._rows = rows
+        changed = version != self._version
+        if changed:
+            self._version = version
+            self._modified_wall = time.time()
+            self._documents = {}
+        self._published = (rows, self._version)
+        self._loaded_at = time.monotonic()
+        self._loaded_wall = time.time()
+        self._data_wall = data_wall if data_wall is not None else self._loaded_wall
+        self._source = source
+        self._refresh_count += 1
+        self._last_refresh_ms = (time.perf_counter() - started) * 1000
+        self._last_error = None
+        logger.info(f"{self.name} refreshed from {source}: {len(rows)} rows in {self._last_refresh_ms:.1f} ms")
+
+        if changed and source == "upstream":
+            for listener in self._listeners:
+                try:
+                    listener(self)
+                except Exception as e:
+                    logger.warning(f"{self.name} listener failed: {e}")
+
+    def load_snapshot(self, rows: List[dict], saved_at: float) -> None:
+        """
+        Serve a previously saved copy until the next successful refresh.
+
+        Args:
+            rows: Rows read from the snapshot
+            saved_at: Epoch seconds when the snapshot was taken
+        """
+        with self._lock:
+            self._swap(rows, time.perf_counter(), source="snapshot", data_wall=saved_at)
+
+    def _reload(self) -> None:
+        # Debe llamarse con self._lock tomado
+        started = time.perf_counter()
+        try:
+            rows = self._fetch_rows()
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+        self._swap(rows, started)
+
+    def refresh(self) -> None:
+        """Reload the whole table from Supabase and swap it in."""
+        with self._lock:
+            self._reload()
+
+    def apply_changes(self, upserts: List[dict], deleted_keys: Iterable[Any] = (), rebuild: bool = False) -> int:
+        """
+        Merge changed rows into the copy without refetching the table.
+
+        Rows are matched on `primary_key`. Only the changed rows are hashed and
+        reindexed; `rebuild` asks for a full rebuild instead, for callers that
+        already hold the whole table. A call that changes nothing still counts
+        as a successful refresh, so the TTL reload stays idle while a delta
+        sync keeps the copy current.
+
+        Args:
+            upserts: New or changed rows
+            deleted_keys: Primary keys of rows removed upstream
+            rebuild: Rebuild every index if anything changed
+
+        Returns:
+            Number of rows actually inserted, updated or removed
+        """
+        with self._lock:
+            started = time.perf_counter()
+            by_primary_key = self._by_primary_key
+            row_hashes = self._row_hashes
+            digest = self._digest
+            changes: List[RowChange] = []
+            for row in upserts:
+                key = row.get(self.primary_key)
+                row_hash_value = self._hash(row)
+                previous = row_hashes.get(key)
+                if previous == row_hash_value:
+                    continue
+                if previous is not None:
+                    digest ^= previous
+                changes.append((by_primary_key.get(key), row))
+                by_primary_key[key] = row
+                row_hashes[key] = row_hash_value
+                digest ^= row_hash_value
+            for key in deleted_keys:
+                previous = row_hashes.pop(key, None)
+                if previous is not None:
+                    digest ^= previous
+                    changes.append((by_primary_key.pop(key), None))
+
+            if changes or self._loaded_at is None:
+                rows = list(by_primary_key.values())
+                if rebuild or self._loaded_at is None:
+                    self._rebuild(rows)
+                else:
+                    self._update(rows, changes)
+                    self._incremental_count += 1
+                self._digest = digest
+                self._publish(rows, self._version_of(digest, len(row_hashes)), started, "upstream", None)
+            else:
+                self._loaded_at = time.monotonic()
+                self._loaded_wall = time.time()
+                self._data_wall = self._loaded_wall
+            return len(changes)
+
+    def _is_expired(self) -> bool:
+        return self._loaded_at is None or (time.monotonic() - self._loaded_at) > self.ttl_seconds
+
+    def _ensure_fresh(self) -> None:
+        if self._loaded_at is None:
+            # Primera carga: todos esperan, no hay nada que servir todavía. Los
+            # que llegan durante la carga comparten su resultado, también si falla
+            reads.do(("reference", self.name), self._cold_load, group=f"{self.name}_load")
+            return
+
+        if not self._is_expired():
+            return
+
+        self.refresh_in_background()
+
+    def _cold_load(self) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                self._reload()
+
+    def refresh_in_background(self) -> None:
+        """Start a reload in a background thread unless one is already running."""
+        # Un solo hilo refresca; las lecturas siguen sirviendo la copia actual
+        if not self._lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._background_reload, name=f"{self.name}-refresh", daemon=True).start()
+
+    def _background_reload(self) -> None:
+        # El lock ya fue tomado por _ensure_fresh
+        try:
+            self._reload()
+        except Exception as e:
+            logger.warning(f"{self.name} refresh failed, serving stale data: {e}")
+        finally:
+            self._lock.release()
+
+    def snapshot(self) -> Tuple[List[dict], Optional[str]]:
+        """
+        Current rows and the version computed from them, as one consistent pair.
+
+        Never loads and never takes the lock: it is called from listeners that
+        run inside a swap, with the lock already held.
+        """
+        return self._published
+
+    def rows(self) -> List[dict]:
+        self._ensure_fresh()
+        return self._rows
+
+    @property
+    def version(self) -> str:
+        """Content-derived version (a quoted hash) of the current copy."""
+        self._ensure_fresh()
+        return self._version
+
+    @property
+    def last_modified(self) -> str:
+        """HTTP date of the last load that changed the content."""
+        self._ensure_fresh()
+        return formatdate(self._modified_wall, usegmt=True)
+
+    def document(self, name: str, render: Callable[[List[dict]], bytes]) -> bytes:
+        """
+        Serialized response body for the current version, rendered once.
+
+        Args:
+            name: Cache slot, one per distinct rendering
+            render: Builds the body from the current rows
+
+        Returns:
+            The rendered body
+        """
+        self._ensure_fresh()
+        documents = self._documents
+        body = documents.get(name)
+        if body is None:
+            body = render(self._rows)
+            documents[name] = body
+        return body
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._loaded_at is not None,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at is not None else None,
+            "loaded_at": self._loaded_wall,
+            "source": self._source,
+            "data_age_seconds": round(time.time() - self._data_wall, 3) if self._data_wall is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "rows": len(self._rows),
+            "version": self._version,
+            "refresh_count": self._refresh_count,
+            "incremental_updates": self._incremental_count,
+            "last_refresh_ms": round(self._last_refresh_ms, 3),
+            "last_error": self._last_error,
+        }
+
+class ReferenceTable(ReferenceCache):
+    """Whole-table copy with a unique-key index."""
+
+    def __init__(self, table_name: str, key_column: str, ttl_seconds: float = REFERENCE_TTL_SECONDS):
+        super().__init__(table_name, ttl_seconds)
+        self.table_name = table_name
+        self.key_column = key_column
+        self._by_key: Dict[str, dict] = {}
+
+    def _rebuild(self, rows: List[dict]) -> None:
+        self._by_key = {str(row.get(self.key_column)): row for row in rows}
+
+    def _update(self, rows: List[dict], changes: List[RowChange]) -> None:
+        # Los lectores solo hacen get(): se puede tocar el índice en el sitio
+        by_key = self._by_key
+        for old_row, new_row in changes:
+            if old_row is not None:
+                old_key = str(old_row.get(self.key_column))
+                if by_key.get(old_key) is old_row:
+                    del by_key[old_key]
+            if new_row is not None:
+                by_key[str(new_row.get(self.key_column))] = new_row
+
+    def get(self, key: Any) -> Optional[dict]:
+        self._ensure_fresh()
+        return self._by_key.get(str(key))
+
+projects_table = ReferenceTable("IB_Projects", key_column="code")
+members_table = ReferenceTable("IB_Members", key_column="id")
+
+metrics.register("projects_table", projects_table.stats)
+metrics.register("members_table", members_table.stats)
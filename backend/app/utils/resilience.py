@@ -0,0 +1,315 @@
+"""
+Política de reintentos compartida para las llamadas a Supabase / Postgres.
+
+- Backoff exponencial con jitter completo (cada espera es aleatoria entre 0 y
+  el tope del intento), así las réplicas no reintentan todas a la vez.
+- Circuit breaker: tras UPSTREAM_BREAKER_FAILURES fallos transitorios
+  seguidos se deja de llamar al upstream durante UPSTREAM_BREAKER_RESET_SECONDS
+  (UpstreamUnavailableError inmediato); luego pasa una llamada de prueba y
+  si sale bien se cierra.
+- Presupuesto por petición: el middleware fija un deadline en un contextvar
+  y un reintento que no alcance a terminar antes del deadline no se hace.
+  El primer intento nunca se corta (una exportación larga sigue su curso).
+- Los errores se clasifican por tipo de excepción, no por el texto. Las
+  escrituras solo se reintentan si la petición no llegó a salir
+  (error al conectar), para no duplicar un INSERT.
+"""
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+import httpx
+from postgrest.exceptions import APIError
+from sqlalchemy import exc as sa_exc
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3"))
+UPSTREAM_RETRY_BASE_SECONDS = float(os.getenv("UPSTREAM_RETRY_BASE_SECONDS", "0.25"))
+UPSTREAM_RETRY_MAX_SECONDS = float(os.getenv("UPSTREAM_RETRY_MAX_SECONDS", "2"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "15"))
+
+T = TypeVar("T")
+
+# Errores en los que la petición no llegó al servidor: reintentables también para escrituras
+_NOT_SENT = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    ConnectionRefusedError,
+    sa_exc.TimeoutError,  # sin conexión libre en el pool
+)
+# Errores del canal o del servidor que suelen pasar solos
+_TRANSIENT = _NOT_SENT + (
+    httpx.TransportError,
+    ConnectionError,
+    TimeoutError,
+    sa_exc.OperationalError,
+    sa_exc.DisconnectionError,
+)
+_TRANSIENT_STATUS = {"500", "502", "503", "504"}
+
+class UpstreamUnavailableError(Exception):
+    """The circuit breaker is open; the call was not attempted."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = math.ceil(retry_after)
+        super().__init__(f"Servicio de datos no disponible; reintente en {self.retry_after}s")
+
+def is_transient(error: BaseException) -> bool:
+    """Whether the error is a connection/server failure worth retrying."""
+    if isinstance(error, _TRANSIENT):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return str(error.response.status_code) in _TRANSIENT_STATUS
+    if isinstance(error, APIError):
+        # PostgREST devuelve el status HTTP como código cuando la respuesta no es JSON (502 del proxy)
+        return str(error.code) in _TRANSIENT_STATUS
+    return False
+
+def _describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+def is_retryable(error: BaseException, idempotent: bool) -> bool:
+    if idempotent:
+        return is_transient(error)
+    return isinstance(error, _NOT_SENT)
+
+@dataclass
+class RequestBudget:
+    """Per-request deadline and what the resilience layer did for the request."""
+
+    deadline: float
+    retries: int = 0
+    unavailable: Optional[UpstreamUnavailableError] = None
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+_budget: ContextVar[Optional[RequestBudget]] = ContextVar("request_budget", default=None)
+
+@contextmanager
+def request_budget(seconds: float = REQUEST_DEADLINE_SECONDS) -> Iterator[RequestBudget]:
+    """
+    Set the deadline of the current request.
+
+    The budget object is shared with the tasks and threadpool workers that
+    copy the context, so they see the same deadline and report back on it.
+    """
+    budget = RequestBudget(deadline=time.monotonic() + seconds)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+def current_budget() -> Optional[RequestBudget]:
+    return _budget.get()
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = UPSTREAM_BREAKER_FAILURES, reset_seconds: float = UPSTREAM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Raise UpstreamUnavailableError unless a call may go through now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            waited = time.monotonic() - self._opened_at
+            if self._state == self.OPEN and waited >= self.reset_seconds:
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.HALF_OPEN and not self._probing:
+                # Solo una llamada de prueba a la vez
+                self._probing = True
+                return
+            self.rejected += 1
+            raise UpstreamUnavailableError(max(self.reset_seconds - waited, 1))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Upstream circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                if self._state == self.CLOSED:
+                    logger.warning(f"Upstream circuit opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+class RetryPolicy:
+    """
+    Retry with jittered exponential backoff behind a circuit breaker.
+
+    call() sleeps with time.sleep (threadpool routes and background threads);
+    acall() awaits asyncio.sleep so the event loop keeps serving requests.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        attempts: int = UPSTREAM_RETRY_ATTEMPTS,
+        base_delay: float = UPSTREAM_RETRY_BASE_SECONDS,
+        max_delay: float = UPSTREAM_RETRY_MAX_SECONDS,
+    ):
+        self.breaker = breaker
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "retries_skipped_deadline": 0,
+            "short_circuited": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _admit(self) -> None:
+        self._count("calls")
+        try:
+            self.breaker.before_call()
+        except UpstreamUnavailableError as e:
+            self._count("short_circuited")
+            budget = _budget.get()
+            if budget is not None:
+                budget.unavailable = e
+            raise
+
+    def _after_failure(self, error: Exception, attempt: int, attempts: int, idempotent: bool, label: str) -> Optional[float]:
+        """Record a failed attempt; return the delay before the next one, or None to give up."""
+        transient = is_transient(error)
+        if transient:
+            self.breaker.record_failure()
+        else:
+            # El upstream respondió (p. ej. un 400): está sano
+            self.breaker.record_success()
+        if attempt == attempts - 1 or not is_retryable(error, idempotent):
+            self._count("failures")
+            if transient:
+                logger.error(f"{label} failed after {attempt + 1} attempt(s): {_describe(error)}")
+            return None
+        delay = self._backoff(attempt)
+        budget = _budget.get()
+        if budget is not None and budget.remaining() < delay:
+            self._count("retries_skipped_deadline")
+            self._count("failures")
+            logger.warning(f"{label} failed and the request deadline leaves no room to retry: {_describe(error)}")
+            return None
+        self._count("retries")
+        if budget is not None:
+            budget.retries += 1
+        logger.warning(f"{label} failed (attempt {attempt + 1}/{attempts}): {_describe(error)}. Retrying in {delay:.2f}s...")
+        return delay
+
+    def call(self, operation: Callable[[], T], idempotent: bool = True, retry: bool = True, label: str = "Upstream call") -> T:
+        """
+        Run a blocking upstream call under the policy.
+
+        Args:
+            operation: Callable doing one attempt
+            idempotent: False for writes, which are retried only if the request was not sent
+            retry: False to make a single attempt (e.g. inside a transaction)
+            label: Name used in log messages
+        """
+        attempts = self.attempts if retry else 1
+        for attempt in range(attempts):
+            self._admit()
+            try:
+                result = operation()
+            except Exception as e:
+                delay = self._after_failure(e, attempt, attempts, idempotent, label)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+        raise AssertionError("unreachable")
+
+    async def acall(self, operation: Callable[[], Awaitable[T]], idempotent: bool = True, retry: bool = True, label: str = "Upstream call") -> T:
+        """Async variant of call(); `operation` returns a fresh awaitable per attempt."""
+        attempts = self.attempts if retry else 1
+        for attempt in range(attempts):
+            self._admit()
+            try:
+                result = await operation()
+            except Exception as e:
+                delay = self._after_failure(e, attempt, attempts, idempotent, label)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+        raise AssertionError("unreachable")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "breaker": self.breaker.stats(),
+            "attempts": self.attempts,
+            "request_deadline_seconds": REQUEST_DEADLINE_SECONDS,
+        }
+
+# Un solo breaker para el backend de datos: REST síncrono, REST asíncrono y SQL comparten upstream
+upstream = RetryPolicy(CircuitBreaker())
+metrics.register("upstream", upstream.stats)
@@ -0,0 +1,286 @@
+"""
+Totales precalculados de IB_Reported_Hours, mantenidos con cada escritura.
+
+Dos agregados por mes: horas por (empleado, día) y por (proyecto, fase,
+disciplina). Un mes se construye con una lectura paginada la primera vez que
+se consulta; desde ahí cada alta, cambio o baja resta lo que aportaba el
+registro y suma lo nuevo. Un hilo vuelve a calcular los meses cargados cada
+ROLLUP_RECONCILE_SECONDS para corregir diferencias (p. ej. escrituras hechas
+por otros workers); los meses cerrados (ver month_cache.py) no se reconcilian.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..repository import db
+from . import metrics
+from .month_cache import is_closed
+from .pagination import iter_rows
+
+logger = logging.getLogger(__name__)
+
+HOURS_ROLLUPS_ENABLED = os.getenv("HOURS_ROLLUPS", "1").lower() in ("1", "true", "yes")
+ROLLUP_RECONCILE_SECONDS = float(os.getenv("ROLLUP_RECONCILE_SECONDS", "600"))
+ROLLUP_MAX_MONTHS = int(os.getenv("ROLLUP_MAX_MONTHS", "36"))
+# Diferencia mínima para contar un grupo como corregido en la conciliación
+_DRIFT_EPSILON = 1e-6
+
+# id -> (mes, employee_id, fecha, proyecto, fase, disciplina, horas)
+Entry = Tuple[str, str, str, str, str, str, float]
+
+def _month_bounds(month: str) -> Tuple[str, str]:
+    year, number = int(month[:4]), int(month[5:7])
+    if number == 12:
+        following = f"{year + 1}-01-01"
+    else:
+        following = f"{year}-{number + 1:02d}-01"
+    return f"{month}-01", following
+
+def _entry(row: dict) -> Optional[Entry]:
+    day = str(row.get("date") or "")[:10]
+    if len(day) != 10:
+        return None
+    try:
+        hours = float(row.get("hours") or 0)
+    except (TypeError, ValueError):
+        hours = 0.0
+    return (
+        day[:7],
+        str(row.get("employee_id")),
+        day,
+        row.get("project_code"),
+        row.get("phase"),
+        row.get("discipline"),
+        hours,
+    )
+
+def _add(totals: dict, key: tuple, hours: float) -> None:
+    value = totals.get(key, 0.0) + hours
+    if abs(value) < _DRIFT_EPSILON:
+        totals.pop(key, None)
+    else:
+        totals[key] = value
+
+class _MonthRollup:
+    """Both aggregates of one month, plus what each entry contributed."""
+
+    def __init__(self):
+        self.entries: Dict[str, Entry] = {}
+        self.employee_days: Dict[Tuple[str, str], float] = {}
+        self.activities: Dict[Tuple[str, str, str], float] = {}
+        self.loaded_at = time.monotonic()
+
+    def add(self, hour_id: str, entry: Entry) -> None:
+        self.entries[hour_id] = entry
+        _add(self.employee_days, (entry[1], entry[2]), entry[6])
+        _add(self.activities, (entry[3], entry[4], entry[5]), entry[6])
+
+    def remove(self, hour_id: str) -> None:
+        entry = self.entries.pop(hour_id, None)
+        if entry is not None:
+            _add(self.employee_days, (entry[1], entry[2]), -entry[6])
+            _add(self.activities, (entry[3], entry[4], entry[5]), -entry[6])
+
+class HoursRollups:
+    """
+    Month-scoped rollups kept current by +/- deltas from the write path.
+
+    Deltas are keyed by entry id, so applying the same write twice (e.g. a
+    journal replay) does not double-count.
+    """
+
+    def __init__(self, max_months: int = ROLLUP_MAX_MONTHS, reconcile_seconds: float = ROLLUP_RECONCILE_SECONDS):
+        self.max_months = max_months
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        self._months: "OrderedDict[str, _MonthRollup]" = OrderedDict()
+        self._month_locks: Dict[str, threading.Lock] = {}
+        # Escrituras recibidas mientras se construye un mes; se reaplican al terminar
+        self._pending: Dict[str, List[Tuple[Optional[dict], Optional[dict]]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.builds = 0
+        self.deltas = 0
+        self.reconciles = 0
+        self.last_drift_groups = 0
+        self.last_reconcile_wall: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _scan(self, month: str) -> _MonthRollup:
+        start, following = _month_bounds(month)
+        rollup = _MonthRollup()
+        rows = iter_rows(
+            lambda: db
+                .table("IB_Reported_Hours")
+                .select("id, date, employee_id, project_code, phase, discipline, hours")
+                .gte("date", start)
+                .lt("date", following),
+            key="id",
+        )
+        for row in rows:
+            entry = _entry(row)
+            if entry is not None and entry[0] == month:
+                rollup.add(str(row["id"]), entry)
+        return rollup
+
+    def _build(self, month: str) -> Tuple[_MonthRollup, Optional[_MonthRollup]]:
+        with self._lock:
+            self._pending[month] = []
+        try:
+            rollup = self._scan(month)
+        except Exception:
+            with self._lock:
+                self._pending.pop(month, None)
+            raise
+        with self._lock:
+            previous = self._months.get(month)
+            self._months[month] = rollup
+            self._months.move_to_end(month)
+            for old_row, new_row in self._pending.pop(month):
+                self._apply_locked(old_row, new_row)
+            while len(self._months) > self.max_months:
+                self._months.popitem(last=False)
+            self.builds += 1
+        return rollup, previous
+
+    def _month_lock(self, month: str) -> threading.Lock:
+        with self._lock:
+            return self._month_locks.setdefault(month, threading.Lock())
+
+    def _ensure_month(self, month: str) -> _MonthRollup:
+        with self._lock:
+            rollup = self._months.get(month)
+            if rollup is not None:
+                self._months.move_to_end(month)
+                return rollup
+        # Una sola construcción por mes aunque lleguen varias consultas a la vez
+        with self._month_lock(month):
+            with self._lock:
+                rollup = self._months.get(month)
+            if rollup is None:
+                rollup, _ = self._build(month)
+            return rollup
+
+    def _apply_locked(self, old_row: Optional[dict], new_row: Optional[dict]) -> None:
+        if old_row is not None:
+            hour_id = str(old_row.get("id"))
+            for rollup in self._months.values():
+                if hour_id in rollup.entries:
+                    rollup.remove(hour_id)
+                    break
+        if new_row is not None:
+            hour_id = str(new_row.get("id"))
+            entry = _entry(new_row)
+            # Un cambio de fecha puede mover el registro de mes
+            for rollup in self._months.values():
+                if hour_id in rollup.entries:
+                    rollup.remove(hour_id)
+                    break
+            if entry is not None and entry[0] in self._months:
+                self._months[entry[0]].add(hour_id, entry)
+
+    def apply(self, old_row: Optional[dict] = None, new_row: Optional[dict] = None) -> None:
+        """
+        Apply one write: drop what `old_row` contributed and add `new_row`.
+
+        Months that are not loaded are skipped; they are built from the table
+        when first read.
+        """
+        with self._lock:
+            self._apply_locked(old_row, new_row)
+            for pending in self._pending.values():
+                pending.append((old_row, new_row))
+            self.deltas += 1
+
+    def employee_days(self, year: int, month: int) -> Dict[Tuple[str, str], float]:
+        """Hours per (employee_id, date) for a month."""
+        rollup = self._ensure_month(f"{year:04d}-{month:02d}")
+        with self._lock:
+            return dict(rollup.employee_days)
+
+    def activity_totals(self, year: int, month: int, project_code: Optional[str] = None) -> Dict[Tuple[str, str, str], float]:
+        """Hours per (project_code, phase, discipline) for a month, optionally for one project."""
+        rollup = self._ensure_month(f"{year:04d}-{month:02d}")
+        with self._lock:
+            return {
+                key: hours for key, hours in rollup.activities.items()
+                if project_code is None or key[0] == project_code
+            }
+
+    def reconcile(self) -> int:
+        """
+        Rebuild every loaded open month from the table.
+
+        Closed months are left as they are: nothing is expected to change
+        there, and local writes still reach them as deltas.
+
+        Returns:
+            Number of groups whose total was corrected
+        """
+        with self._lock:
+            months = [month for month in self._months if not is_closed(month)]
+        drift = 0
+        for month in months:
+            with self._month_lock(month):
+                rollup, previous = self._build(month)
+            if previous is None:
+                continue
+            for current, stale in ((rollup.employee_days, previous.employee_days), (rollup.activities, previous.activities)):
+                for key in current.keys() | stale.keys():
+                    if abs(current.get(key, 0.0) - stale.get(key, 0.0)) > _DRIFT_EPSILON:
+                        drift += 1
+        if drift:
+            logger.warning(f"Hours rollups reconciled: {drift} groups corrected")
+        self.reconciles += 1
+        self.last_drift_groups = drift
+        self.last_reconcile_wall = time.time()
+        return drift
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.reconcile_seconds):
+            try:
+                self.reconcile()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Hours rollup reconcile failed: {e}")
+
+    def start(self) -> None:
+        if self.reconcile_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="hours-rollup-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            months = {
+                month: {
+                    "entries": len(rollup.entries),
+                    "employee_day_groups": len(rollup.employee_days),
+                    "activity_groups": len(rollup.activities),
+                    "age_seconds": round(time.monotonic() - rollup.loaded_at, 3),
+                }
+                for month, rollup in self._months.items()
+            }
+        return {
+            "enabled": HOURS_ROLLUPS_ENABLED,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "reconcile_seconds": self.reconcile_seconds,
+            "builds": self.builds,
+            "deltas": self.deltas,
+            "reconciles": self.reconciles,
+            "last_drift_groups": self.last_drift_groups,
+            "last_reconcile_at": self.last_reconcile_wall,
+            "last_error": self.last_error,
+            "months": months,
+        }
+
+hours_rollups = HoursRollups()
+metrics.register("hours_rollups", hours_rollups.stats)
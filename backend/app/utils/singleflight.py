@@ -0,0 +1,140 @@
+"""
+Single-flight: las llamadas concurrentes con la misma clave comparten una
+sola ejecución.
+
+Cuando a las 8 a.m. muchos usuarios abren el formulario a la vez, la primera
+llamada de cada clave va al upstream y las que llegan mientras está en curso
+esperan su resultado (o su excepción) en lugar de repetir la consulta. Así
+las peticiones a Supabase durante una ráfaga dependen del número de claves
+distintas, no del número de usuarios. No es una caché: al terminar la
+llamada la clave se libera y la siguiente vuelve a consultar.
+
+El resultado se comparte tal cual entre los que esperan, así que las
+funciones envueltas deben devolver datos que los llamadores no modifiquen.
+"""
+import functools
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters", "owner")
+
+    def __init__(self, owner: int):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.owner = owner
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._groups: Dict[str, Dict[str, int]] = {}
+        self.max_waiters = 0
+
+    def _count(self, group: str, counter: str) -> None:
+        # Debe llamarse con self._lock tomado
+        counters = self._groups.setdefault(group, {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0})
+        counters[counter] += 1
+
+    def do(self, key: Hashable, fn: Callable[[], T], group: str = "default") -> T:
+        """
+        Run `fn` once for all concurrent callers with the same key.
+
+        Args:
+            key: Hashable identity of the call (function and arguments)
+            fn: Callable doing the actual work
+            group: Name used to break down the counters in /metrics
+
+        Returns:
+            The result of the shared execution; its exception is raised to every caller
+        """
+        me = threading.get_ident()
+        with self._lock:
+            self._count(group, "calls")
+            flight = self._flights.get(key)
+            if flight is not None and flight.owner != me:
+                flight.waiters += 1
+                self.max_waiters = max(self.max_waiters, flight.waiters)
+                self._count(group, "coalesced")
+                leader = False
+            else:
+                # Sin llamada en curso (o llamada reentrante del mismo hilo): ejecutar
+                flight = _Flight(me)
+                leader = key not in self._flights
+                if leader:
+                    self._flights[key] = flight
+                self._count(group, "executions")
+
+        if flight.owner != me:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._count(group, "errors")
+            raise
+        finally:
+            if leader:
+                with self._lock:
+                    self._flights.pop(key, None)
+            flight.done.set()
+
+    def wrap(self, group: Optional[str] = None) -> Callable[[Callable[..., T]], Callable[..., T]]:
+        """
+        Decorator coalescing calls with equal positional and keyword arguments.
+
+        Calls with unhashable arguments run on their own.
+        """
+        def decorator(func: Callable[..., T]) -> Callable[..., T]:
+            name = group or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (name, args, tuple(sorted(kwargs.items())))
+                try:
+                    hash(key)
+                except TypeError:
+                    return func(*args, **kwargs)
+                return self.do(key, lambda: func(*args, **kwargs), group=name)
+
+            return wrapper
+
+        return decorator
+
+    def stats(self) -> dict:
+        with self._lock:
+            groups = {name: dict(counters) for name, counters in self._groups.items()}
+            in_flight = len(self._flights)
+        calls = sum(counters["calls"] for counters in groups.values())
+        coalesced = sum(counters["coalesced"] for counters in groups.values())
+        return {
+            "calls": calls,
+            "executions": sum(counters["executions"] for counters in groups.values()),
+            "coalesced": coalesced,
+            "coalesce_ratio": round(coalesced / calls, 4) if calls else None,
+            "in_flight": in_flight,
+            "max_waiters": self.max_waiters,
+            "groups": groups,
+        }
+
+# Lecturas de crud.py y cargas en frío de las cachés de referencia
+reads = SingleFlight("reads")
+metrics.register("single_flight", reads.stats)
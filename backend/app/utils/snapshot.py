@@ -0,0 +1,138 @@
+"""
+Copia en disco (SQLite) de las tablas de referencia.
+
+Permite arrancar un worker en milisegundos con los últimos datos conocidos y
+seguir atendiendo la cascada y /projects/ cuando Supabase no responde.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional, Tuple
+
+from . import metrics
+from .reference import ReferenceCache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv(
+    "SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "reference_snapshot.sqlite3"),
+)
+# Se incrementa si cambia la forma en que se guardan las filas
+SNAPSHOT_FORMAT_VERSION = 1
+
+class SnapshotStore:
+    """
+    One SQLite row per reference table holding its zlib-compressed JSON rows.
+
+    Every worker opens its own short-lived connection, so the file can be
+    shared by several uvicorn workers; writes are whole-row replacements.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.saves = 0
+        self.loads = 0
+        self.last_error: Optional[str] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS reference_snapshot ("
+            " name TEXT PRIMARY KEY,"
+            " format_version INTEGER NOT NULL,"
+            " version TEXT,"
+            " saved_at REAL NOT NULL,"
+            " row_count INTEGER NOT NULL,"
+            " payload BLOB NOT NULL)"
+        )
+        return connection
+
+    def save(self, cache: ReferenceCache) -> None:
+        """Persist the current rows of a cache, replacing its previous snapshot."""
+        rows, version = cache.snapshot()
+        payload = zlib.compress(json.dumps(rows, default=str, separators=(",", ":")).encode("utf-8"))
+        try:
+            with self._lock:
+                connection = self._connect()
+                try:
+                    with connection:
+                        connection.execute(
+                            "INSERT OR REPLACE INTO reference_snapshot"
+                            " (name, format_version, version, saved_at, row_count, payload)"
+                            " VALUES (?, ?, ?, ?, ?, ?)",
+                            (cache.table_name, SNAPSHOT_FORMAT_VERSION, version, time.time(), len(rows), payload),
+                        )
+                finally:
+                    connection.close()
+            self.saves += 1
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning(f"Could not save snapshot of {cache.table_name}: {e}")
+
+    def read(self, table_name: str) -> Optional[Tuple[list, float]]:
+        """
+        Read the stored rows of a table.
+
+        Returns:
+            (rows, saved_at) or None if there is no usable snapshot
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            connection = self._connect()
+            try:
+                record = connection.execute(
+                    "SELECT format_version, saved_at, payload FROM reference_snapshot WHERE name = ?",
+                    (table_name,),
+                ).fetchone()
+            finally:
+                connection.close()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning(f"Could not read snapshot of {table_name}: {e}")
+            return None
+
+        if record is None or record[0] != SNAPSHOT_FORMAT_VERSION:
+            return None
+        rows = json.loads(zlib.decompress(record[2]).decode("utf-8"))
+        return rows, record[1]
+
+    def restore(self, cache: ReferenceCache) -> bool:
+        """
+        Load a cache from its snapshot, if there is one.
+
+        Returns:
+            True if the cache was restored
+        """
+        snapshot = self.read(cache.table_name)
+        if snapshot is None:
+            return False
+        rows, saved_at = snapshot
+        cache.load_snapshot(rows, saved_at)
+        self.loads += 1
+        logger.info(f"{cache.name} restored from snapshot: {len(rows)} rows saved {time.time() - saved_at:.0f}s ago")
+        return True
+
+    def attach(self, cache: ReferenceCache) -> None:
+        """Save the cache to disk every time its content changes."""
+        cache.add_listener(self.save)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "exists": os.path.exists(self.path),
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "saves": self.saves,
+            "loads": self.loads,
+            "last_error": self.last_error,
+        }
+
+snapshot_store = SnapshotStore()
+metrics.register("snapshot", snapshot_store.stats)
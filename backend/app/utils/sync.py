@@ -0,0 +1,255 @@
+"""
+Sincronización incremental de las tablas de referencia.
+
+En lugar de volver a traer IB_Projects, IB_Members e IB_Activities completas,
+cada ciclo pide solo las filas con la columna de marca de agua igual o
+posterior a la última vista, y las aplica sobre las copias en memoria. La
+marca de agua por defecto es updated_at (ver backend/sql/reference_updated_at.sql),
+que cambia con altas y modificaciones. Si se configura created_at solo se ven
+las altas: las modificaciones, igual que los borrados en cualquier caso,
+esperan a la comparación completa por hash de cada SYNC_RECONCILE_SECONDS
+(15 minutos por defecto). Las tablas sin esa columna se comparan por hash de
+fila en cada ciclo.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..repository import db
+from . import metrics
+from .pagination import fetch_all
+from .catalog import activity_catalog
+from .reference import ReferenceCache, members_table, projects_table, row_hash
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", "30"))
+# Cada cuánto se hace una comparación completa por hash para detectar
+# actualizaciones y borrados que la marca de agua no ve
+SYNC_RECONCILE_SECONDS = float(os.getenv("SYNC_RECONCILE_SECONDS", "900"))
+
+def _parse_watermark_columns(raw: str) -> Dict[str, Optional[str]]:
+    # Formato: "IB_Projects=created_at,IB_Activities=" (vacío = comparar por hash)
+    columns: Dict[str, Optional[str]] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        table, column = item.split("=", 1)
+        columns[table.strip()] = column.strip() or None
+    return columns
+
+SYNC_WATERMARK_COLUMNS = _parse_watermark_columns(os.getenv(
+    "SYNC_WATERMARK_COLUMNS",
+    "IB_Projects=updated_at,IB_Members=updated_at,IB_Activities=updated_at",
+))
+
+# Columna inexistente: 42703 de Postgres y PGRST204 de la caché de esquema de PostgREST
+_UNDEFINED_COLUMN_CODES = {"42703", "PGRST204"}
+
+def _is_undefined_column(error: Exception, column: str) -> bool:
+    """Whether a query failed because `column` does not exist in the table."""
+    if getattr(error, "code", None) in _UNDEFINED_COLUMN_CODES:
+        return True
+    if getattr(getattr(error, "orig", None), "pgcode", None) in _UNDEFINED_COLUMN_CODES:
+        return True
+    # Backend postgres: la tabla reflejada no tiene la columna
+    return isinstance(error, KeyError) and error.args[:1] == (column,)
+
+class TableSync:
+    """Delta sync of one Supabase table into one ReferenceCache."""
+
+    def __init__(self, cache: ReferenceCache, watermark_column: Optional[str]):
+        self.cache = cache
+        self.watermark_column = watermark_column
+        self.watermark: Any = None
+        self._hashes: Dict[Any, str] = {}
+        self.last_sync_wall: Optional[float] = None
+        self.last_reconcile_at: Optional[float] = None
+        self.last_changes = 0
+        self.last_fetched = 0
+        self.total_changes = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def mode(self) -> str:
+        return "watermark" if self.watermark_column else "row_hash"
+
+    def _adds_watermark(self) -> bool:
+        # La caché no selecciona la columna de marca de agua: la sync la agrega a la consulta
+        columns = self.cache.columns
+        if columns.strip() == "*" or not self.watermark_column:
+            return False
+        return self.watermark_column not in [c.strip() for c in columns.split(",")]
+
+    def _select_columns(self) -> str:
+        if self._adds_watermark():
+            return f"{self.cache.columns}, {self.watermark_column}"
+        return self.cache.columns
+
+    def _cache_rows(self, rows: List[dict]) -> List[dict]:
+        """Rows with the same columns the cache loads itself, so a sync and a TTL reload hash alike."""
+        if not self._adds_watermark():
+            return rows
+        return [{k: v for k, v in row.items() if k != self.watermark_column} for row in rows]
+
+    def _advance_watermark(self, rows: List[dict]) -> None:
+        values = [row.get(self.watermark_column) for row in rows if row.get(self.watermark_column) is not None]
+        if values:
+            newest = max(values)
+            if self.watermark is None or newest > self.watermark:
+                self.watermark = newest
+
+    def _drop_watermark(self) -> None:
+        # La tabla no tiene esa columna: pasar a comparación por hash
+        logger.warning(
+            f"{self.cache.table_name} has no '{self.watermark_column}' column, falling back to row-hash sync"
+        )
+        self.watermark_column = None
+        self.watermark = None
+
+    def _fetch(self, since: Any = None) -> List[dict]:
+        def query():
+            builder = db.table(self.cache.table_name).select(self._select_columns())
+            if since is not None:
+                # gte y no gt: con una marca de tipo fecha varias filas comparten el mismo valor;
+                # las repetidas no cuentan como cambio al aplicarlas
+                builder = builder.gte(self.watermark_column, since)
+            return builder
+        return fetch_all(query, key=self.cache.primary_key)
+
+    def _reconcile(self) -> None:
+        # Comparación completa por hash: detecta altas, cambios y borrados
+        fetched = self._fetch()
+        rows = self._cache_rows(fetched)
+        primary_key = self.cache.primary_key
+        hashes = {row.get(primary_key): row_hash(row) for row in rows}
+        upserts = [row for row in rows if self._hashes.get(row.get(primary_key)) != hashes[row.get(primary_key)]]
+        deleted = [key for key in self._hashes if key not in hashes]
+        if not self._hashes:
+            # Primera pasada: lo que ya está en memoria no es un cambio real
+            deleted = [row.get(primary_key) for row in self.cache.rows() if row.get(primary_key) not in hashes]
+        # Ya se trajo la tabla entera: se aprovecha para reconstruir todos los índices
+        self.last_changes = self.cache.apply_changes(upserts, deleted, rebuild=True)
+        self.last_fetched = len(rows)
+        self._hashes = hashes
+        if self.watermark_column:
+            if fetched and all(row.get(self.watermark_column) is None for row in fetched):
+                # El backend en memoria no falla con columnas desconocidas: se ve aquí
+                # (y una marca siempre nula tampoco sirve)
+                self._drop_watermark()
+            else:
+                self._advance_watermark(fetched)
+        self.last_reconcile_at = time.monotonic()
+
+    def _delta(self) -> None:
+        fetched = self._fetch(since=self.watermark)
+        rows = self._cache_rows(fetched)
+        primary_key = self.cache.primary_key
+        for row in rows:
+            self._hashes[row.get(primary_key)] = row_hash(row)
+        self.last_changes = self.cache.apply_changes(rows)
+        self.last_fetched = len(rows)
+        self._advance_watermark(fetched)
+
+    def sync(self) -> int:
+        """
+        Run one sync pass.
+
+        Returns:
+            Number of rows changed in the in-memory copy
+        """
+        try:
+            reconcile_due = (
+                self.last_reconcile_at is None
+                or time.monotonic() - self.last_reconcile_at > SYNC_RECONCILE_SECONDS
+            )
+            if self.watermark_column and not reconcile_due:
+                self._delta()
+            else:
+                self._reconcile()
+        except Exception as e:
+            self.last_error = str(e)
+            if self.watermark_column and _is_undefined_column(e, self.watermark_column):
+                self._drop_watermark()
+            raise
+        self.total_changes += self.last_changes
+        self.last_sync_wall = time.time()
+        self.last_error = None
+        return self.last_changes
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "watermark_column": self.watermark_column,
+            "watermark": self.watermark,
+            "last_sync_at": self.last_sync_wall,
+            "lag_seconds": round(time.time() - self.last_sync_wall, 3) if self.last_sync_wall else None,
+            "last_fetched": self.last_fetched,
+            "last_changes": self.last_changes,
+            "total_changes": self.total_changes,
+            "last_error": self.last_error,
+        }
+
+class SyncEngine:
+    """Background loop that keeps every reference copy in sync."""
+
+    def __init__(self, tables: List[TableSync], interval_seconds: float = SYNC_INTERVAL_SECONDS):
+        self.tables = tables
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_sync_wall: Optional[float] = None
+        self.last_duration_ms = 0.0
+        self.runs = 0
+
+    def run_once(self) -> int:
+        """Sync every table once; failures are logged per table."""
+        started = time.perf_counter()
+        changed = 0
+        all_ok = True
+        for table in self.tables:
+            try:
+                changed += table.sync()
+            except Exception as e:
+                all_ok = False
+                logger.warning(f"Sync of {table.cache.table_name} failed: {e}")
+        self.runs += 1
+        self.last_duration_ms = (time.perf_counter() - started) * 1000
+        if all_ok:
+            self.last_sync_wall = time.time()
+        return changed
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="reference-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "interval_seconds": self.interval_seconds,
+            "reconcile_seconds": SYNC_RECONCILE_SECONDS,
+            "runs": self.runs,
+            "last_sync_at": self.last_sync_wall,
+            "lag_seconds": round(time.time() - self.last_sync_wall, 3) if self.last_sync_wall else None,
+            "last_duration_ms": round(self.last_duration_ms, 3),
+            "tables": {table.cache.table_name: table.stats() for table in self.tables},
+        }
+
+sync_engine = SyncEngine([
+    TableSync(projects_table, SYNC_WATERMARK_COLUMNS.get("IB_Projects")),
+    TableSync(members_table, SYNC_WATERMARK_COLUMNS.get("IB_Members")),
+    TableSync(activity_catalog, SYNC_WATERMARK_COLUMNS.get("IB_Activities")),
+])
+metrics.register("sync", sync_engine.stats)
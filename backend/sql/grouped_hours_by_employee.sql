@@ -0,0 +1,21 @@
+-- Suma de horas por (fecha, empleado) para /hours/grouped-by-employee.
+-- Se ejecuta una vez en el editor SQL de Supabase; el backend la llama por RPC
+-- y, si no existe, agrupa en Python.
+create or replace function public.grouped_hours_by_employee(start_date date, end_date date)
+returns table (date date, employee_id text, hours double precision)
+language sql
+stable
+as $$
+    select
+        h.date::date as date,
+        h.employee_id::text as employee_id,
+        sum(coalesce(nullif(h.hours::text, '')::double precision, 0)) as hours
+    from public."IB_Reported_Hours" h
+    where h.date::date between start_date and end_date
+    group by h.date::date, h.employee_id::text
+$$;
+
+-- Solo el backend (service key) la llama: sin acceso con la clave anónima.
+-- Postgres concede EXECUTE a PUBLIC por defecto y Supabase además a anon/authenticated.
+revoke execute on function public.grouped_hours_by_employee(date, date) from public, anon, authenticated;
+grant execute on function public.grouped_hours_by_employee(date, date) to service_role;
@@ -0,0 +1,22 @@
+-- Horas reportadas de un proyecto sumadas por (fase, disciplina, actividad),
+-- para GET /projects/{code}/burn. El backend la llama por RPC y, si no existe,
+-- suma en Python.
+create or replace function public.project_hours_by_activity(code text)
+returns table (phase text, discipline text, activity text, hours double precision)
+language sql
+stable
+as $$
+    select
+        h.phase::text,
+        h.discipline::text,
+        h.activity::text,
+        sum(coalesce(nullif(h.hours::text, '')::double precision, 0)) as hours
+    from public."IB_Reported_Hours" h
+    where h.project_code = code
+    group by h.phase, h.discipline, h.activity
+$$;
+
+-- Solo el backend (service key) la llama: sin acceso con la clave anónima.
+-- Postgres concede EXECUTE a PUBLIC por defecto y Supabase además a anon/authenticated.
+revoke execute on function public.project_hours_by_activity(text) from public, anon, authenticated;
+grant execute on function public.project_hours_by_activity(text) to service_role;
@@ -0,0 +1,32 @@
+-- Columna updated_at para la sincronización incremental (app/utils/sync.py).
+-- Se ejecuta una vez en el editor SQL de Supabase. Con created_at como marca de
+-- agua solo se ven las altas; updated_at también cambia en cada UPDATE.
+-- Los borrados no dejan marca: se detectan en la comparación completa
+-- (SYNC_RECONCILE_SECONDS).
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end
+$$;
+
+alter table public."IB_Projects" add column if not exists updated_at timestamptz not null default now();
+alter table public."IB_Members" add column if not exists updated_at timestamptz not null default now();
+alter table public."IB_Activities" add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists ib_projects_updated_at on public."IB_Projects" (updated_at);
+create index if not exists ib_members_updated_at on public."IB_Members" (updated_at);
+create index if not exists ib_activities_updated_at on public."IB_Activities" (updated_at);
+
+drop trigger if exists set_updated_at on public."IB_Projects";
+create trigger set_updated_at before update on public."IB_Projects"
+    for each row execute function public.set_updated_at();
+drop trigger if exists set_updated_at on public."IB_Members";
+create trigger set_updated_at before update on public."IB_Members"
+    for each row execute function public.set_updated_at();
+drop trigger if exists set_updated_at on public."IB_Activities";
+create trigger set_updated_at before update on public."IB_Activities"
+    for each row execute function public.set_updated_at();
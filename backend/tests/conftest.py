@@ -0,0 +1,138 @@
+"""
+Configuración común de las pruebas: el API corre con DATA_BACKEND=memory.
+
+Las variables de entorno se fijan antes de importar `app`, porque los módulos
+leen su configuración al importarse. Los archivos que el API escribe (copia
+de referencia, diario de horas, claves de idempotencia) van a un directorio
+temporal y los hilos de fondo quedan apagados.
+
+El backend en memoria corta las respuestas en MAX_ROWS filas, como el
+max-rows de PostgREST, con páginas del mismo tamaño: una lectura que no
+pagine devuelve datos incompletos también en las pruebas.
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="ibhoras-tests-")
+
+PROJECT = "0100"
+PHASE = "Ingeniería básica"
+ADMIN_TOKEN = "test-admin-token"
+MAX_ROWS = 20
+
+# Empleados reservados por archivo de pruebas, para que no compartan días ni semanas
+PAGINATION_EMPLOYEE = 6
+PAGINATION_ROWS = 47
+
+def _activity(activity_id: int, discipline: str, activity: str, project_code: str = PROJECT, phase: str = PHASE) -> dict:
+    return {
+        "activity_id": activity_id,
+        "project_code": project_code,
+        "phase": phase,
+        "discipline": discipline,
+        "activity": activity,
+        "hours_direction": 4.0,
+        "hours_engineering": 8.0,
+        "hours_modeling_ad": 0.0,
+        "hours": 12.0,
+        "status": "Activa",
+    }
+
+def _hour(hour_id: str, day: str, employee_id: int, discipline: str, activity: str, hours: float) -> dict:
+    return {
+        "id": hour_id,
+        "date": day,
+        "employee_id": str(employee_id),
+        "project_code": PROJECT,
+        "phase": PHASE,
+        "discipline": discipline,
+        "activity": activity,
+        "hours": str(hours),
+        "note": None,
+    }
+
+def seed() -> dict:
+    """Small, fixed dataset; the ids and names are what the tests assert on."""
+    activities = [
+        _activity(1, "Civil", "Planos"),
+        _activity(2, "Civil", "Memoria de cálculo"),
+        _activity(3, "N/A - No Aplica", "Coordinación"),
+        _activity(4, "Eléctrica", "Planos"),
+        _activity(5, "Eléctrica", "Planos eléctricos"),
+        _activity(6, "Eléctrica de potencia", "Memoria de cálculo"),
+        _activity(7, "Eléctrica de potencia", "Cantidades de obra"),
+        _activity(8, "Civil", "Planos", project_code="0200", phase="Diseño conceptual"),
+    ]
+    hours = [
+        _hour("00000000-0000-4000-8000-000000000501", "2025-02-03", 5, "Civil", "Planos", 4.0),
+        _hour("00000000-0000-4000-8000-000000000502", "2025-02-04", 5, "Eléctrica", "Planos", 3.0),
+    ]
+    first_day = date(2025, 1, 1)
+    for number in range(PAGINATION_ROWS):
+        # Varias filas por día: el orden por (date, id) no coincide con el orden por id
+        day = first_day + timedelta(days=(number * 7) % 23)
+        hours.append(_hour(
+            f"00000000-0000-4000-8000-{(number * 7919) % 100000:012d}",
+            day.isoformat(),
+            PAGINATION_EMPLOYEE,
+            "Civil",
+            "Memoria de cálculo",
+            1.0 + number % 4,
+        ))
+    return {
+        "IB_Projects": [
+            {"id": 1, "code": PROJECT, "name": "Proyecto de prueba"},
+            {"id": 2, "code": "0200", "name": "Proyecto sin horas"},
+        ],
+        "IB_Members": [
+            {"id": number, "name": f"Empleado {number}", "short_name": f"E{number:02d}"}
+            for number in range(1, 7)
+        ],
+        "IB_Activities": activities,
+        "IB_Reported_Hours": hours,
+        "IB_Authentication": [],
+    }
+
+_SEED_PATH = os.path.join(_TMP_DIR, "seed.json")
+with open(_SEED_PATH, "w", encoding="utf-8") as _handle:
+    json.dump(seed(), _handle, ensure_ascii=False)
+
+os.environ.update({
+    "DATA_BACKEND": "memory",
+    "MEMORY_SEED_PATH": _SEED_PATH,
+    "MEMORY_MAX_ROWS": str(MAX_ROWS),
+    "FETCH_PAGE_SIZE": str(MAX_ROWS),
+    "SNAPSHOT_PATH": os.path.join(_TMP_DIR, "reference_snapshot.sqlite3"),
+    "HOURS_JOURNAL_PATH": os.path.join(_TMP_DIR, "hours_journal.ndjson"),
+    "IDEMPOTENCY_BACKEND": "memory",
+    "IDEMPOTENCY_DB_PATH": os.path.join(_TMP_DIR, "idempotency.sqlite3"),
+    "HOURS_WRITE_BEHIND": "0",
+    "SYNC_INTERVAL_SECONDS": "0",
+    "ROLLUP_RECONCILE_SECONDS": "0",
+    "COLUMNAR_ANALYTICS": "0",
+    "ADMIN_TOKEN": ADMIN_TOKEN,
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def app():
+    from app import main
+    from app.routers import activities, hours
+
+    # Las pruebas hacen más peticiones por minuto que las que admite un cliente real
+    for limiter in (main.limiter, hours.limiter, activities.limiter):
+        limiter.enabled = False
+    return main.app
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    # Sin el lifespan: las cachés se cargan en la primera consulta y no arrancan hilos
+    return TestClient(app)
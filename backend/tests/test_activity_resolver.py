@@ -0,0 +1,56 @@
+import pytest
+
+from conftest import PHASE, PROJECT
+from app import crud
+from app.repository import db
+from app.utils.catalog import activity_catalog, normalize_name
+
+@pytest.mark.parametrize("discipline, activity, expected", [
+    # Búsqueda directa en el mapa normalizado
+    ("Civil", "Planos", 1),
+    ("  civil ", "PLANOS", 1),
+    ("N/A-No Aplica", "coordinación", 3),
+    ("n/a – no  aplica", "Coordinación", 3),
+    # Una coincidencia exacta gana aunque otra actividad también contenga el texto
+    ("Eléctrica", "Planos", 4),
+    # 1. disciplina parcial, actividad exacta
+    ("Eléctri", "Planos", 4),
+    # 2. disciplina exacta, actividad parcial
+    ("Eléctrica", "eléctricos", 5),
+    # 3. ambas parciales
+    ("Eléctrica", "Cantidades", 7),
+    ("potencia", "memoria", 6),
+])
+def test_resolve_activity_id_ladder(discipline, activity, expected):
+    assert activity_catalog.resolve_activity_id(PROJECT, PHASE, discipline, activity) == expected
+
+def test_resolve_activity_id_is_scoped_to_project_and_phase():
+    assert activity_catalog.resolve_activity_id(PROJECT, PHASE, "Mecánica", "Planos") is None
+    assert activity_catalog.resolve_activity_id(PROJECT, "Diseño conceptual", "Civil", "Planos") is None
+    assert activity_catalog.resolve_activity_id("0200", "Diseño conceptual", "Civil", "Planos") == 8
+
+def test_normalize_name_collapses_dashes_spaces_and_case():
+    assert normalize_name(" N/A – No  Aplica ") == normalize_name("n/a-no aplica") == "n/a-no aplica"
+    assert normalize_name(None) == ""
+
+def test_get_activity_id_suggests_similar_activities():
+    with pytest.raises(ValueError, match="Actividades similares encontradas: .*Planos"):
+        crud.get_activity_id(PROJECT, PHASE, "Mecánica", "Planoz")
+
+def test_get_activity_id_without_matches():
+    with pytest.raises(ValueError, match="No se encontró la actividad: Topografía"):
+        crud.get_activity_id(PROJECT, "Diseño conceptual", "Civil", "Topografía")
+
+@pytest.mark.parametrize("activity", ["Plano_", "Pla%", "Plano*", "P\\lanos"])
+def test_get_activity_id_treats_wildcards_as_literals(activity):
+    # No están en el catálogo: van a la consulta ilike, que no debe hallar "Planos"
+    with pytest.raises(ValueError):
+        crud.get_activity_id(PROJECT, PHASE, "Civil", activity)
+
+def test_get_activity_id_finds_literal_wildcards_missing_from_the_catalog():
+    # Alta hecha en Supabase después de cargar el catálogo
+    db.table("IB_Activities").insert({
+        "activity_id": 90, "project_code": PROJECT, "phase": PHASE,
+        "discipline": "Civil", "activity": "Plano_100%",
+    }).execute()
+    assert crud.get_activity_id(PROJECT, PHASE, "Civil", "plano_100%") == 90
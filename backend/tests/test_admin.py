@@ -0,0 +1,19 @@
+from conftest import ADMIN_TOKEN
+
+def test_metrics_requires_the_admin_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+    assert response.status_code == 200
+    assert response.json()["data_backend"]["backend"] == "memory"
+
+def test_catalog_refresh_requires_the_admin_token(client):
+    assert client.post("/activities/catalog/refresh").status_code == 401
+    assert client.post("/activities/catalog/refresh", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}).status_code == 200
+
+def test_admin_routes_are_hidden_without_a_configured_token(client, monkeypatch):
+    from app.utils import admin
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get("/metrics", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}).status_code == 404
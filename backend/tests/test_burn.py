@@ -0,0 +1,36 @@
+import uuid
+
+from conftest import MAX_ROWS
+from app import crud
+from app.repository import bulk_insert
+
+PROJECT = "0200"
+PHASE = "Diseño conceptual"
+EXTRA_ACTIVITIES = MAX_ROWS + 4
+
+def _hour(activity: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "date": "2024-06-03",
+        "employee_id": "1",
+        "project_code": PROJECT,
+        "phase": PHASE,
+        "discipline": "Civil",
+        "activity": activity,
+        "hours": "1.5",
+        "note": None,
+    }
+
+def test_burn_counts_more_activity_groups_than_max_rows(client):
+    # Una actividad con presupuesto y más grupos sin presupuesto que el tope de max-rows
+    bulk_insert("IB_Reported_Hours", [_hour("Planos")] + [_hour(f"Lámina {n:02d}") for n in range(EXTRA_ACTIVITIES)])
+
+    grouped = crud._project_hours_by_activity(PROJECT)
+    assert len(grouped) == EXTRA_ACTIVITIES + 1 > MAX_ROWS
+
+    response = client.get(f"/projects/{PROJECT}/burn")
+    assert response.status_code == 200
+    burn = response.json()
+    assert burn["activities"][0]["actual_hours"] == 1.5
+    assert len(burn["unbudgeted"]) == EXTRA_ACTIVITIES
+    assert burn["unbudgeted_hours"] == 1.5 * EXTRA_ACTIVITIES
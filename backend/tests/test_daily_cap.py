@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from conftest import PHASE, PROJECT
+from app import crud, schemas
+from app.repository import db
+from app.utils.daily_totals import DailyCapExceededError, DailyTotals
+
+EMPLOYEE = 4
+
+def _entry(day: str, hours: float, activity: str = "Planos") -> dict:
+    return {
+        "date": day,
+        "project_code": PROJECT,
+        "phase": PHASE,
+        "discipline": "Civil",
+        "activity": activity,
+        "hours": hours,
+    }
+
+def _hour(day: str, hours: float, activity: str = "Planos") -> dict:
+    return {**_entry(day, hours, activity), "employee_id": EMPLOYEE}
+
+def _stored_day(day: str) -> list:
+    return db.table("IB_Reported_Hours").select("*").eq("employee_id", str(EMPLOYEE)).eq("date", day).execute().data
+
+def test_create_over_daily_cap_is_422(client):
+    assert client.post("/hours/", json=_hour("2025-04-07", 16)).status_code == 200
+    assert client.post("/hours/", json=_hour("2025-04-07", 8, "Memoria de cálculo")).status_code == 200
+
+    response = client.post("/hours/", json=_hour("2025-04-07", 0.5))
+    assert response.status_code == 422
+    assert "2025-04-07" in response.json()["detail"]
+    assert len(_stored_day("2025-04-07")) == 2
+
+    # El tope es por día: el día siguiente sigue libre
+    assert client.post("/hours/", json=_hour("2025-04-08", 0.5)).status_code == 200
+
+def test_update_over_daily_cap_is_422(client):
+    first = client.post("/hours/", json=_hour("2025-04-14", 12)).json()
+    client.post("/hours/", json=_hour("2025-04-14", 12, "Memoria de cálculo"))
+
+    response = client.put(f"/hours/{first['id']}", json={"hours": 13})
+    assert response.status_code == 422
+    assert sum(float(row["hours"]) for row in _stored_day("2025-04-14")) == 24
+
+    # Cambiar el propio registro no cuenta sus horas dos veces
+    assert client.put(f"/hours/{first['id']}", json={"hours": 11}).status_code == 200
+
+def test_batch_counts_earlier_rows_of_the_same_batch(client):
+    response = client.post("/hours/batch", json=[_hour("2025-04-21", 20), _hour("2025-04-21", 8, "Memoria de cálculo")])
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (1, 1)
+    assert body["results"][1]["error"]
+
+def test_week_over_daily_cap_is_422(client):
+    week = {
+        "employee_id": EMPLOYEE,
+        "year": 2025,
+        "week": 18,  # 28 de abril al 4 de mayo de 2025
+        "entries": [
+            _entry("2025-04-28", 16),
+            _entry("2025-04-28", 9, "Memoria de cálculo"),
+        ],
+    }
+    response = client.put("/hours/week", json=week)
+    assert response.status_code == 422
+    assert _stored_day("2025-04-28") == []
+
+    # La semana recibida reemplaza a la guardada: 24 horas exactas caben
+    week["entries"][1]["hours"] = 8
+    assert client.put("/hours/week", json=week).status_code == 200
+    assert len(_stored_day("2025-04-28")) == 2
+
+def test_reservations_count_writes_in_flight():
+    totals = DailyTotals(cap=24)
+    totals.seed_week(EMPLOYEE, "2025-04-30", [])
+    first = totals.reserve(EMPLOYEE, "2025-04-30", 16)
+    with pytest.raises(DailyCapExceededError):
+        totals.reserve(EMPLOYEE, "2025-04-30", 9)
+    totals.release(first)
+    totals.release(totals.reserve(EMPLOYEE, "2025-04-30", 9))
+    assert totals.stats()["reservations"] == 0
+
+def test_concurrent_creates_cannot_both_pass_the_cap(monkeypatch):
+    payload = crud._hour_insert_payload
+
+    def slow_payload(validated):
+        # Ensancha la ventana entre validar el tope y registrar el insert
+        time.sleep(0.05)
+        return payload(validated)
+
+    monkeypatch.setattr(crud, "_hour_insert_payload", slow_payload)
+    start = threading.Barrier(2)
+    outcomes = []
+
+    def create():
+        start.wait()
+        try:
+            crud.create_reported_hour(schemas.ReportedHourCreate(**_hour("2025-05-01", 16)))
+            outcomes.append("created")
+        except DailyCapExceededError:
+            outcomes.append("rejected")
+
+    threads = [threading.Thread(target=create) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outcomes) == ["created", "rejected"]
+    assert len(_stored_day("2025-05-01")) == 1
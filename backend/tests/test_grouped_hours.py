@@ -0,0 +1,44 @@
+from conftest import MAX_ROWS, PAGINATION_EMPLOYEE
+from app import crud
+from app.utils.month_cache import ClosedMonthCache
+
+def _spy_rpc(monkeypatch) -> list:
+    calls = []
+    grouped_hours_rpc = crud._grouped_hours_rpc
+
+    def spy(start_date, end_date):
+        calls.append((start_date.isoformat(), end_date.isoformat()))
+        return grouped_hours_rpc(start_date, end_date)
+
+    monkeypatch.setattr(crud, "_grouped_hours_rpc", spy)
+    return calls
+
+def test_months_past_max_rows_are_complete_and_cached(monkeypatch):
+    monkeypatch.setattr(crud, "HOURS_ROLLUPS_ENABLED", False)
+    monkeypatch.setattr(crud, "closed_months", ClosedMonthCache())
+    employee = str(PAGINATION_EMPLOYEE)
+
+    rows = crud.get_grouped_hours_by_employee_range("2025-01", "2025-01")
+    january = [row for row in rows if row["employee_id"] == employee]
+    # 23 días con horas: más grupos que el tope de max-rows
+    assert len(january) == 23 > MAX_ROWS
+    assert crud.closed_months.get("2025-01") is not None
+
+    calls = _spy_rpc(monkeypatch)
+    assert crud.get_grouped_hours_by_employee_range("2025-01", "2025-01") == rows
+    assert calls == []
+
+def test_cached_months_between_missing_ones_are_not_refetched(monkeypatch):
+    monkeypatch.setattr(crud, "HOURS_ROLLUPS_ENABLED", False)
+    monkeypatch.setattr(crud, "closed_months", ClosedMonthCache())
+    crud.get_grouped_hours_by_employee_range("2025-02", "2025-02")
+
+    calls = _spy_rpc(monkeypatch)
+    rows = crud.get_grouped_hours_by_employee_range("2025-01", "2025-03")
+    assert calls == [("2025-01-01", "2025-01-31"), ("2025-03-01", "2025-03-31")]
+    assert {row["date"][:7] for row in rows} >= {"2025-01", "2025-02"}
+
+def test_contiguous_runs():
+    assert crud._contiguous_runs(["2024-11", "2024-12", "2025-01", "2025-03", "2025-05", "2025-06"]) == [
+        ["2024-11", "2024-12", "2025-01"], ["2025-03"], ["2025-05", "2025-06"],
+    ]
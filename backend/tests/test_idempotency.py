@@ -0,0 +1,88 @@
+import time
+
+from conftest import PHASE, PROJECT
+from app.repository import db
+from app.utils.idempotency import (
+    IN_PROGRESS,
+    NEW,
+    REPLAY,
+    MemoryIdempotencyStore,
+    SqliteIdempotencyStore,
+    idempotency_store,
+    request_fingerprint,
+)
+from app.schemas import ReportedHourCreate
+
+EMPLOYEE = 3
+
+def _hour(day: str, hours: float) -> dict:
+    return {
+        "date": day,
+        "employee_id": EMPLOYEE,
+        "project_code": PROJECT,
+        "phase": PHASE,
+        "discipline": "Civil",
+        "activity": "Planos",
+        "hours": hours,
+    }
+
+def _stored_day(day: str) -> list:
+    return db.table("IB_Reported_Hours").select("id").eq("employee_id", str(EMPLOYEE)).eq("date", day).execute().data
+
+def test_retry_with_same_key_replays_the_response(client):
+    headers = {"Idempotency-Key": "replay-1"}
+    first = client.post("/hours/", json=_hour("2025-05-05", 2), headers=headers)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    second = client.post("/hours/", json=_hour("2025-05-05", 2), headers=headers)
+    assert second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert len(_stored_day("2025-05-05")) == 1
+
+def test_same_key_with_other_body_is_422(client):
+    headers = {"Idempotency-Key": "mismatch-1"}
+    assert client.post("/hours/", json=_hour("2025-05-06", 2), headers=headers).status_code == 200
+
+    response = client.post("/hours/", json=_hour("2025-05-06", 3), headers=headers)
+    assert response.status_code == 422
+    assert len(_stored_day("2025-05-06")) == 1
+
+def test_same_key_while_in_progress_is_409(client):
+    payload = _hour("2025-05-07", 2)
+    key = "POST /hours/:in-progress-1"
+    fingerprint = request_fingerprint(ReportedHourCreate(**payload).model_dump_json())
+    assert idempotency_store.begin(key, fingerprint)[0] == NEW
+
+    response = client.post("/hours/", json=payload, headers={"Idempotency-Key": "in-progress-1"})
+    assert response.status_code == 409
+    assert _stored_day("2025-05-07") == []
+
+    # Si la primera petición falla la clave se libera y el reintento se ejecuta
+    idempotency_store.release(key)
+    assert client.post("/hours/", json=payload, headers={"Idempotency-Key": "in-progress-1"}).status_code == 200
+    assert len(_stored_day("2025-05-07")) == 1
+
+def test_failed_request_releases_the_key(client):
+    headers = {"Idempotency-Key": "failed-1"}
+    bad = {**_hour("2025-05-08", 2), "activity": "Topografía", "discipline": "Mecánica"}
+    assert client.post("/hours/", json=bad, headers=headers).status_code == 500
+
+    # No quedó respuesta guardada ni reserva: la clave vuelve a estar libre
+    assert idempotency_store.begin("POST /hours/:failed-1", "otro cuerpo")[0] == NEW
+
+def test_expired_lease_is_taken_over(tmp_path):
+    for store in (
+        MemoryIdempotencyStore(lease_seconds=0.05),
+        SqliteIdempotencyStore(str(tmp_path / "idempotency.sqlite3"), lease_seconds=0.05),
+    ):
+        assert store.begin("k", "f")[0] == NEW
+        assert store.begin("k", "f")[0] == IN_PROGRESS
+        time.sleep(0.1)
+        # El proceso que la tomó murió sin completar: otro puede reclamarla
+        assert store.begin("k", "f")[0] == NEW
+        store.complete("k", 200, '{"ok": true}')
+        time.sleep(0.1)
+        # La respuesta completada dura el TTL, no el lease
+        assert store.begin("k", "f") == (REPLAY, (200, '{"ok": true}'))
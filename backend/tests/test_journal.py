@@ -0,0 +1,119 @@
+import json
+import os
+import uuid
+
+from conftest import PHASE, PROJECT
+from app.repository import db
+from app.repository.memory import MemoryIntegrityError
+from app.utils import journal as journal_module
+from app.utils.journal import HoursJournal, JournalFullError
+
+def _row(day: str = "2025-06-02", hours: float = 2.0) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "date": day,
+        "employee_id": "2",
+        "project_code": PROJECT,
+        "phase": PHASE,
+        "discipline": "Civil",
+        "activity": "Planos",
+        "hours": str(hours),
+        "note": None,
+    }
+
+def _stored(ids: list) -> list:
+    return db.table("IB_Reported_Hours").select("id").in_("id", ids).execute().data
+
+def test_recover_drops_a_torn_last_line_and_replays_the_rest(tmp_path):
+    path = str(tmp_path / "hours_journal.ndjson")
+    rows = [_row() for _ in range(3)]
+    journal = HoursJournal(path=path, batch_size=2)
+    for row in rows:
+        journal.append(row)
+    # El proceso murió a mitad de escribir una cuarta línea
+    with open(path, "ab") as f:
+        f.write(b'{"id": "partial", "date": "2025-')
+
+    restarted = HoursJournal(path=path, batch_size=2)
+    restarted.recover()
+    assert restarted.pending == restarted.recovered == 3
+    with open(path, "rb") as f:
+        assert f.read().endswith(b"}\n")
+
+    assert restarted.flush_once() == 2
+    assert len(_stored([row["id"] for row in rows])) == 2
+
+    # Otro reinicio antes de terminar: retoma desde el offset guardado
+    restarted_again = HoursJournal(path=path, batch_size=2)
+    restarted_again.recover()
+    assert restarted_again.pending == 1
+    assert restarted_again.flush_once() == 1
+    assert restarted_again.flush_once() == 0
+    assert len(_stored([row["id"] for row in rows])) == 3
+    # Todo enviado: el diario se vacía
+    assert os.path.getsize(path) == 0
+
+def test_replaying_flushed_entries_does_not_duplicate_rows(tmp_path):
+    path = str(tmp_path / "hours_journal.ndjson")
+    row = _row()
+    journal = HoursJournal(path=path)
+    journal.append(row)
+    journal.flush_once()
+    # Se cae entre el upsert y el checkpoint: la entrada se vuelve a enviar
+    os.remove(journal.checkpoint_path)
+    with open(path, "ab") as f:
+        f.write((json.dumps(row) + "\n").encode("utf-8"))
+
+    restarted = HoursJournal(path=path)
+    restarted.recover()
+    assert restarted.flush_once() >= 1
+    assert len(_stored([row["id"]])) == 1
+
+def test_append_rejects_when_the_backlog_is_full(tmp_path):
+    journal = HoursJournal(path=str(tmp_path / "hours_journal.ndjson"), max_pending=1)
+    journal.append(_row())
+    try:
+        journal.append(_row())
+    except JournalFullError:
+        pass
+    else:
+        raise AssertionError("JournalFullError not raised")
+    assert journal.rejected == 1
+
+class _RejectingRepository:
+    """Memory backend that refuses one id permanently, as a constraint violation would."""
+
+    def __init__(self, bad_id: str):
+        self.bad_id = bad_id
+
+    def table(self, table_name: str):
+        repository = self
+
+        class _Query:
+            def upsert(self, rows, **kwargs):
+                batch = rows if isinstance(rows, list) else [rows]
+                if any(row["id"] == repository.bad_id for row in batch):
+                    raise MemoryIntegrityError("violates check constraint")
+                return db.table(table_name).upsert(rows, **kwargs)
+
+        return _Query()
+
+def test_permanently_rejected_entry_is_dead_lettered(tmp_path, monkeypatch):
+    path = str(tmp_path / "hours_journal.ndjson")
+    rows = [_row() for _ in range(3)]
+    monkeypatch.setattr(journal_module, "db", _RejectingRepository(rows[1]["id"]))
+    journal = HoursJournal(path=path)
+    discarded = []
+    journal.add_dead_letter_listener(discarded.append)
+    for row in rows:
+        journal.append(row)
+
+    assert journal.flush_once() == 3
+    assert journal.pending == 0
+    assert journal.dead_lettered == 1
+    assert [row["id"] for row in discarded] == [rows[1]["id"]]
+    assert {row["id"] for row in _stored([row["id"] for row in rows])} == {rows[0]["id"], rows[2]["id"]}
+    with open(journal.dead_letter_path, encoding="utf-8") as f:
+        dead = [json.loads(line) for line in f]
+    assert dead[0]["row"]["id"] == rows[1]["id"]
+    assert "MemoryIntegrityError" in dead[0]["error"]
@@ -0,0 +1,33 @@
+from conftest import MAX_ROWS, PAGINATION_EMPLOYEE, PAGINATION_ROWS
+from app.repository import db
+from app.repository.memory import MemoryRepository
+
+def test_reads_are_capped_like_postgrest():
+    assert PAGINATION_ROWS > MAX_ROWS
+    query = db.table("IB_Reported_Hours").select("id").eq("employee_id", str(PAGINATION_EMPLOYEE))
+    assert len(query.execute().data) == MAX_ROWS
+
+    # Un limit mayor que el tope tampoco lo supera
+    limited = db.table("IB_Reported_Hours").select("id").eq("employee_id", str(PAGINATION_EMPLOYEE)).limit(1000)
+    assert len(limited.execute().data) == MAX_ROWS
+
+def test_rpc_results_are_capped():
+    rows = db.rpc("grouped_hours_by_employee", {"start_date": "2025-01-01", "end_date": "2025-01-31"}).execute().data
+    assert len(rows) == MAX_ROWS
+
+def test_aggregates_see_every_row_before_the_cap():
+    repository = MemoryRepository(max_rows=2)
+    repository.load({"IB_Reported_Hours": [
+        {"id": str(number), "date": "2025-01-02", "employee_id": "1", "hours": "1.5"}
+        for number in range(5)
+    ]})
+    rows = repository.rpc("grouped_hours_by_employee", {"start_date": "2025-01-01", "end_date": "2025-01-31"}).execute().data
+    assert rows == [{"date": "2025-01-02", "employee_id": "1", "hours": 7.5}]
+    assert repository.stats()["capped_responses"] == 0
+
+def test_writes_are_not_capped():
+    repository = MemoryRepository(max_rows=2)
+    rows = [{"id": str(number), "date": "2025-01-02", "employee_id": "1", "hours": "1"} for number in range(5)]
+    assert len(repository.table("IB_Reported_Hours").insert(rows).execute().data) == 5
+    assert len(repository.table("IB_Reported_Hours").select("id").execute().data) == 2
+    assert repository.stats()["capped_responses"] == 1
@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+from conftest import MAX_ROWS, PAGINATION_EMPLOYEE, PAGINATION_ROWS
+from app import crud
+from app.repository import db
+from app.utils import pagination
+from app.utils.pagination import fetch_all, iter_rows
+
+def _query():
+    return db.table("IB_Reported_Hours").select("*").eq("employee_id", str(PAGINATION_EMPLOYEE))
+
+def _expected(*columns: str) -> list:
+    # Sin pasar por execute(): todas las filas, sin el tope de max-rows
+    rows = db.run(_query())
+    return sorted(rows, key=lambda row: tuple(row[column] for column in columns))
+
+@pytest.mark.parametrize("page_size", [1, 5, MAX_ROWS])
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_iter_rows_returns_every_row_once_in_key_order(page_size, prefetch):
+    rows = list(iter_rows(_query, key="id", page_size=page_size, prefetch=prefetch))
+    assert len(rows) == PAGINATION_ROWS
+    assert rows == _expected("id")
+
+@pytest.mark.parametrize("page_size", [1, 4, 10])
+def test_iter_rows_with_composite_key(page_size):
+    rows = fetch_all(_query, key=("date", "id"), page_size=page_size, prefetch=True)
+    assert [row["id"] for row in rows] == [row["id"] for row in _expected("date", "id")]
+
+def test_iter_rows_requests_one_page_per_page_size():
+    before = pagination.stats()
+    fetch_all(_query, key="id", page_size=10, prefetch=False)
+    after = pagination.stats()
+    # 47 filas en páginas de 10: cuatro llenas y una última de 7
+    assert after["pages"] - before["pages"] == 5
+    assert after["rows"] - before["rows"] == PAGINATION_ROWS
+
+def test_iter_rows_is_lazy():
+    rows = iter_rows(_query, key="id", page_size=10, prefetch=False)
+    before = pagination.stats()["pages"]
+    first = next(rows)
+    assert pagination.stats()["pages"] - before == 1
+    assert first == _expected("id")[0]
+
+def test_iter_rows_without_matches():
+    assert fetch_all(lambda: db.table("IB_Reported_Hours").select("*").eq("employee_id", "999"), key="id") == []
+
+def test_prefetch_is_disabled_inside_a_transaction():
+    before = pagination.stats()
+    with db.transaction():
+        rows = fetch_all(_query, key="id", page_size=10, prefetch=True)
+    assert len(rows) == PAGINATION_ROWS
+    assert pagination.stats().get("prefetched_pages", 0) == before.get("prefetched_pages", 0)
+
+def test_rpc_results_are_paged_past_max_rows():
+    # 23 días distintos en enero: más grupos que el tope de max-rows
+    start, end = date(2025, 1, 1), date(2025, 1, 31)
+    assert len(db.rpc("grouped_hours_by_employee", {"start_date": "2025-01-01", "end_date": "2025-01-31"}).execute().data) == MAX_ROWS
+    rows = crud._grouped_hours_rpc(start, end)
+    assert len(rows) > MAX_ROWS
+    key = lambda row: (row["date"], str(row["employee_id"]))
+    assert sorted(rows, key=key) == sorted(crud._grouped_hours_python(start, end), key=key)
+
+def test_rpc_builder_supports_keyset_pages():
+    query = lambda: db.rpc("grouped_hours_by_employee", {"start_date": "2025-01-01", "end_date": "2025-01-31"})
+    rows = fetch_all(query, key=("date", "employee_id"), page_size=7)
+    assert [(row["date"], row["employee_id"]) for row in rows] == sorted((row["date"], row["employee_id"]) for row in rows)
+    assert len({(row["date"], row["employee_id"]) for row in rows}) == len(rows)
@@ -0,0 +1,76 @@
+import time
+
+from app.utils.catalog import ActivityCatalog
+from app.utils.reference import ReferenceTable
+
+def _activity(activity_id: int, discipline: str, activity: str, phase: str = "Ingeniería básica") -> dict:
+    return {"activity_id": activity_id, "project_code": "0900", "phase": phase, "discipline": discipline, "activity": activity}
+
+ROWS = [
+    _activity(1, "Civil", "Planos"),
+    _activity(2, "Civil", "Memoria de cálculo"),
+    _activity(3, "Eléctrica", "Planos"),
+    _activity(4, "Mecánica", "Planos", phase="Ingeniería de detalle"),
+]
+
+def _loaded(rows: list) -> ActivityCatalog:
+    catalog = ActivityCatalog()
+    with catalog._lock:
+        catalog._swap(list(rows), time.perf_counter())
+    return catalog
+
+def _tree(catalog: ActivityCatalog) -> dict:
+    # El orden dentro de una fase puede variar hasta la siguiente reconstrucción
+    return {
+        project: {phase: {d: sorted(items, key=lambda i: i["id"]) for d, items in disciplines.items()}
+                  for phase, disciplines in phases.items()}
+        for project, phases in catalog._tree.items()
+    }
+
+def _assert_same_indexes(catalog: ActivityCatalog, rows: list) -> None:
+    fresh = _loaded(rows)
+    assert catalog.version == fresh.version
+    assert _tree(catalog) == _tree(fresh)
+    assert catalog._activity_ids == fresh._activity_ids
+    assert {key: scope.fingerprint for key, scope in catalog._scopes.items()} == \
+        {key: scope.fingerprint for key, scope in fresh._scopes.items()}
+
+def test_catalog_changes_are_applied_per_row():
+    catalog = _loaded(ROWS)
+    tree = catalog._tree
+    renamed = {**ROWS[1], "activity": "Memorias"}
+    moved = {**ROWS[2], "discipline": "Eléctrica de potencia"}
+    added = _activity(5, "Civil", "Cantidades de obra")
+
+    assert catalog.apply_changes([renamed, moved, added, ROWS[0]], deleted_keys=[4]) == 4
+    assert catalog.stats()["incremental_updates"] == 1
+    rows = [ROWS[0], renamed, moved, added]
+    _assert_same_indexes(catalog, rows)
+    # La fase sin cambios no se reindexa y el árbol anterior queda intacto para los lectores
+    assert catalog.stats()["suggestion_scopes_rebuilt"] == 1
+    assert ("0900", "Ingeniería de detalle") in {(p, ph) for p, phases in tree.items() for ph in phases}
+    assert catalog.resolve_activity_id("0900", "Ingeniería básica", "civil", "memorias") == 2
+    assert catalog.resolve_activity_id("0900", "Ingeniería de detalle", "Mecánica", "Planos") is None
+
+def test_activity_id_of_a_shared_name_moves_to_the_remaining_row():
+    duplicate = _activity(6, "Civil", "planos")
+    catalog = _loaded(ROWS + [duplicate])
+    assert catalog.resolve_activity_id("0900", "Ingeniería básica", "Civil", "Planos") == 1
+    catalog.apply_changes([], deleted_keys=[1])
+    assert catalog.resolve_activity_id("0900", "Ingeniería básica", "Civil", "Planos") == 6
+    _assert_same_indexes(catalog, ROWS[1:] + [duplicate])
+
+def test_unchanged_rows_keep_the_version():
+    catalog = _loaded(ROWS)
+    version = catalog.version
+    assert catalog.apply_changes([dict(row) for row in ROWS]) == 0
+    assert catalog.version == version
+    assert catalog.stats()["incremental_updates"] == 0
+
+def test_reference_table_key_index_follows_changes():
+    table = ReferenceTable("IB_Test", key_column="code")
+    table.primary_key = "id"
+    table.apply_changes([{"id": 1, "code": "A"}, {"id": 2, "code": "B"}])
+    table.apply_changes([{"id": 1, "code": "C"}], deleted_keys=[2])
+    assert table.get("A") is None and table.get("B") is None
+    assert table.get("C") == {"id": 1, "code": "C"}
@@ -0,0 +1,91 @@
+from datetime import date
+
+from conftest import PHASE, PROJECT
+from app import crud, schemas
+from app.utils.rollups import HoursRollups, hours_rollups
+
+EMPLOYEE = 5
+
+def _assert_matches_table(year: int, month: int) -> None:
+    # Un rollup recién construido desde la tabla es la referencia
+    fresh = HoursRollups()
+    assert hours_rollups.employee_days(year, month) == fresh.employee_days(year, month)
+    assert hours_rollups.activity_totals(year, month) == fresh.activity_totals(year, month)
+
+def _create(day: str, hours: float, discipline: str = "Civil", activity: str = "Planos") -> dict:
+    return crud.create_reported_hour(schemas.ReportedHourCreate(
+        date=date.fromisoformat(day),
+        employee_id=EMPLOYEE,
+        project_code=PROJECT,
+        phase=PHASE,
+        discipline=discipline,
+        activity=activity,
+        hours=hours,
+    ))
+
+def test_rollups_follow_creates_updates_and_deletes():
+    employee = str(EMPLOYEE)
+    assert hours_rollups.employee_days(2025, 2)[(employee, "2025-02-03")] == 4.0
+    assert hours_rollups.activity_totals(2025, 2, PROJECT)[(PROJECT, PHASE, "Eléctrica")] == 3.0
+
+    row = _create("2025-02-03", 2)
+    assert hours_rollups.employee_days(2025, 2)[(employee, "2025-02-03")] == 6.0
+    assert hours_rollups.activity_totals(2025, 2, PROJECT)[(PROJECT, PHASE, "Civil")] == 6.0
+    _assert_matches_table(2025, 2)
+
+    # Cambio de horas: resta lo anterior y suma lo nuevo
+    crud.update_reported_hour(row["id"], schemas.ReportedHourUpdate(hours=5))
+    assert hours_rollups.employee_days(2025, 2)[(employee, "2025-02-03")] == 9.0
+    _assert_matches_table(2025, 2)
+
+    # Un cambio que no toca horas ni fecha no vuelve a sumar el registro
+    crud.update_reported_hour(row["id"], schemas.ReportedHourUpdate(note="Revisado"))
+    assert hours_rollups.employee_days(2025, 2)[(employee, "2025-02-03")] == 9.0
+
+    # Cambio de disciplina: se mueve entre grupos de actividad
+    crud.update_reported_hour(row["id"], schemas.ReportedHourUpdate(discipline="Eléctrica"))
+    activities = hours_rollups.activity_totals(2025, 2, PROJECT)
+    assert activities[(PROJECT, PHASE, "Civil")] == 4.0
+    assert activities[(PROJECT, PHASE, "Eléctrica")] == 8.0
+    _assert_matches_table(2025, 2)
+
+    # Baja: el grupo que queda en cero desaparece
+    crud.delete_reported_hour(row["id"])
+    activities = hours_rollups.activity_totals(2025, 2, PROJECT)
+    assert activities[(PROJECT, PHASE, "Eléctrica")] == 3.0
+    _assert_matches_table(2025, 2)
+
+    deleted = _create("2025-02-14", 1)
+    crud.delete_reported_hour(deleted["id"])
+    assert (employee, "2025-02-14") not in hours_rollups.employee_days(2025, 2)
+    _assert_matches_table(2025, 2)
+
+def test_date_change_moves_the_entry_between_loaded_months():
+    rollups = HoursRollups()
+    rollups.employee_days(2025, 2)
+    rollups.employee_days(2025, 3)
+    row = {"id": "moved", "date": "2025-02-10", "employee_id": EMPLOYEE, "project_code": PROJECT,
+           "phase": PHASE, "discipline": "Civil", "activity": "Planos", "hours": 2.0}
+    rollups.apply(new_row=row)
+
+    # Como update_reported_hour: old_row solo trae lo que se consultó antes del cambio
+    rollups.apply(old_row={"id": "moved"}, new_row={**row, "date": "2025-03-17"})
+    assert (str(EMPLOYEE), "2025-02-10") not in rollups.employee_days(2025, 2)
+    assert rollups.employee_days(2025, 3)[(str(EMPLOYEE), "2025-03-17")] == 2.0
+
+def test_same_write_applied_twice_is_counted_once():
+    rollups = HoursRollups()
+    rollups.employee_days(2025, 2)
+    row = {"id": "replayed", "date": "2025-02-10", "employee_id": EMPLOYEE, "project_code": PROJECT,
+           "phase": PHASE, "discipline": "Civil", "activity": "Planos", "hours": 3.0}
+    rollups.apply(new_row=row)
+    rollups.apply(new_row=row)
+    assert rollups.employee_days(2025, 2)[(str(EMPLOYEE), "2025-02-10")] == 3.0
+
+    rollups.apply(old_row=row)
+    assert (str(EMPLOYEE), "2025-02-10") not in rollups.employee_days(2025, 2)
+
+def test_writes_to_months_not_loaded_are_skipped():
+    rollups = HoursRollups()
+    rollups.apply(new_row={"id": "x", "date": "2025-07-01", "employee_id": EMPLOYEE, "hours": 1.0})
+    assert rollups.stats()["months"] == {}
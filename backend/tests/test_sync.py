@@ -0,0 +1,57 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from app.repository.memory import MemoryRepository
+from app.utils import reference, sync
+from app.utils.reference import ReferenceTable
+from app.utils.sync import TableSync
+
+def _project(number: int, name: str, updated_at: str = "2025-01-01T00:00:00+00:00") -> dict:
+    return {"id": number, "code": f"{number:04d}", "name": name, "updated_at": updated_at}
+
+@pytest.fixture
+def repository(monkeypatch):
+    repository = MemoryRepository()
+    monkeypatch.setattr(sync, "db", repository)
+    monkeypatch.setattr(reference, "db", repository)
+    return repository
+
+def _table_sync(watermark_column="updated_at") -> TableSync:
+    return TableSync(ReferenceTable("IB_Projects", key_column="code"), watermark_column)
+
+def test_updated_at_watermark_sees_edits_between_reconciles(repository):
+    repository.load({"IB_Projects": [_project(1, "Planta"), _project(2, "Subestación")]})
+    table = _table_sync()
+    table.sync()
+    assert table.cache.get("0001")["name"] == "Planta"
+
+    repository.table("IB_Projects").update({"name": "Planta norte", "updated_at": "2025-03-01T10:00:00+00:00"}).eq("id", 1).execute()
+    assert table.sync() == 1
+    assert table.mode == "watermark"
+    assert table.cache.get("0001")["name"] == "Planta norte"
+
+def test_missing_watermark_column_falls_back_to_row_hash(repository):
+    repository.load({"IB_Projects": [{"id": 1, "code": "0001", "name": "Planta"}]})
+    table = _table_sync()
+    table.sync()
+    assert table.mode == "row_hash"
+    assert table.cache.get("0001")["name"] == "Planta"
+
+def test_only_undefined_column_errors_switch_modes(repository, monkeypatch):
+    table = _table_sync()
+
+    def fail(error):
+        def reconcile():
+            raise error
+        monkeypatch.setattr(table, "_reconcile", reconcile)
+
+    # Un error cualquiera que nombra la columna no cambia de modo
+    fail(TimeoutError("timeout ordering by updated_at"))
+    with pytest.raises(TimeoutError):
+        table.sync()
+    assert table.mode == "watermark"
+
+    fail(APIError({"code": "42703", "message": "column IB_Projects.updated_at does not exist"}))
+    with pytest.raises(APIError):
+        table.sync()
+    assert table.mode == "row_hash"
@@ -0,0 +1,94 @@
+from conftest import PHASE, PROJECT
+from app.repository import db
+
+EMPLOYEE = 1
+YEAR, WEEK = 2025, 10  # 3 al 9 de marzo de 2025
+
+def _entry(day: str, activity: str, hours: float, discipline: str = "Civil", **extra) -> dict:
+    return {
+        "date": day,
+        "project_code": PROJECT,
+        "phase": PHASE,
+        "discipline": discipline,
+        "activity": activity,
+        "hours": hours,
+        **extra,
+    }
+
+def _put_week(client, entries: list):
+    return client.put("/hours/week", json={"employee_id": EMPLOYEE, "year": YEAR, "week": WEEK, "entries": entries})
+
+def _stored_week() -> dict:
+    rows = (
+        db
+        .table("IB_Reported_Hours")
+        .select("*")
+        .eq("employee_id", str(EMPLOYEE))
+        .gte("date", "2025-03-03")
+        .lte("date", "2025-03-09")
+        .execute()
+        .data
+    )
+    return {row["id"]: row for row in rows}
+
+def test_week_upsert_applies_only_the_diff(client):
+    response = _put_week(client, [
+        _entry("2025-03-03", "Planos", 4),
+        _entry("2025-03-03", "Memoria de cálculo", 4),
+        _entry("2025-03-04", "Planos", 8),
+    ])
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["diff"] == {"inserted": 3, "updated": 0, "deleted": 0, "unchanged": 0}
+    assert set(_stored_week()) == {entry["id"] for entry in body["entries"]}
+    by_activity = {(entry["date"], entry["activity"]): entry for entry in body["entries"]}
+
+    # Sin cambios: los registros sin id se emparejan con los guardados idénticos
+    response = _put_week(client, [
+        _entry("2025-03-03", "Planos", 4),
+        _entry("2025-03-03", "Memoria de cálculo", 4),
+        _entry("2025-03-04", "Planos", 8),
+    ])
+    assert response.json()["diff"] == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 3}
+    assert len(_stored_week()) == 3
+
+    # Uno igual, uno cambiado, uno omitido (se borra) y uno nuevo
+    kept = by_activity[("2025-03-03", "Planos")]["id"]
+    changed = by_activity[("2025-03-04", "Planos")]["id"]
+    dropped = by_activity[("2025-03-03", "Memoria de cálculo")]["id"]
+    response = _put_week(client, [
+        _entry("2025-03-03", "Planos", 4, id=kept),
+        _entry("2025-03-04", "Planos", 6, id=changed, note="Ajuste"),
+        _entry("2025-03-05", "Coordinación", 2, discipline="N/A - No Aplica"),
+    ])
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["diff"] == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+
+    stored = _stored_week()
+    assert dropped not in stored
+    assert stored[kept]["hours"] == "4.0"
+    assert stored[changed]["hours"] == "6.0"
+    assert stored[changed]["note"] == "Ajuste"
+    assert set(stored) == {entry["id"] for entry in body["entries"]}
+    assert [entry["date"] for entry in body["entries"]] == ["2025-03-03", "2025-03-04", "2025-03-05"]
+
+    # Una semana vacía borra todo lo guardado
+    response = _put_week(client, [])
+    assert response.json()["diff"] == {"inserted": 0, "updated": 0, "deleted": 3, "unchanged": 0}
+    assert _stored_week() == {}
+
+def test_week_upsert_rejects_dates_outside_the_week(client):
+    response = _put_week(client, [_entry("2025-03-10", "Planos", 4)])
+    assert response.status_code == 400
+    assert "no pertenece a la semana" in response.json()["detail"]
+
+def test_week_upsert_rejects_ids_of_other_weeks(client):
+    response = _put_week(client, [_entry("2025-03-03", "Planos", 4, id="00000000-0000-4000-8000-000000000501")])
+    assert response.status_code == 400
+    assert _stored_week() == {}
+
+def test_week_upsert_rejects_unknown_activities(client):
+    response = _put_week(client, [_entry("2025-03-03", "Topografía", 4, discipline="Mecánica")])
+    assert response.status_code == 400
+    assert _stored_week() == {}